@@ -0,0 +1,73 @@
+import argparse
+import ast
+import asyncio
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.buff163_utils import parse_for_relevant_item_data  # noqa: E402
+from utils.buff_schema import decode_sell_order  # noqa: E402
+
+
+def legacy_parse(data, item_id):
+    # The dict-based path fetch_buff_data/parse_for_relevant_item_data used before typed decoding
+    steam_price_usd = float(data["data"]["goods_infos"][str(item_id)]["steam_price"])
+    steam_price_cny = float(data["data"]["goods_infos"][str(item_id)]["steam_price_cny"])
+    buff_price = float(data["data"]["items"][0]["price"])
+    conversion_rate = steam_price_usd / steam_price_cny
+    buff_price_usd = buff_price * conversion_rate
+    steam_price_usd = steam_price_usd if steam_price_usd < 2000 else "N/A"
+
+    base_image = data["data"]["goods_infos"][str(item_id)]["original_icon_url"]
+    for item in data["data"]["items"]:
+        if "asset_info" in item and "info" in item["asset_info"] and "inspect_en_url" in item["asset_info"]["info"]:
+            skin_image_url = item["asset_info"]["info"]["inspect_en_url"]
+            break
+        else:
+            skin_image_url = base_image
+
+    return {
+        "buff_price_usd": f"{buff_price_usd:.2f}",
+        "steam_price_usd": steam_price_usd,
+        "skin_image_url": skin_image_url,
+        "base_image": base_image,
+    }
+
+
+def main(path, number):
+    # The captured response is a pretty-printed Python dict, turn it into the JSON bytes Buff sends
+    raw = json.dumps(ast.literal_eval(open(path).read()), ensure_ascii=False).encode()
+    item_id = next(iter(json.loads(raw)["data"]["goods_infos"]))
+
+    loop = asyncio.new_event_loop()
+
+    def typed():
+        return loop.run_until_complete(parse_for_relevant_item_data(decode_sell_order(raw), item_id))
+
+    def legacy():
+        return legacy_parse(json.loads(raw), item_id)
+
+    if typed() != legacy():
+        raise SystemExit("Typed and dict parsing disagree")
+
+    print(f"Response: {len(raw):,} bytes, {number} decodes each")
+    for label, func in [("json.loads + dicts", legacy), ("msgspec Structs", typed)]:
+        best = min(timeit.repeat(func, number=number, repeat=5)) / number
+        print(f"{label:<20} {best * 1e6:8.1f}us per response ({1 / best:,.0f}/s)")
+
+    decode_only = min(timeit.repeat(lambda: decode_sell_order(raw), number=number, repeat=5)) / number
+    json_only = min(timeit.repeat(lambda: json.loads(raw), number=number, repeat=5)) / number
+    print(f"Decode only: json.loads {json_only * 1e6:.1f}us, msgspec {decode_only * 1e6:.1f}us")
+    loop.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sell order decoding microbenchmark")
+    parser.add_argument("--response", default="data/example_buff_resp", help="Captured sell_order response")
+    parser.add_argument("--number", type=int, default=2000, help="Decodes per timing run")
+    args = parser.parse_args()
+
+    main(args.response, args.number)
@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.charts import ChartRenderer, render_price_chart  # noqa: E402
+from utils.loop_lag import measure_lag  # noqa: E402
+
+WEARS = ["Factory New", "Minimal Wear", "Field-Tested", "Well-Worn", "Battle-Scarred"]
+
+
+def make_snapshots(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        tuple((wear, round(rng.uniform(1, 500), 2), round(rng.uniform(1, 600), 2)) for wear in WEARS)
+        for _ in range(count)
+    ]
+
+
+async def inline_render(snapshots):
+    # The old way: render right inside the handler on the event loop
+    for rows in snapshots:
+        labels, buff_prices, steam_prices = zip(*rows)
+        render_price_chart("Skin Prices", labels, buff_prices, steam_prices)
+        await asyncio.sleep(0)
+
+
+async def pooled_render(renderer, snapshots, repeats=1):
+    for _ in range(repeats):
+        await asyncio.gather(*[renderer.render(f"item-{i}", ("regular",), rows) for i, rows in enumerate(snapshots)])
+
+
+async def main(charts, workers, repeats):
+    snapshots = make_snapshots(charts)
+    renderer = ChartRenderer(max_workers=workers, maxsize=charts + 1)
+    # Start the workers and import matplotlib in them before timing
+    await renderer.render("warmup", ("regular",), make_snapshots(1, seed=1)[0])
+
+    runs = [
+        ("inline on loop", inline_render(snapshots)),
+        (f"process pool x{workers}", pooled_render(renderer, snapshots)),
+        ("cached repeat", pooled_render(renderer, snapshots, repeats)),
+    ]
+    print(f"{charts} charts, {workers} workers")
+    for label, coro in runs:
+        _, lag, elapsed = await measure_lag(coro)
+        rendered = charts * (repeats if label == "cached repeat" else 1)
+        print(
+            f"{label:<18} {rendered / elapsed:8.1f} charts/s  "
+            f"loop lag mean {lag['mean_ms']:.1f}ms p99 {lag['p99_ms']:.1f}ms max {lag['max_ms']:.1f}ms"
+        )
+
+    print(f"Renderer: {renderer.stats()}")
+    renderer.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Price chart rendering throughput and event loop lag")
+    parser.add_argument("--charts", type=int, default=40, help="Distinct charts to render")
+    parser.add_argument("--workers", type=int, default=2, help="Process pool size")
+    parser.add_argument("--repeats", type=int, default=5, help="Times the cached pass re-requests every chart")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    asyncio.run(main(args.charts, args.workers, args.repeats))
+    print(f"Total {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.http_client import UpstreamClient, upstream_settings  # noqa: E402
+
+EXAMPLE_BODY = b'{"code": "OK", "data": {"total_count": 1, "items": [{"price": "1.00"}], "goods_infos": {}}}'
+
+
+async def start_stub(port, delay):
+    """A local stand-in for an upstream that answers every request after `delay` seconds"""
+
+    async def handle(request):
+        await asyncio.sleep(delay)
+        return web.Response(body=EXAMPLE_BODY, content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def fetch_all(get, url, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(i):
+        async with semaphore:
+            async with get(f"{url}?goods_id={i}") as response:
+                await response.read()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[fetch(i) for i in range(requests)])
+    return time.perf_counter() - started
+
+
+async def session_per_request(url, requests, concurrency):
+    # What buff_test.py used to do: a fresh ClientSession (and connection) for every attempt
+    async def get_with_new_session(request_url):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(request_url) as response:
+                await response.read()
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(i):
+        async with semaphore:
+            await get_with_new_session(f"{url}?goods_id={i}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*[fetch(i) for i in range(requests)])
+    return time.perf_counter() - started
+
+
+async def fast_latency_while_slow_busy(get_fast, get_slow, fast_url, slow_url, slow_requests):
+    """Mean latency of fast-host requests while the slow host has a backlog of requests queued"""
+    slow = asyncio.gather(*[get_and_read(get_slow, f"{slow_url}?goods_id={i}") for i in range(slow_requests)])
+    await asyncio.sleep(0.05)
+
+    latencies = []
+    for i in range(10):
+        started = time.perf_counter()
+        await get_and_read(get_fast, f"{fast_url}?goods_id={i}")
+        latencies.append(time.perf_counter() - started)
+    await slow
+    return sum(latencies) / len(latencies)
+
+
+async def get_and_read(get, url):
+    async with get(url) as response:
+        return await response.read()
+
+
+async def main(requests, concurrency, fast_port, slow_port):
+    fast_runner = await start_stub(fast_port, delay=0.002)
+    slow_runner = await start_stub(slow_port, delay=1.0)
+    fast_url = f"http://127.0.0.1:{fast_port}/api/market/goods/sell_order"
+    slow_url = f"http://127.0.0.1:{slow_port}/market/priceoverview/"
+
+    print(f"{requests} requests, {concurrency} concurrent")
+    elapsed = await session_per_request(fast_url, requests, concurrency)
+    print(f"{'session per request':<22} {requests / elapsed:8.0f} req/s")
+
+    limits = {"buff": upstream_settings("buff", limit=concurrency), "steam": upstream_settings("steam", limit=4)}
+    async with UpstreamClient(limits) as upstream:
+        elapsed = await fetch_all(lambda url: upstream.get("buff", url), fast_url, requests, concurrency)
+        stats = upstream.stats()["buff"]
+        print(
+            f"{'pooled keep-alive':<22} {requests / elapsed:8.0f} req/s  "
+            f"new connections {stats['new_connections']}, reuse rate {stats['reuse_rate']:.1%}"
+        )
+
+        # Isolation: one shared connector vs a pool per upstream while the slow host is backed up
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=8)) as shared:
+            shared_latency = await fast_latency_while_slow_busy(shared.get, shared.get, fast_url, slow_url, 16)
+        isolated_latency = await fast_latency_while_slow_busy(
+            lambda url: upstream.get("buff", url), lambda url: upstream.get("steam", url), fast_url, slow_url, 16
+        )
+        print("Fast host latency with the slow host backed up (16 requests at 1s):")
+        print(f"{'  shared connector':<22} {shared_latency * 1000:8.1f}ms")
+        print(f"{'  isolated pools':<22} {isolated_latency * 1000:8.1f}ms")
+
+    await fast_runner.cleanup()
+    await slow_runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upstream HTTP pool benchmark against local stub servers")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per run")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--fast-port", type=int, default=18080, help="Port for the fast stub upstream")
+    parser.add_argument("--slow-port", type=int, default=18081, help="Port for the slow stub upstream")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.concurrency, args.fast_port, args.slow_port))
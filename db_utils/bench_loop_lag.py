@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import os
+import sys
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from models.item import Item  # noqa: E402
+from utils.loop_lag import measure_lag  # noqa: E402
+
+POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD')
+DSN = f"skinpilot:{POSTGRES_PASSWORD}@0.0.0.0:5432/skinpilot_db"
+
+
+def item_queries(name):
+    # The three per-command queries /pricecheck used to run
+    return [
+        select(Item).where(Item.name == name, Item.is_stattrak == False, Item.is_souvenir == False),  # noqa: E712
+        select(Item).where(Item.name == name, Item.is_stattrak == True),  # noqa: E712
+        select(Item).where(Item.name == name, Item.is_souvenir == True),  # noqa: E712
+    ]
+
+
+async def blocking_command(Session, name):
+    # Old layout: one shared sync session, queries run directly on the event loop
+    with Session() as session:
+        return [session.execute(query).scalars().all() for query in item_queries(name)]
+
+
+async def async_command(AsyncSession, name):
+    async with AsyncSession() as session:
+        return [(await session.execute(query)).scalars().all() for query in item_queries(name)]
+
+
+async def run(commands, names):
+    sync_engine = create_engine(f"postgresql://{DSN}", pool_size=10)
+    async_engine = create_async_engine(f"postgresql+asyncpg://{DSN}", pool_size=10)
+    Session = sessionmaker(bind=sync_engine)
+    AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    workloads = [names[i % len(names)] for i in range(commands)]
+    for label, command, session_factory in [
+        ("sync engine", blocking_command, Session),
+        ("async engine", async_command, AsyncSession),
+    ]:
+        _, lag, elapsed = await measure_lag(asyncio.gather(*[command(session_factory, name) for name in workloads]))
+        print(
+            f"{label:<13} {commands} commands in {elapsed:.2f}s | "
+            f"loop lag mean {lag['mean_ms']:.1f}ms p99 {lag['p99_ms']:.1f}ms max {lag['max_ms']:.1f}ms"
+        )
+
+    sync_engine.dispose()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event loop lag under concurrent /pricecheck DB work")
+    parser.add_argument("--commands", type=int, default=200, help="Number of concurrent commands")
+    parser.add_argument(
+        "--names", nargs="+", default=["AK-47 | Redline", "AWP | Asiimov", "★ Karambit | Doppler"], help="Item names"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(run(args.commands, args.names))
@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+import pandas as pd
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import utils.buff163_utils as buff_utils  # noqa: E402
+from utils.filter_menus import FilterMenu  # noqa: E402
+from utils.http_client import UpstreamClient  # noqa: E402
+from utils.query_planner import ListingSpec, QueryPlanner, seed_tiers  # noqa: E402
+
+GOODS_ID = 33880
+WEAR = "Factory New"
+
+
+def load_menus(wears_csv, buff163_csv, wear):
+    """The item's Float Range and Paint seed FilterMenus, built from the catalogue dumps"""
+    float_rows = pd.read_csv(wears_csv).query("wear == @wear")
+    # The dump repeats the dropdowns for every wear of the item, one copy is what the bot loads
+    buff163_rows = pd.read_csv(buff163_csv).query("button_text != 'Float Range'")
+    buff163_rows = buff163_rows[buff163_rows["wear"] == buff163_rows["wear"].iloc[0]]
+
+    menus = []
+    for rows in (float_rows, buff163_rows.drop_duplicates(["button_text", "option_index"])):
+        rows = rows.astype(object).where(rows.notna(), None)
+        for button_text, dropdown in rows.groupby("button_text", sort=False):
+            menus.append(FilterMenu(button_text, [SimpleNamespace(**row) for row in dropdown.to_dict("records")]))
+    return menus
+
+
+def make_listings(count, tiers, seed=0):
+    rng = random.Random(seed)
+    tier_seeds = sorted(frozenset().union(*tiers.values()))
+    listings = []
+    for i in range(count):
+        # Make sure there are tiered seeds on the market, they're what the filters ask for
+        paintseed = rng.choice(tier_seeds) if rng.random() < 0.2 else rng.randint(0, 1000)
+        listings.append(
+            {
+                "id": f"listing-{i}",
+                "price": f"{rng.uniform(50, 5000):.2f}",
+                "asset_info": {"paintwear": f"{rng.uniform(0.0, 0.07):.6f}", "info": {"paintseed": paintseed}},
+            }
+        )
+    return listings
+
+
+async def start_stub(port, listings, tiers):
+    """A local sell_order endpoint applying the float, tier and paintseed filters and pagination"""
+    requests = []
+
+    async def handle(request):
+        query = request.query
+        requests.append(dict(query))
+        matching = listings
+        if "min_paintwear" in query:
+            low, high = float(query["min_paintwear"]), float(query["max_paintwear"])
+            matching = [item for item in matching if low <= float(item["asset_info"]["paintwear"]) <= high]
+        if "tier" in query:
+            matching = [item for item in matching if item["asset_info"]["info"]["paintseed"] in tiers[query["tier"]]]
+        if "paintseed" in query:
+            seed = int(query["paintseed"])
+            matching = [item for item in matching if item["asset_info"]["info"]["paintseed"] == seed]
+        matching = sorted(matching, key=lambda item: float(item["price"]))
+
+        page_size, page_num = int(query.get("page_size", 10)), int(query.get("page_num", 1))
+        page = matching[(page_num - 1) * page_size : page_num * page_size]
+        body = {
+            "code": "OK",
+            "data": {
+                "total_count": len(matching),
+                "total_page": max(1, -(-len(matching) // page_size)),
+                "page_num": page_num,
+                "items": page,
+                "goods_infos": {query["goods_id"]: {"steam_price": "1.00", "steam_price_cny": "7.00"}},
+            },
+        }
+        return web.Response(text=json.dumps(body), content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get("/api/market/goods/sell_order", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, requests
+
+
+async def naive_search(client, spec, float_ranges, page_size):
+    """The filter sent to Buff as given: every float range and paint seed is its own query, all pages read"""
+    results = {}
+    seeds = sorted(spec.paint_seeds) or [None]
+    for low, high in float_ranges or [spec.wear_range]:
+        for seed in seeds:
+            filters = {"sort_by": "price.asc", "min_paintwear": f"{low:.3f}", "max_paintwear": f"{high:.3f}"}
+            if seed is not None:
+                filters["paintseed"] = seed
+            if spec.tier is not None:
+                filters["tier"] = spec.tier
+            page_num = 1
+            while True:
+                url = await buff_utils.construct_buff_api_url(
+                    spec.buff_id, page_num=page_num, page_size=page_size, **filters
+                )
+                data = await buff_utils.fetch_buff_data(client, spec.buff_id, url=url)
+                if data is None:
+                    break
+                for listing in data.data.items:
+                    if spec.matches(listing):
+                        results[listing.id] = round(float(listing.price) / 7, 2)
+                if page_num >= data.data.total_page:
+                    break
+                page_num += 1
+    return sorted(results.values())
+
+
+async def main(port, count, limit):
+    menus = load_menus("data/wears.csv", "data/buff163_sample.csv", WEAR)
+    tiers = seed_tiers(menus)
+    tier1 = sorted(tiers["Tier1"])
+
+    runner, requests = await start_stub(port, make_listings(count, tiers), tiers)
+    buff_utils.BUFF_API_URL = f"http://127.0.0.1:{port}/api/market/goods/sell_order"
+    buff_utils.buff_rate_limiter.rate = buff_utils.buff_rate_limiter.burst = 1000
+
+    scenarios = [
+        ("FN, Tier1, float < 0.03", [(0.0, 0.03)], {"tier": "Tier1"}),
+        ("Same filter, another user", [(0.0, 0.03)], {"tier": "Tier1"}),
+        ("Tier1, float 0.021-0.025", [(0.021, 0.025)], {"tier": "Tier1"}),
+        (
+            "3 overlapping ranges, 2 Tier1 seeds",
+            [(0.02, 0.035), (0.03, 0.05), (0.045, 0.052)],
+            {"paint_seeds": tier1[:2]},
+        ),
+        ("4 Tier1 seeds, float < 0.07", [(0.0, 0.07)], {"paint_seeds": tier1[4:8]}),
+        ("3 untiered seeds", [], {"paint_seeds": [1, 2, 3]}),
+    ]
+
+    planner = QueryPlanner(page_size=50, max_pages=3)
+    async with UpstreamClient() as upstream:
+        client = SimpleNamespace(upstream=upstream)
+        print(f"{'Filter':<38}{'naive':>7}{'planned':>9}  results match")
+        naive_total = planned_total = 0
+        for label, float_ranges, filters in scenarios:
+            spec = ListingSpec(GOODS_ID, WEAR, float_ranges, **filters)
+            before = len(requests)
+            naive = (await naive_search(client, spec, float_ranges, 50))[:limit]
+            naive_requests = len(requests) - before
+
+            before = len(requests)
+            planned = await planner.execute(client, planner.plan(spec, menus), limit)
+            planned_requests = len(requests) - before
+
+            naive_total += naive_requests
+            planned_total += planned_requests
+            match = [price for price, *_ in planned] == naive
+            print(f"{label:<38}{naive_requests:>7}{planned_requests:>9}  {match}")
+
+        print(f"{'Total upstream requests':<38}{naive_total:>7}{planned_total:>9}")
+        print(planner.stats())
+
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upstream requests with and without the query planner, on a stub")
+    parser.add_argument("--port", type=int, default=18082, help="Port for the stub sell_order endpoint")
+    parser.add_argument("--listings", type=int, default=2000, help="Listings on the stub item")
+    parser.add_argument("--limit", type=int, default=10, help="Cheapest matching listings to find")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.port, args.listings, args.limit))
@@ -1,22 +1,33 @@
 import asyncio
+import os
+import sys
 
-import aiohttp
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
 
+from utils.http_client import UpstreamClient  # noqa: E402
+from utils.rate_limit import RetryBudget, TokenBucket, backoff_delay  # noqa: E402
 
-async def fetch_buff_and_steam_skin_data(item_id):
-    url = f"https://buff.163.com/api/market/goods/sell_order?game=csgo&goods_id={item_id}"
+BUFF_API_URL = os.getenv("BUFF_API_URL", "https://buff.163.com/api/market/goods/sell_order")
+
+rate_limiter = TokenBucket(rate=float(os.getenv("BUFF_REQUESTS_PER_SECOND", 4)), burst=int(os.getenv("BUFF_BURST", 8)))
+retry_budget = RetryBudget()
+
+
+async def fetch_buff_and_steam_skin_data(upstream, item_id):
+    url = f"{BUFF_API_URL}?game=csgo&goods_id={item_id}"
 
     max_retries = 5
-    backoff_factor = 2
 
+    retry_budget.record_request()
     for attempt in range(1, max_retries + 1):
+        await rate_limiter.acquire()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 429:
-                        raise Exception("Rate limited")
-                    response.raise_for_status()
-                    data = await response.json()
+            # Retries reuse the pooled keep-alive connection instead of opening a new session each time
+            async with upstream.get("buff", url) as response:
+                if response.status == 429:
+                    raise Exception("Rate limited")
+                response.raise_for_status()
+                data = await response.json()
 
             if data["code"] == "OK" and data["data"]["total_count"] > 0:
                 steam_price = data["data"]["goods_infos"][str(item_id)]["steam_price"]
@@ -39,16 +50,17 @@ async def fetch_buff_and_steam_skin_data(item_id):
                 return "N/A", "N/A", None
 
         except Exception as e:
-            if attempt == max_retries:
+            if attempt == max_retries or not retry_budget.try_retry():
                 raise e
             else:
-                wait_time = backoff_factor**attempt
-                await asyncio.sleep(wait_time)
+                await asyncio.sleep(backoff_delay(attempt))
                 continue
 
 
 async def main():
-    buff_price, steam_price, skin_image_url = await fetch_buff_and_steam_skin_data(42389)
+    async with UpstreamClient() as upstream:
+        buff_price, steam_price, skin_image_url = await fetch_buff_and_steam_skin_data(upstream, 42389)
+        print("Connections:", upstream.stats())
     print("Buff price:", buff_price)
     print("Steam price:", steam_price)
     print("Skin image URL:", skin_image_url)
@@ -0,0 +1,234 @@
+import argparse
+import ast
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import utils.buff163_utils as buff_utils  # noqa: E402
+from utils.http_client import UpstreamClient  # noqa: E402
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_SCHEMA = pa.schema(
+    [
+        ("buff_id", pa.int32()),
+        ("observed_at", pa.timestamp("s", tz="UTC")),
+        ("buff_price_usd", pa.float32()),
+        ("steam_price_usd", pa.float32()),
+        ("listing_count", pa.int32()),
+        ("error", pa.string()),
+    ]
+)
+
+
+def iter_goods_ids(txt_file):
+    """Streams goods IDs from buffids.txt ("<buff_id>;<raw name>" per line)"""
+    with open(txt_file) as file:
+        for line in file:
+            if line.strip():
+                yield int(line.split(";", 1)[0])
+
+
+async def start_stub(port, example_file="data/example_buff_resp", error_rate=0.0):
+    """A local stand-in for Buff's sell_order endpoint, answering every goods_id with the example response.
+
+    `error_rate` of the requests get a 500, to exercise retries and error rows.
+    """
+    with open(example_file) as file:
+        example = ast.literal_eval(file.read())
+    goods_info = next(iter(example["data"]["goods_infos"].values()))
+
+    async def handle(request):
+        if random.random() < error_rate:
+            return web.Response(status=500)
+        goods_id = request.query["goods_id"]
+        body = {**example, "data": {**example["data"], "goods_infos": {goods_id: goods_info}}}
+        return web.Response(text=json.dumps(body), content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get("/api/market/goods/sell_order", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+class SnapshotWriter:
+    """Appends crawl results as numbered Parquet part files in `out_dir`.
+
+    The part files are the checkpoint: each is written to a temp file and renamed into place, so a
+    part either exists complete or not at all, and a restarted crawl skips every goods ID already in
+    one. Rows with an error are kept too, `--retry-failed` crawls those again, so when reading the
+    snapshot back the latest row per buff_id wins.
+    """
+
+    def __init__(self, out_dir, batch_size=500):
+        self.out_dir = out_dir
+        self.batch_size = batch_size
+        self._rows = []
+        os.makedirs(out_dir, exist_ok=True)
+        self._next_part = len(self.parts())
+
+    def parts(self):
+        return sorted(glob.glob(os.path.join(self.out_dir, "part-*.parquet")))
+
+    def completed_ids(self, retry_failed=False):
+        done = set()
+        for part in self.parts():
+            table = pq.read_table(part, columns=["buff_id", "error"])
+            for buff_id, error in zip(table.column("buff_id").to_pylist(), table.column("error").to_pylist()):
+                if error is None or not retry_failed:
+                    done.add(buff_id)
+        return done
+
+    def add(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows, schema=SNAPSHOT_SCHEMA)
+        path = os.path.join(self.out_dir, f"part-{self._next_part:05d}.parquet")
+        pq.write_table(table, f"{path}.tmp", compression="zstd")
+        os.replace(f"{path}.tmp", path)
+        self._next_part += 1
+        self._rows = []
+
+
+class CrawlProgress:
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.errors = 0
+        self.started = time.monotonic()
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else float("inf")
+        log.info(
+            "%s/%s goods IDs, %.1f/s, error rate %.1f%%, ETA %s",
+            self.done,
+            self.total,
+            rate,
+            self.errors / self.done * 100 if self.done else 0.0,
+            f"{eta / 60:.1f}m" if eta != float("inf") else "?",
+        )
+
+
+async def crawl_one(client, buff_id):
+    observed_at = int(time.time())
+    try:
+        data = await buff_utils.fetch_buff_data(client, buff_id)
+        if data is None:
+            raise ValueError("No listings")
+        item_data = await buff_utils.parse_for_relevant_item_data(data, buff_id)
+    except Exception as e:
+        return {"buff_id": buff_id, "observed_at": observed_at, "error": f"{type(e).__name__}: {e}"[:200]}
+
+    steam_price = item_data["steam_price_usd"]
+    return {
+        "buff_id": buff_id,
+        "observed_at": observed_at,
+        "buff_price_usd": float(item_data["buff_price_usd"]),
+        "steam_price_usd": steam_price if isinstance(steam_price, float) else None,
+        "listing_count": data.data.total_count,
+        "error": None,
+    }
+
+
+async def crawl(txt_file, out_dir, concurrency=8, batch_size=500, retry_failed=False, report_every=10.0):
+    writer = SnapshotWriter(out_dir, batch_size)
+    completed = writer.completed_ids(retry_failed)
+    todo = (buff_id for buff_id in iter_goods_ids(txt_file) if buff_id not in completed)
+    progress = CrawlProgress(sum(1 for _ in iter_goods_ids(txt_file)) - len(completed))
+    log.info("Resuming with %s goods IDs already crawled, %s to go", len(completed), progress.total)
+
+    # Bounded queue: IDs are streamed from the file, never all held in memory at once
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def worker(client):
+        while True:
+            buff_id = await queue.get()
+            if buff_id is None:
+                return
+            row = await crawl_one(client, buff_id)
+            writer.add(row)
+            progress.done += 1
+            progress.errors += row["error"] is not None
+
+    async def reporter():
+        while True:
+            await asyncio.sleep(report_every)
+            progress.report()
+
+    buff_pool = {"limit": concurrency, "connect": 5.0, "read": 15.0, "total": 30.0}
+    async with UpstreamClient({"buff": buff_pool}) as upstream:
+        client = SimpleNamespace(upstream=upstream)
+        workers = [asyncio.create_task(worker(client)) for _ in range(concurrency)]
+        reporting = asyncio.create_task(reporter())
+        try:
+            for buff_id in todo:
+                await queue.put(buff_id)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            reporting.cancel()
+            for task in workers:
+                task.cancel()
+            # Whatever finished before a crash or Ctrl-C is kept for the next run
+            writer.flush()
+
+        progress.report()
+        log.info("HTTP pool: %s", upstream.stats().get("buff"))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(description="Snapshot Buff prices for the whole catalogue into Parquet")
+    parser.add_argument("--ids", default="data/buffids.txt", help="Goods ID list, one '<buff_id>;<name>' per line")
+    parser.add_argument("--out", default="data/price_snapshot", help="Directory for the Parquet part files")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per Parquet part file")
+    parser.add_argument("--retry-failed", action="store_true", help="Crawl goods IDs that failed last time again")
+    parser.add_argument("--api-url", help="sell_order endpoint to crawl, e.g. a local stub server")
+    parser.add_argument("--rate", type=float, help="Requests per second across all workers")
+    parser.add_argument("--stub-port", type=int, help="Crawl a local stub Buff server started on this port")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Share of stub requests that fail")
+    args = parser.parse_args()
+
+    if args.api_url:
+        buff_utils.BUFF_API_URL = args.api_url
+    if args.rate:
+        buff_utils.buff_rate_limiter.rate = args.rate
+        buff_utils.buff_rate_limiter.burst = max(1, int(args.rate))
+
+    async def main():
+        if args.stub_port is None:
+            return await crawl(args.ids, args.out, args.concurrency, args.batch_size, args.retry_failed)
+        runner = await start_stub(args.stub_port, error_rate=args.stub_error_rate)
+        buff_utils.BUFF_API_URL = f"http://127.0.0.1:{args.stub_port}/api/market/goods/sell_order"
+        try:
+            await crawl(args.ids, args.out, args.concurrency, args.batch_size, args.retry_failed)
+        finally:
+            await runner.cleanup()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        log.info("Interrupted, finished goods IDs are saved in %s and will be skipped next run", args.out)
@@ -2,7 +2,9 @@ import argparse
 import csv
 import re
 import sqlite3
+import time
 
+import numpy as np
 import pandas as pd
 
 
@@ -97,27 +99,85 @@ class CSItemsDatabase:
         self.conn.close()
 
 
+SKIN_WEAPONS = [
+    "Nova",
+    "M4A4",
+    "P250",
+    "Tec-9",
+    "MAC-10",
+    "AUG",
+    "CZ75-Auto",
+    "MP9",
+    "Dual Berettas",
+    "Five-SeveN",
+    "Desert Eagle",
+    "Glock-18",
+    "USP-S",
+    "P2000",
+    "MP7",
+    "M249",
+    "AK-47",
+    "AWP",
+    "FAMAS",
+    "G3SG1",
+    "Galil AR",
+    "M4A1-S",
+    "MAG-7",
+    "Negev",
+    "P90",
+    "PP-Bizon",
+    "R8 Revolver",
+    "SCAR-20",
+    "SG 553",
+    "SSG 08",
+    "Sawed-Off",
+    "UMP-45",
+    "XM1014",
+    "MP5-SD",
+]
+CAPSULE_KEYWORDS = ["Capsule", "Challengers", "Legends", "Patch Pack", "2020 RMR Contenders"]
+CASE_KEYWORDS = ["Case", "Package", "Parcel", "Pallet of Presents", "Radicals Box"]
+KNIFE_KEYWORDS = ["Bayonet", "Karambit", "Knife", "Daggers"]
+OTHER_KEYWORDS = ["Sticker", "Pin", "Music Kit", "Pass", "Overpass", "Graffiti", "Case Hardened", "Patch", "★"]
+
+ALL_KEYWORDS = sorted(
+    set(SKIN_WEAPONS + CAPSULE_KEYWORDS + CASE_KEYWORDS + KNIFE_KEYWORDS + OTHER_KEYWORDS), key=len, reverse=True
+)
+# One pass over the name finds every keyword, the lookahead lets matches overlap. Only the longest keyword
+# starting at a position is reported, so shorter keywords inside it ("Case" in "Case Hardened") are implied.
+# The leading character class skips positions where no keyword can start without trying every alternative.
+KEYWORD_PATTERN = re.compile(
+    f"(?=[{''.join(sorted({re.escape(keyword[0]) for keyword in ALL_KEYWORDS}))}])"
+    f"(?=({'|'.join(re.escape(keyword) for keyword in ALL_KEYWORDS)}))"
+)
+IMPLIED_KEYWORDS = {
+    keyword: frozenset(other for other in ALL_KEYWORDS if other in keyword) for keyword in ALL_KEYWORDS
+}
+
+WEAR_PATTERN = re.compile(r"\((.*?)\)")
+NAME_CLEANUP_PATTERN = re.compile(r"\s*\((.*?)\)|StatTrak™ |Souvenir ")
+YEAR_MAJOR_PATTERN = re.compile(r"([^|]+) (\d{4})")
+SKIN_LINE_PATTERN = re.compile(r"\| (.+?) \(")
+WEAPON_TYPE_PATTERN = re.compile(r"^(.+?) \|")
+
+
 class CSItemsParser:
     @staticmethod
-    def parse_txt_file(txt_file):
-        items = []
+    def iter_txt_file(txt_file):
+        """Yields parsed item tuples one line at a time"""
         with open(txt_file, "r") as file:
             for line in file:
                 buff_id, raw_name = line.strip().split(";", 1)
-                buff_id = int(buff_id)
-
-                # Parse item details
-                item_data = CSItemsParser.parse_item_details(raw_name)
-                item_data = (buff_id, *item_data)
-
-                items.append(item_data)
+                yield (int(buff_id), *CSItemsParser.parse_item_details(raw_name))
 
-        return items
+    @staticmethod
+    def parse_txt_file(txt_file):
+        return list(CSItemsParser.iter_txt_file(txt_file))
 
     @staticmethod
     def parse_item_details(raw_name):
         # Check for wear, StatTrak, and Souvenir
-        wear = re.search(r"\((.*?)\)", raw_name)
+        wear = WEAR_PATTERN.search(raw_name)
         wear = wear.group(1) if wear else None
         is_stattrak = "StatTrak" in raw_name
         is_souvenir = "Souvenir" in raw_name
@@ -135,77 +195,43 @@ class CSItemsParser:
         weapon_type = CSItemsParser.get_weapon_type(raw_name, item_type)
 
         # Clean up the name
-        name = re.sub(r"\s*\((.*?)\)|StatTrak™ |Souvenir ", "", raw_name)
+        name = NAME_CLEANUP_PATTERN.sub("", raw_name)
 
         return name, raw_name, wear, is_stattrak, is_souvenir, item_type, major_year, major, skin_line, weapon_type
 
+    @staticmethod
+    def find_keywords(name):
+        found = set()
+        for keyword in KEYWORD_PATTERN.findall(name):
+            found |= IMPLIED_KEYWORDS[keyword]
+        return found
+
     @staticmethod
     def get_item_type(name):
-        wear = re.search(r"\((.*?)\)", name)
-        wear = wear.group(1) if wear else None
+        found = CSItemsParser.find_keywords(name)
 
-        skin_weapons = [
-            "Nova",
-            "M4A4",
-            "P250",
-            "Tec-9",
-            "MAC-10",
-            "AUG",
-            "CZ75-Auto",
-            "MP9",
-            "Dual Berettas",
-            "Five-SeveN",
-            "Desert Eagle",
-            "Glock-18",
-            "USP-S",
-            "P2000",
-            "MP7",
-            "M249",
-            "AK-47",
-            "AWP",
-            "FAMAS",
-            "G3SG1",
-            "Galil AR",
-            "M4A1-S",
-            "MAG-7",
-            "Negev",
-            "P90",
-            "PP-Bizon",
-            "R8 Revolver",
-            "SCAR-20",
-            "SG 553",
-            "SSG 08",
-            "Sawed-Off",
-            "UMP-45",
-            "XM1014",
-            "MP5-SD",
-        ]
-
-        if any(x in name for x in ["Capsule", "Challengers", "Legends", "Patch Pack", "2020 RMR Contenders"]):
+        if found.intersection(CAPSULE_KEYWORDS):
             return "Capsule"
-        elif "Sticker" in name:
+        elif "Sticker" in found:
             return "Sticker"
-        elif "Pin" in name:
+        elif "Pin" in found:
             return "Pin"
-        elif "Music Kit" in name:
+        elif "Music Kit" in found:
             return "Music Kit"
-        elif "Pass" in name and "Overpass" not in name:
+        elif "Pass" in found and "Overpass" not in found:
             return "Pass"
-        elif "Graffiti" in name:
+        elif "Graffiti" in found:
             return "Graffiti"
-        elif (
-            any(x in name for x in ["Case", "Package", "Parcel", "Pallet of Presents", "Radicals Box"])
-            and "Case Hardened" not in name
-        ):
+        elif found.intersection(CASE_KEYWORDS) and "Case Hardened" not in found:
             return "Case"
-        elif "Patch" in name:
+        elif "Patch" in found:
             return "Patch"
-        elif "★" in name:
-            if any(x in name for x in ["Bayonet", "Karambit", "Knife", "Daggers"]):
+        elif "★" in found:
+            if found.intersection(KNIFE_KEYWORDS):
                 return "Knife"
             else:
                 return "Gloves"
-        elif any(x in name for x in skin_weapons):
+        elif found.intersection(SKIN_WEAPONS):
             return "Skin"
         else:
             return "Other"
@@ -215,8 +241,7 @@ class CSItemsParser:
         if item_type not in ["Sticker", "Capsule"]:
             return None, None
 
-        year_major_pattern = re.compile(r"([^|]+) (\d{4})")
-        year_major_match = year_major_pattern.search(item_name)
+        year_major_match = YEAR_MAJOR_PATTERN.search(item_name)
 
         if year_major_match:
             major = year_major_match.group(1).strip().rsplit(" ", 1)[-1]
@@ -229,8 +254,7 @@ class CSItemsParser:
         if item_type not in ["Skin", "Knife", "Gloves"]:
             return None
 
-        skin_line_pattern = re.compile(r"\| (.+?) \(")
-        skin_line_match = skin_line_pattern.search(name)
+        skin_line_match = SKIN_LINE_PATTERN.search(name)
 
         if skin_line_match:
             return skin_line_match.group(1).strip()
@@ -243,25 +267,120 @@ class CSItemsParser:
             return None
 
         cleaned_name = name.replace("Souvenir ", "").replace("StatTrak™ ", "")
-        weapon_type_pattern = re.compile(r"^(.+?) \|")
-        weapon_type_match = weapon_type_pattern.search(cleaned_name)
+        weapon_type_match = WEAPON_TYPE_PATTERN.search(cleaned_name)
 
         if weapon_type_match:
             return weapon_type_match.group(1).strip()
         else:
             return None
 
+    @staticmethod
+    def parse_txt_file_vectorized(txt_file):
+        """Same output as parse_txt_file, but classifies the whole file at once with pandas .str operations"""
+        with open(txt_file, "r") as file:
+            lines = pd.Series(file.read().splitlines()).str.strip()
+        split = lines.str.split(";", n=1, expand=True)
+        buff_ids = split[0].astype(int)
+        raw = split[1]
+
+        def contains(keywords):
+            return raw.str.contains("|".join(re.escape(keyword) for keyword in keywords), regex=True)
+
+        has_star = raw.str.contains("★", regex=False)
+        item_type = np.select(
+            [
+                contains(CAPSULE_KEYWORDS),
+                raw.str.contains("Sticker", regex=False),
+                raw.str.contains("Pin", regex=False),
+                raw.str.contains("Music Kit", regex=False),
+                raw.str.contains("Pass", regex=False) & ~raw.str.contains("Overpass", regex=False),
+                raw.str.contains("Graffiti", regex=False),
+                contains(CASE_KEYWORDS) & ~raw.str.contains("Case Hardened", regex=False),
+                raw.str.contains("Patch", regex=False),
+                has_star & contains(KNIFE_KEYWORDS),
+                has_star,
+                contains(SKIN_WEAPONS),
+            ],
+            ["Capsule", "Sticker", "Pin", "Music Kit", "Pass", "Graffiti", "Case", "Patch", "Knife", "Gloves", "Skin"],
+            default="Other",
+        )
+        item_type = pd.Series(item_type, index=raw.index)
+
+        is_sticker_or_capsule = item_type.isin(["Sticker", "Capsule"])
+        is_weapon = item_type.isin(["Skin", "Knife", "Gloves"])
+
+        year_major = raw.str.extract(YEAR_MAJOR_PATTERN)
+        major_year = year_major[1].where(is_sticker_or_capsule)
+        major = year_major[0].str.strip().str.rsplit(" ", n=1).str[-1].where(is_sticker_or_capsule)
+
+        skin_line = raw.str.extract(SKIN_LINE_PATTERN)[0].str.strip().where(is_weapon)
+        cleaned = raw.str.replace("Souvenir ", "", regex=False).str.replace("StatTrak™ ", "", regex=False)
+        weapon_type = cleaned.str.extract(WEAPON_TYPE_PATTERN)[0].str.strip().where(is_weapon)
+
+        frame = pd.DataFrame(
+            {
+                "buff_id": buff_ids,
+                "name": raw.str.replace(NAME_CLEANUP_PATTERN, "", regex=True),
+                "raw_name": raw,
+                "wear": raw.str.extract(WEAR_PATTERN)[0],
+                "is_stattrak": raw.str.contains("StatTrak", regex=False),
+                "is_souvenir": raw.str.contains("Souvenir", regex=False),
+                "item_type": item_type,
+                "major_year": major_year,
+                "major": major,
+                "skin_line": skin_line,
+                "weapon_type": weapon_type,
+            }
+        )
+
+        # Back to the plain Python tuples parse_txt_file produces
+        frame = frame.astype(object).where(frame.notna(), None)
+        frame["major_year"] = pd.Series(
+            [None if year is None else int(year) for year in frame["major_year"]], index=frame.index, dtype=object
+        )
+        return list(frame.itertuples(index=False, name=None))
+
+
+def benchmark_parsers(txt_file, runs=5):
+    """Times the streaming and vectorized parsers and checks they produce the same rows"""
+    results = {}
+    for label, parse in [
+        ("streaming", CSItemsParser.parse_txt_file),
+        ("vectorized", CSItemsParser.parse_txt_file_vectorized),
+    ]:
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            results[label] = parse(txt_file)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        count = len(results[label])
+        print(f"{label:<11} {count} items, best of {runs}: {best:.3f}s ({count / best:,.0f} items/s)")
+
+    if results["streaming"] != results["vectorized"]:
+        raise SystemExit("Streaming and vectorized parsers disagree")
+    print("Outputs identical")
+
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--sample", help="Create a sample CSV file", action="store_true")
+    parser.add_argument("--vectorized", help="Classify buffids.txt with pandas in one pass", action="store_true")
+    parser.add_argument("--benchmark", help="Compare the parsers on buffids.txt and exit", action="store_true")
     args = parser.parse_args()
 
+    if args.benchmark:
+        benchmark_parsers("data/buffids.txt")
+        return
+
     # Create the CSItemsDatabase and CSItemsParser instances
     db = CSItemsDatabase("data/cs_items.db")
     db.create_items_table()
 
-    items = CSItemsParser.parse_txt_file("data/buffids.txt")
+    if args.vectorized:
+        items = CSItemsParser.parse_txt_file_vectorized("data/buffids.txt")
+    else:
+        items = CSItemsParser.iter_txt_file("data/buffids.txt")
 
     # Insert the items into the database
     for item in items:
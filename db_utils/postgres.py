@@ -1,10 +1,69 @@
 import argparse
+import hashlib
+import io
+import logging
+import math
 import os
-from sqlalchemy import create_engine, Table, Column, Integer, String, Boolean, MetaData, ForeignKey, select
+import time
+from sqlalchemy import create_engine, Table, Column, Integer, String, Boolean, MetaData, bindparam, select
 
 import pandas as pd
 
+from create_db import CSItemsParser
+from migrate_option_sets import migrate as migrate_option_sets
+
+log = logging.getLogger(__name__)
+
 POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD')
+COPY_CHUNK_SIZE = 50_000
+
+ITEM_COLUMNS = [
+    "buff_id",
+    "name",
+    "raw_name",
+    "wear",
+    "is_stattrak",
+    "is_souvenir",
+    "item_type",
+    "major_year",
+    "major",
+    "skin_line",
+    "weapon_type",
+]
+BUFF163_COLUMNS = [
+    "name",
+    "skin_line",
+    "drop_down_index",
+    "option_index",
+    "button_text",
+    "option_text",
+    "option_value",
+    "additional_options",
+]
+BUFF163_INT_COLUMNS = {"drop_down_index", "option_index"}
+
+
+def normalize_value(value):
+    # pandas hands back NaN for empty cells and floats for int columns with gaps, the database doesn't
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+def parse_buff163_row(row):
+    """A buff163 row read as raw strings (BUFF163_COLUMNS order) as Postgres stores it: NULL for empty cells, ints
+    for the index columns"""
+    return tuple(
+        None if value == "" else int(value) if column in BUFF163_INT_COLUMNS else value
+        for column, value in zip(BUFF163_COLUMNS, row)
+    )
+
+
+def content_hash(values):
+    return hashlib.blake2b(repr(tuple(normalize_value(value) for value in values)).encode(), digest_size=16).digest()
 
 class CSItemsDatabase:
     def __init__(self):
@@ -106,19 +165,188 @@ class CSItemsDatabase:
         float_ranges_data = float_ranges_data[float_ranges_data['button_text'] == 'Float Range']
         self.insert_float_ranges_data(float_ranges_data)
     
+    def bulk_load(self, table, chunks, index_columns=(), dedupe=False, cluster=False):
+        """Streams DataFrame chunks into a staging copy of `table` with COPY FROM STDIN and swaps it in.
+
+        Indexes are built after the load, and the staging table replaces `table` with renames inside one
+        transaction, so readers only ever see the old or the new table. Returns the number of rows loaded.
+        """
+        staging_name = f"{table.name}_staging"
+        columns = [column.name for column in table.columns if not column.primary_key]
+        staging = Table(
+            staging_name,
+            MetaData(),
+            *[Column(column.name, column.type, primary_key=column.primary_key) for column in table.columns],
+        )
+
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {staging_name}")
+            raw.commit()
+            staging.create(self.engine)
+
+            copy_sql = f"COPY {staging_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+            rows = 0
+            start = time.perf_counter()
+            for chunk in chunks:
+                buffer = io.StringIO()
+                chunk[columns].to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                cursor.copy_expert(copy_sql, buffer)
+                rows += len(chunk)
+                log.info(f"{staging_name}: {rows} rows, {rows / (time.perf_counter() - start):,.0f} rows/s")
+
+            if dedupe:
+                # Chunks are deduplicated as they stream in, this catches duplicates across chunks
+                cursor.execute(
+                    f"DELETE FROM {staging_name} WHERE id NOT IN "
+                    f"(SELECT min(id) FROM {staging_name} GROUP BY {', '.join(columns)})"
+                )
+                rows -= cursor.rowcount
+
+            index_name = f"ix_{table.name}_{'_'.join(index_columns)}"
+            if index_columns:
+                cursor.execute(f"CREATE INDEX {index_name}_staging ON {staging_name} ({', '.join(index_columns)})")
+                if cluster:
+                    cursor.execute(f"CLUSTER {staging_name} USING {index_name}_staging")
+            cursor.execute(f"ANALYZE {staging_name}")
+
+            # Atomic swap, the old table (and its index/constraint names) is gone before the new one takes them
+            cursor.execute(f"DROP TABLE IF EXISTS {table.name}_old")
+            cursor.execute(f"ALTER TABLE IF EXISTS {table.name} RENAME TO {table.name}_old")
+            cursor.execute(f"ALTER TABLE {staging_name} RENAME TO {table.name}")
+            cursor.execute(f"DROP TABLE IF EXISTS {table.name}_old")
+            cursor.execute(f"ALTER TABLE {table.name} RENAME CONSTRAINT {staging_name}_pkey TO {table.name}_pkey")
+            if index_columns:
+                cursor.execute(f"ALTER INDEX {index_name}_staging RENAME TO {index_name}")
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+
+        elapsed = time.perf_counter() - start
+        log.info(f"Loaded {rows} rows into {table.name} in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+        return rows
+
+    def iter_buff163_chunks(self, csv_file, chunk_size=COPY_CHUNK_SIZE):
+        # Raw strings: inferred dtypes differ from chunk to chunk, and would turn the same 5 into 5.0 in another chunk
+        for chunk in pd.read_csv(csv_file, chunksize=chunk_size, dtype=str, keep_default_na=False):
+            chunk = chunk.drop(columns=["buff_id", "raw_name", "wear"])
+            chunk = chunk[chunk["button_text"] != "Float Range"]
+            yield chunk.drop_duplicates()
+
+    def bulk_load_buff163_data(self, csv_file, chunk_size=COPY_CHUNK_SIZE, cluster=False):
+        """Loads the buff163 option dump, ordered by a (name, button_text, option_index) index"""
+        return self.bulk_load(
+            self.metadata.tables['buff163'],
+            self.iter_buff163_chunks(csv_file, chunk_size),
+            index_columns=("name", "button_text", "option_index"),
+            dedupe=True,
+            cluster=cluster,
+        )
+
+    def sync_items(self, connection, txt_file):
+        """Applies only the inserts, updates and deletes needed to match buffids.txt, on the caller's transaction"""
+        items = self.metadata.tables['items']
+        incoming = {item[0]: item for item in CSItemsParser.iter_txt_file(txt_file)}
+
+        stored = {
+            row.buff_id: content_hash(row)
+            for row in connection.execute(select(*[items.c[column] for column in ITEM_COLUMNS]))
+        }
+
+        inserts, updates = [], []
+        for buff_id, item in incoming.items():
+            if buff_id not in stored:
+                inserts.append(dict(zip(ITEM_COLUMNS, item)))
+            elif stored[buff_id] != content_hash(item):
+                updates.append({"match_buff_id": buff_id, **dict(zip(ITEM_COLUMNS, item))})
+        deletes = [buff_id for buff_id in stored if buff_id not in incoming]
+
+        if inserts:
+            connection.execute(items.insert(), inserts)
+        if updates:
+            connection.execute(items.update().where(items.c.buff_id == bindparam("match_buff_id")), updates)
+        if deletes:
+            connection.execute(items.delete().where(items.c.buff_id.in_(deletes)))
+
+        return {
+            "inserted": len(inserts),
+            "updated": len(updates),
+            "deleted": len(deletes),
+            "unchanged": len(incoming) - len(inserts) - len(updates),
+        }
+
+    def sync_buff163_data(self, connection, csv_file):
+        """Diffs the option dump against buff163 by row content, deleting and inserting only what changed"""
+        buff163 = self.metadata.tables['buff163']
+        incoming = {}
+        for chunk in self.iter_buff163_chunks(csv_file):
+            for row in chunk[BUFF163_COLUMNS].itertuples(index=False, name=None):
+                row = parse_buff163_row(row)
+                incoming[content_hash(row)] = row
+
+        stored = {}
+        for row in connection.execute(select(buff163.c.id, *[buff163.c[column] for column in BUFF163_COLUMNS])):
+            stored.setdefault(content_hash(row[1:]), []).append(row.id)
+
+        inserts = [dict(zip(BUFF163_COLUMNS, row)) for digest, row in incoming.items() if digest not in stored]
+        # Duplicate stored rows collapse to one, the extra copies go with the removed rows
+        deletes = [row_id for digest, ids in stored.items() for row_id in (ids if digest not in incoming else ids[1:])]
+
+        if inserts:
+            connection.execute(buff163.insert(), inserts)
+        if deletes:
+            connection.execute(buff163.delete().where(buff163.c.id.in_(deletes)))
+
+        return {
+            "inserted": len(inserts),
+            "deleted": len(deletes),
+            "unchanged": len(incoming) - len(inserts),
+        }
+
+    def sync_all(self, txt_file="data/buffids.txt", csv_file="data/buff163_data.csv"):
+        """Syncs items, buff163 and its option sets in one transaction, a failure leaves all of them as they were"""
+        self.create_items_table()
+        self.create_buff163_table()
+
+        start = time.perf_counter()
+        with self.engine.begin() as connection:
+            report = {
+                "items": self.sync_items(connection, txt_file),
+                "buff163": self.sync_buff163_data(connection, csv_file),
+            }
+            rows, option_sets, dropdowns = migrate_option_sets(connection)
+            report["option_sets"] = {"option sets": option_sets, "dropdowns": dropdowns}
+        for table, changes in report.items():
+            log.info(f"{table}: " + ", ".join(f"{count} {change}" for change, count in changes.items()))
+        log.info(f"Sync finished in {time.perf_counter() - start:.1f}s")
+        return report
+
     def create_all(self):
         self.create_items_table()
         self.create_buff163_table()
-        self.load_buff163_data("data/buff163_data.csv")
-        self.sort_buff163_by_name()
-        self.remove_float_range_rows()
+        self.bulk_load_buff163_data("data/buff163_data.csv")
+        # The bot reads dropdowns from the normalized option sets, rebuild them from the new buff163
+        with self.engine.begin() as connection:
+            migrate_option_sets(connection)
         self.create_float_ranges_table()
         self.load_float_ranges_data("data/cs_items_float_ranges.csv")
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     parser = argparse.ArgumentParser(description='CS Items Database')
+    parser.add_argument(
+        "--sync", help="Apply only the changes since the last load instead of rebuilding", action="store_true"
+    )
     args = parser.parse_args()
 
     db = CSItemsDatabase()
-    db.create_all()
+    if args.sync:
+        db.sync_all()
+    else:
+        db.create_all()
     
\ No newline at end of file
@@ -4,6 +4,8 @@ import discord
 from discord.ext import commands
 from discord.ext.commands import Context, Greedy
 
+import utils.buff163_utils as buff_utils
+
 
 class Admin(commands.Cog):
     """Admin-only commands that make the bot dynamic."""
@@ -44,6 +46,48 @@ class Admin(commands.Cog):
 
         await ctx.send(f"Synced the tree to {ret}/{len(guilds)}.")
 
+    @commands.command()
+    @commands.is_owner()
+    async def reloadcatalog(self, ctx: Context) -> None:
+        """Reloads the in-memory item catalogue after the items table was rebuilt."""
+        count = await ctx.bot.reload_item_catalog()
+        await ctx.send(f"Reloaded {count} items into the catalogue.")
+
+    @commands.command()
+    @commands.is_owner()
+    async def pricestats(self, ctx: Context) -> None:
+        """Shows stats for the caches, Buff limits, background jobs, price sources and HTTP pools."""
+        sections = {
+            "Price cache": ctx.bot.price_cache.stats(),
+            "Single-flight": buff_utils.buff_flight.stats(),
+            "Rate limiter": buff_utils.buff_rate_limiter.stats(),
+            "Retry budget": buff_utils.buff_retry_budget.stats(),
+            "Pre-warm": ctx.bot.price_refresher.stats(),
+            "Price history": ctx.bot.price_history.stats(),
+            "Charts": ctx.bot.chart_renderer.stats(),
+            "Analytics": ctx.bot.price_analytics.stats(),
+            "Alerts": ctx.bot.price_alerts.stats(),
+            "Listing queries": ctx.bot.query_planner.stats(),
+            **{f"Source {name}": stats for name, stats in ctx.bot.price_sources.stats().items()},
+            **{f"HTTP {name}": stats for name, stats in ctx.bot.upstream.stats().items()},
+        }
+
+        lines = []
+        for title, stats in sections.items():
+            values = ", ".join(
+                f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}" for key, value in stats.items()
+            )
+            lines.append(f"{title}: {values}")
+
+        # Stay under Discord's 2000 character message limit
+        chunk = []
+        for line in lines:
+            if chunk and sum(len(part) + 1 for part in chunk) + len(line) > 1900:
+                await ctx.send("```" + "\n".join(chunk) + "```")
+                chunk = []
+            chunk.append(line)
+        await ctx.send("```" + "\n".join(chunk) + "```")
+
 
 async def setup(bot):
     await bot.add_cog(Admin(bot))
@@ -0,0 +1,85 @@
+from typing import Literal, Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from cogs.pricecheck import select_record
+
+WEARS = Literal["Factory New", "Minimal Wear", "Field-Tested", "Well-Worn", "Battle-Scarred"]
+
+
+class PriceAlerts(commands.Cog):
+    """Per-user Buff price alerts, matched by the bot's PriceAlertEngine."""
+
+    alert = app_commands.Group(name="alert", description="Get notified when a Buff price crosses a threshold")
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.item_catalog = bot.item_catalog
+        self.engine = bot.price_alerts
+
+    @alert.command(name="add", description="Notify me when an item's Buff price crosses a threshold")
+    @app_commands.describe(
+        item="Item name",
+        price="Threshold in USD",
+        direction="Notify when the price drops below or rises above the threshold",
+        wear="Wear, defaults to the best available",
+        variant="Normal, StatTrak™ or Souvenir",
+    )
+    async def add(
+        self,
+        interaction: discord.Interaction,
+        item: str,
+        price: app_commands.Range[float, 0.01],
+        direction: Literal["below", "above"] = "below",
+        wear: Optional[WEARS] = None,
+        variant: Literal["regular", "stattrak", "souvenir"] = "regular",
+    ):
+        item_data = self.item_catalog.get(item)
+        record = select_record(item_data, variant, wear) if item_data else None
+        if record is None or (wear is not None and record.wear != wear):
+            await interaction.response.send_message("Invalid item. Please enter a valid item name.", ephemeral=True)
+            return
+
+        # Alerts set in a server are posted there, alerts set in DMs come back as a DM
+        channel_id = interaction.channel_id if interaction.guild_id is not None else None
+        try:
+            alert = await self.engine.add(interaction.user.id, channel_id, record.buff_id, direction, price)
+        except ValueError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return
+
+        await interaction.response.send_message(
+            f"Alert #{alert.id}: {record.raw_name} {direction} ${price:,.2f}", ephemeral=True
+        )
+
+    @alert.command(name="list", description="Show your active price alerts")
+    async def list_alerts(self, interaction: discord.Interaction):
+        alerts = self.engine.alerts_for(interaction.user.id)
+        if not alerts:
+            await interaction.response.send_message("You have no active price alerts.", ephemeral=True)
+            return
+
+        lines = []
+        for alert in alerts:
+            record = self.item_catalog.get_by_buff_id(alert.buff_id)
+            name = record.raw_name if record else f"Goods ID {alert.buff_id}"
+            lines.append(f"#{alert.id} {name} {alert.direction} ${alert.threshold:,.2f}")
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+    @alert.command(name="remove", description="Remove one of your price alerts")
+    @app_commands.describe(alert_id="The alert's number from /alert list")
+    async def remove(self, interaction: discord.Interaction, alert_id: int):
+        removed = await self.engine.remove(interaction.user.id, alert_id)
+        message = f"Removed alert #{alert_id}." if removed else f"You have no alert #{alert_id}."
+        await interaction.response.send_message(message, ephemeral=True)
+
+    @add.autocomplete(name="item")
+    async def item_autocomplete(self, interaction: discord.Interaction, value: str):
+        names = self.item_catalog.search_index.search(value, limit=25)
+        return [app_commands.Choice(name=skin, value=skin) for skin in names]
+
+
+async def setup(bot):
+    await bot.add_cog(PriceAlerts(bot))
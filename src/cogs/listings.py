@@ -0,0 +1,97 @@
+from typing import Literal, Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from cogs.alerts import WEARS
+from cogs.pricecheck import select_record
+from utils.query_planner import ListingSpec
+
+
+def parse_seeds(value):
+    """Comma separated paint seeds, e.g. "661, 670" """
+    return [int(seed) for seed in value.replace(" ", "").split(",") if seed]
+
+
+class Listings(commands.Cog):
+    """Cheapest individual listings by float and paint seed, planned into as few Buff queries as possible."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.item_catalog = bot.item_catalog
+        self.planner = bot.query_planner
+
+    @app_commands.command(name="listings", description="Cheapest Buff listings within a float range or paint seeds")
+    @app_commands.describe(
+        item="Item name",
+        wear="Wear",
+        max_float="Only floats below this",
+        min_float="Only floats from this up",
+        tier="Paint seed tier, e.g. Case Hardened blue gems",
+        seeds="Comma separated paint seeds",
+        variant="Normal, StatTrak™ or Souvenir",
+    )
+    async def listings(
+        self,
+        interaction: discord.Interaction,
+        item: str,
+        wear: WEARS,
+        max_float: Optional[app_commands.Range[float, 0.0, 1.0]] = None,
+        min_float: Optional[app_commands.Range[float, 0.0, 1.0]] = None,
+        tier: Optional[Literal["Tier1", "Tier2", "Tier3", "Tier4"]] = None,
+        seeds: Optional[str] = None,
+        variant: Literal["regular", "stattrak", "souvenir"] = "regular",
+    ):
+        item_data = self.item_catalog.get(item)
+        record = select_record(item_data, variant, wear) if item_data else None
+        if record is None or record.wear != wear:
+            await interaction.response.send_message("Invalid item. Please enter a valid item name.", ephemeral=True)
+            return
+        try:
+            paint_seeds = parse_seeds(seeds or "")
+        except ValueError:
+            await interaction.response.send_message("Paint seeds have to be numbers, e.g. 661, 670", ephemeral=True)
+            return
+
+        await interaction.response.defer(thinking=True)
+
+        float_ranges = []
+        if min_float is not None or max_float is not None:
+            float_ranges.append((min_float or 0.0, max_float if max_float is not None else 1.0))
+        spec = ListingSpec(record.buff_id, wear, float_ranges, tier=tier, paint_seeds=paint_seeds)
+
+        menus = await self.bot.filter_menus.get_menus(record.raw_name, wear)
+        try:
+            plan = self.planner.plan(spec, menus)
+        except ValueError as e:
+            await interaction.followup.send(str(e))
+            return
+
+        try:
+            results = await self.planner.execute(interaction.client, plan)
+        except Exception:
+            message = f"Couldn't fetch Buff listings for {record.raw_name}, please try again later."
+            await interaction.followup.send(message)
+            return
+
+        rows = ""
+        for price, paintwear, seed, _ in results:
+            paintwear = f"{paintwear:.6f}" if paintwear is not None else "N/A"
+            rows += f"${price:<11,.2f}| {paintwear:<11}| {seed if seed is not None else 'N/A'}\n"
+        header = f"{'Price':<12}| {'Float':<11}| Paint seed\n"
+        separator = f"{'-' * 12}|{'-' * 12}|{'-' * 11}\n"
+        embed = discord.Embed(
+            title=record.raw_name, description=f"```{header}{separator}{rows or 'No matching listings'}```"
+        )
+        embed.set_footer(text=f"{len(plan.queries)} Buff queries for {plan.naive_queries} filter combinations")
+        await interaction.followup.send(embed=embed)
+
+    @listings.autocomplete(name="item")
+    async def item_autocomplete(self, interaction: discord.Interaction, value: str):
+        names = self.item_catalog.search_index.search(value, limit=25)
+        return [app_commands.Choice(name=skin, value=skin) for skin in names]
+
+
+async def setup(bot):
+    await bot.add_cog(Listings(bot))
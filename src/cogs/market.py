@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+from typing import Literal, Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+# The item_type values create_db.py assigns
+ITEM_TYPES = Literal[
+    "Skin", "Knife", "Gloves", "Sticker", "Case", "Capsule", "Patch", "Music Kit", "Graffiti", "Pin", "Pass", "Other"
+]
+
+
+def format_item_rows(frame, value_header, value):
+    """A code block table of item name, Buff price and one extra column computed by `value(row)`"""
+    rows = "".join(
+        f"{row.raw_name[:34]:<35}| ${row.buff_price_usd:<10,.2f}| {value(row)}\n" for row in frame.itertuples()
+    )
+    header = f"{'Item':<35}| {'Buff Price':<11}| {value_header}\n"
+    separator = f"{'-' * 35}|{'-' * 12}|{'-' * 12}\n"
+    return f"```{header}{separator}{rows or 'No items match'}```"
+
+
+class Market(commands.Cog):
+    """Catalogue-wide rankings served from the price analytics snapshot."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.analytics = bot.price_analytics
+
+    def snapshot_embed(self, title, description):
+        embed = discord.Embed(title=title, description=description)
+        snapshot_at = self.analytics.snapshot_at
+        if snapshot_at is not None:
+            age = (datetime.now(timezone.utc) - snapshot_at).total_seconds()
+            embed.set_footer(text=f"{len(self.analytics.frame)} items · prices up to {age / 60:.0f}m old")
+        return embed
+
+    async def no_snapshot(self, interaction):
+        await interaction.response.send_message("Market data is still loading, please try again in a minute.")
+
+    @app_commands.command(name="spreads", description="Items cheapest on Buff compared to the Steam Market")
+    @app_commands.describe(item_type="Only this kind of item", min_price="Ignore items under this Buff price (USD)")
+    async def spreads(
+        self, interaction: discord.Interaction, item_type: Optional[ITEM_TYPES] = None, min_price: float = 1.0
+    ):
+        result = self.analytics.spreads(limit=15, item_type=item_type, min_price=min_price)
+        if result is None:
+            await self.no_snapshot(interaction)
+            return
+
+        table = format_item_rows(result, "Steam/Buff", lambda row: f"{row.spread_ratio:.2f}x")
+        await interaction.response.send_message(embed=self.snapshot_embed("Biggest Buff vs Steam spreads", table))
+
+    @app_commands.command(name="cheapest", description="Cheapest items of a kind on Buff")
+    @app_commands.describe(
+        item_type="Kind of item",
+        max_price="Only items under this Buff price (USD)",
+        weapon_type="e.g. Karambit, AK-47",
+        stattrak="Only StatTrak (True) or only non-StatTrak (False) items",
+    )
+    async def cheapest(
+        self,
+        interaction: discord.Interaction,
+        item_type: ITEM_TYPES,
+        max_price: Optional[float] = None,
+        weapon_type: Optional[str] = None,
+        stattrak: Optional[bool] = None,
+    ):
+        result = self.analytics.cheapest(item_type, max_price, weapon_type, stattrak, limit=15)
+        if result is None:
+            await self.no_snapshot(interaction)
+            return
+
+        table = format_item_rows(result, "Listings", lambda row: f"{row.listing_count}")
+        title = f"Cheapest {item_type}" + (f" under ${max_price:,.2f}" if max_price is not None else "")
+        await interaction.response.send_message(embed=self.snapshot_embed(title, table))
+
+    @app_commands.command(name="stattrakpremium", description="How much more StatTrak™ costs, by wear")
+    @app_commands.describe(item_type="Kind of item", weapon_type="Only this weapon, e.g. AK-47")
+    async def stattrakpremium(
+        self,
+        interaction: discord.Interaction,
+        item_type: Literal["Skin", "Knife"] = "Skin",
+        weapon_type: Optional[str] = None,
+    ):
+        result = self.analytics.stattrak_premium(item_type, weapon_type)
+        if result is None:
+            await self.no_snapshot(interaction)
+            return
+
+        rows = "".join(
+            f"{wear:<16}| {row['median']:<8.2f}x| {row['mean']:<8.2f}x| {row['count']:.0f}\n"
+            for wear, row in result.iterrows()
+        )
+        header = f"{'Wear':<16}| {'Median':<9}| {'Mean':<9}| Pairs\n"
+        separator = f"{'-' * 16}|{'-' * 10}|{'-' * 10}|{'-' * 6}\n"
+        title = f"StatTrak™ premium: {weapon_type or item_type}"
+        await interaction.response.send_message(
+            embed=self.snapshot_embed(title, f"```{header}{separator}{rows or 'No StatTrak pairs'}```")
+        )
+
+
+async def setup(bot):
+    await bot.add_cog(Market(bot))
@@ -1,43 +1,338 @@
+import asyncio
+import io
+import logging
+import os
+import time
+
 import discord
 from discord import app_commands
 from discord.ext import commands
 
 import utils.buff163_utils as buff_utils
-from models.item import Item
+from utils.charts import price_rows
+from utils.deadline import deadline, detached_task, within_deadline
+from utils.order_book import format_order_book, get_order_book
+from utils.price_sources import format_quote
+
+log = logging.getLogger(__name__)
+
+# Seconds a /pricecheck (or a button click) has to answer, shared by the price fetch and the extras; what
+# misses it is edited in later
+PRICECHECK_BUDGET = float(os.getenv("PRICECHECK_BUDGET", 2.5))
+LATE_UPDATE_TIMEOUT = float(os.getenv("PRICECHECK_LATE_UPDATE_TIMEOUT", 60))
+
+VARIANT_PREFIX = {"regular": "", "stattrak": "ST ", "souvenir": "SV "}
+
+VARIANT_LABEL = {"regular": "Normal", "stattrak": "StatTrak™", "souvenir": "Souvenir"}
+# Discord allows 5 buttons per row and 5 rows per message
+BUTTONS_PER_ROW = 5
+
+
+def price_age(buff_data, now=None):
+    fetched_at = buff_data.get("fetched_at") if buff_data else None
+    return None if fetched_at is None else (now or time.time()) - fetched_at
+
+
+def format_age(seconds):
+    return f"{seconds / 60:.0f}m" if seconds >= 60 else f"{seconds:.0f}s"
+
+
+def create_price_table(records, prices, selected=None, pending=(), stale_after=None):
+    """Rows still being fetched show "...", prices older than `stale_after` seconds get a "*" """
+    now = time.time()
+    rows = ""
+    for record in records:
+        label = f"{VARIANT_PREFIX[record.variant]}{record.wear or 'Price'}"
+        marker = ">" if record is selected else " "
+        buff_data = prices.get(record.buff_id)
+        buff_price = f"${buff_data['buff_price_usd']}" if buff_data else "..." if record.buff_id in pending else "N/A"
+        age = price_age(buff_data, now)
+        if stale_after is not None and age is not None and age > stale_after:
+            buff_price += "*"
+        steam_price = buff_data['steam_price_usd'] if buff_data else "N/A"
+        steam_price = f"${steam_price:,.2f}" if isinstance(steam_price, float) else "N/A"
+        rows += f"{marker}{label:<17}| {buff_price:<12}| {steam_price}\n"
+
+    header = f"{'Variant':<18}| {'Buff Price':<12}| Steam Price\n"
+    separator = f"{'-' * 18}|{'-' * 13}|{'-' * 12}\n"
+    return f"```{header}{separator}{rows}```"
+
+
+def button_custom_id(kind, variant, wear):
+    return f"pricecheck:{kind}:{variant}:{wear or 'none'}"
+
+
+def parse_custom_id(custom_id):
+    _, _, variant, wear = custom_id.split(":", 3)
+    return variant, None if wear == "none" else wear
+
+
+def select_record(item_data, variant, wear):
+    """The record for a variant/wear pick, falling back to the variant's first wear"""
+    records = item_data[f"{variant}_items"]
+    return next((record for record in records if record.wear == wear), records[0] if records else None)
+
+
+def selected_from_message(item_data, message):
+    """The selection a message currently shows, read back from its highlighted buttons"""
+    buttons = [
+        child
+        for row in message.components
+        for child in getattr(row, "children", ())
+        if isinstance(child, discord.Button) and (child.custom_id or "").startswith("pricecheck:")
+    ]
+    # The green variant button points at the exact selection, the blurple wear button does when there's one variant
+    for style in (discord.ButtonStyle.green, discord.ButtonStyle.blurple):
+        for button in buttons:
+            if button.style == style:
+                return select_record(item_data, *parse_custom_id(button.custom_id))
+    return None
+
+
+def build_price_view(item_data, selected):
+    """Buttons for the current selection.
+
+    The view is stopped before it's sent so discord.py doesn't keep an instance per message; the
+    custom_ids carry the variant and wear, and clicks are routed by the cog's on_interaction listener.
+    Wear buttons fill as many rows as they need (graffiti have up to 19 colours), variants go below them.
+    """
+    view = discord.ui.View(timeout=None)
+    wears = list(dict.fromkeys(record.wear for record in item_data[f"{selected.variant}_items"] if record.wear))
+    for index, wear in enumerate(wears):
+        view.add_item(
+            discord.ui.Button(
+                label=wear,
+                custom_id=button_custom_id("wear", selected.variant, wear),
+                style=discord.ButtonStyle.blurple if wear == selected.wear else discord.ButtonStyle.grey,
+                row=index // BUTTONS_PER_ROW,
+            )
+        )
+
+    variants = [variant for variant in VARIANT_PREFIX if item_data[f"{variant}_items"]]
+    variant_row = (len(wears) + BUTTONS_PER_ROW - 1) // BUTTONS_PER_ROW
+    if len(variants) > 1:
+        for variant in variants:
+            # Switching variant keeps the current wear when that variant has it
+            target = select_record(item_data, variant, selected.wear)
+            view.add_item(
+                discord.ui.Button(
+                    label=VARIANT_LABEL[variant],
+                    custom_id=button_custom_id("variant", variant, target.wear),
+                    style=discord.ButtonStyle.green if variant == selected.variant else discord.ButtonStyle.grey,
+                    row=variant_row,
+                )
+            )
+
+    view.stop()
+    return view
+
 
 class CS2SkinPrice(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.session = bot.SessionLocal()
+        self.item_catalog = bot.item_catalog
+        # Late edits in flight, referenced so they aren't garbage collected
+        self._updates = set()
 
-        with self.session:
-            self.all_item_names = [row.name for row in self.session.query(Item.name).distinct().all()]
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        """Routes every /pricecheck button click, including ones on messages sent before a restart.
 
-    @app_commands.command(name="pricecheck", description="Get skin prices for CS2 items")
-    async def pricecheck(self, interaction: discord.Interaction, item: str):
-        await interaction.response.defer(thinking=True)
-
-        if item not in self.all_item_names:
-            await interaction.followup.send("Invalid item. Please enter a valid item name.")
+        No per-message state is kept: the item comes from the message's embed title, the selection from
+        the clicked custom_id and the prices from the price cache. Matching on the custom_id prefix
+        rather than registering a persistent view means any wear name (sticker finishes, graffiti
+        colours) is routed without being known up front.
+        """
+        if interaction.type is not discord.InteractionType.component:
             return
+        custom_id = (interaction.data or {}).get("custom_id", "")
+        if custom_id.startswith("pricecheck:"):
+            await self.select_variant(interaction, *parse_custom_id(custom_id))
 
-        item_data = await buff_utils.get_all_relevant_items(self.session, item)
+    def update_embed(self, embed, records, prices, selected, pending=(), chart=None):
+        stale_after = self.bot.price_cache.ttl
+        embed.description = create_price_table(records, prices, selected, pending, stale_after)
 
-        if item_data['item_type'] in ["Skin", "Knife"]:
-            buff_id = item_data['regular_items'][0].buff_id
-            buff_data = await buff_utils.fetch_item_id_data(interaction, buff_id)
+        ages = [age for age in (price_age(prices.get(record.buff_id)) for record in records) if age is not None]
+        oldest = max(ages, default=0)
+        if pending:
+            stale_note = f"* cached, up to {format_age(oldest)} old · " if oldest > stale_after else ""
+            embed.set_footer(text=f"{stale_note}Updating {len(pending)} prices...")
+        elif oldest > stale_after:
+            embed.set_footer(text=f"* cached, up to {format_age(oldest)} old")
         else:
-            buff_id = item_data['regular_items'][0].buff_id
-            buff_data = await buff_utils.fetch_item_id_data(interaction, buff_id)
+            embed.remove_footer()
 
-        if buff_data['skin_image_url']:
-            embed = discord.Embed(
-                title=f"{item}", description=f"Buff Price: {buff_data['buff_price_usd']}"
-            )
-            embed.set_image(url=buff_data['skin_image_url'])
-            await interaction.followup.send(embed=embed)
-        else:
-            await interaction.followup.send(f"{item}\nBuff Price: {buff_data['buff_price_usd']}\nSteam Price: {buff_data['steam_price_usd']}")
+        buff_data = prices.get(selected.buff_id) or next(iter(prices.values()), None)
+        if buff_data and buff_data['skin_image_url']:
+            # With a chart attached the chart is the image and the skin goes in the thumbnail
+            skin_as_thumbnail = bool(embed.thumbnail) if chart is None else chart
+            if skin_as_thumbnail:
+                embed.set_thumbnail(url=buff_data['skin_image_url'])
+            else:
+                embed.set_image(url=buff_data['skin_image_url'])
+        return embed
+
+    async def fetch_prices(self, interaction, records):
+        """Prices within what's left of the command's deadline, returns (prices, pending ids to edit in later)"""
+        prices, errors = await buff_utils.fetch_prices_bulk(interaction.client, [record.buff_id for record in records])
+
+        # Timed out lookups keep running in the background, stale ones are being revalidated
+        pending = {buff_id for buff_id, error in errors.items() if isinstance(error, asyncio.TimeoutError)}
+        pending.update(
+            buff_id for buff_id, buff_data in prices.items() if (price_age(buff_data) or 0) > self.bot.price_cache.ttl
+        )
+        return prices, pending
+
+    def schedule_update(self, interaction, item, records, prices, pending, chart=False):
+        # Outside the command's deadline, the late edit has its own LATE_UPDATE_TIMEOUT
+        task = detached_task(self.update_later(interaction, item, records, prices, pending, chart))
+        self._updates.add(task)
+        task.add_done_callback(self._updates.discard)
+
+    async def update_later(self, interaction, item, records, prices, pending, chart):
+        """Edits a partial answer once the prices it was missing (or had stale) come in"""
+        pending = list(pending)
+        results = await asyncio.gather(
+            *[
+                asyncio.wait_for(buff_utils.await_fresh_item_data(interaction.client, buff_id), LATE_UPDATE_TIMEOUT)
+                for buff_id in pending
+            ],
+            return_exceptions=True,
+        )
+        prices = {
+            **prices,
+            **{buff_id: result for buff_id, result in zip(pending, results) if not isinstance(result, BaseException)},
+        }
+
+        png = None
+        if chart and prices:
+            try:
+                png = await self.render_chart(item, records, prices)
+            except Exception:
+                # A broken pool or plotting error still leaves the prices to edit in
+                log.exception("Couldn't render the price chart for %s", item)
+
+        try:
+            # Re-read the message so a button click made in the meantime isn't undone
+            message = await interaction.original_response()
+            item_data = self.item_catalog.get(item)
+            selected = (item_data and selected_from_message(item_data, message)) or records[0]
+            embed = self.update_embed(message.embeds[0], records, prices, selected, chart=png is not None or None)
+
+            if png is not None:
+                file = discord.File(io.BytesIO(png), filename="prices.png")
+                embed.set_image(url="attachment://prices.png")
+                await interaction.edit_original_response(embed=embed, attachments=[file])
+            else:
+                await interaction.edit_original_response(embed=embed)
+        except discord.HTTPException:
+            log.debug("Couldn't update the price check for %s", item, exc_info=True)
+
+    async def render_chart(self, item, records, prices):
+        variants = tuple(dict.fromkeys(row.variant for row in records))
+        return await self.bot.chart_renderer.render(item, variants, price_rows(records, prices, VARIANT_PREFIX))
+
+    async def select_variant(self, interaction: discord.Interaction, variant, wear):
+        message_embed = interaction.message.embeds[0] if interaction.message and interaction.message.embeds else None
+        item_data = self.item_catalog.get(message_embed.title) if message_embed else None
+        selected = select_record(item_data, variant, wear) if item_data else None
+        if selected is None:
+            await interaction.response.send_message("This price check is no longer available.", ephemeral=True)
+            return
+
+        with deadline(PRICECHECK_BUDGET):
+            # Acknowledge without touching the message, then edit it exactly once
+            await interaction.response.defer()
+            records = [*item_data['regular_items'], *item_data['stattrak_items'], *item_data['souvenir_items']]
+            prices, pending = await self.fetch_prices(interaction, records)
+            if not prices:
+                await interaction.followup.send(
+                    f"Couldn't fetch Buff prices for {message_embed.title}, please try again later.", ephemeral=True
+                )
+                return
+
+            embed = self.update_embed(message_embed, records, prices, selected, pending)
+            await interaction.edit_original_response(embed=embed, view=build_price_view(item_data, selected))
+            if pending:
+                self.schedule_update(interaction, message_embed.title, records, prices, pending)
+
+    @app_commands.command(name="pricecheck", description="Get skin prices for CS2 items")
+    @app_commands.describe(
+        order_book="Also show listing depth for the first priced variant",
+        chart="Attach a price chart",
+        markets="Compare the first priced variant across markets",
+    )
+    async def pricecheck(
+        self,
+        interaction: discord.Interaction,
+        item: str,
+        order_book: bool = False,
+        chart: bool = False,
+        markets: bool = False,
+    ):
+        # One budget for the whole command: the prices, then the extras with whatever is left of it
+        with deadline(PRICECHECK_BUDGET):
+            await interaction.response.defer(thinking=True)
+
+            if item not in self.item_catalog:
+                await interaction.followup.send("Invalid item. Please enter a valid item name.")
+                return
+
+            self.bot.price_refresher.record_request(item)
+
+            item_data = self.item_catalog.get(item)
+            records = [*item_data['regular_items'], *item_data['stattrak_items'], *item_data['souvenir_items']]
+
+            # Price every wear/variant at once within the budget, rows that fail just show N/A and rows
+            # still loading are edited in once they arrive
+            prices, pending = await self.fetch_prices(interaction, records)
+            if not prices and not pending:
+                await interaction.followup.send(f"Couldn't fetch Buff prices for {item}, please try again later.")
+                return
+
+            record = next((record for record in records if record.buff_id in prices), records[0])
+            view = build_price_view(item_data, record)
+
+            embed = discord.Embed(title=f"{item}")
+            label = f"{VARIANT_PREFIX[record.variant]}{record.wear or item}"
+            # The extras get what the prices left of the budget, whatever misses it is left out of the answer
+            if markets:
+                # Every source's timeout is capped at what's left of the deadline, the ones that miss it
+                # are reported as timed out while the rest are shown
+                quote = await self.bot.price_sources.quote(interaction.client, record)
+                embed.add_field(name=f"Markets: {label}", value=format_quote(quote), inline=False)
+            if order_book:
+                try:
+                    summary = await within_deadline(get_order_book(interaction.client, record.buff_id))
+                    embed.add_field(name=f"Order book: {label}", value=format_order_book(summary), inline=False)
+                except Exception:
+                    embed.add_field(name=f"Order book: {label}", value="Couldn't fetch listings", inline=False)
+
+            png = None
+            if chart and prices:
+                try:
+                    png = await within_deadline(self.render_chart(item, records, prices))
+                except asyncio.TimeoutError:
+                    pass
+                except Exception:
+                    # Answer without the chart rather than leaving the interaction hanging
+                    log.exception("Couldn't render the price chart for %s", item)
+                    chart = False
+
+            if png is not None:
+                embed.set_image(url="attachment://prices.png")
+                self.update_embed(embed, records, prices, record, pending, chart=True)
+                await interaction.followup.send(
+                    embed=embed, file=discord.File(io.BytesIO(png), filename="prices.png"), view=view
+                )
+            else:
+                self.update_embed(embed, records, prices, record, pending)
+                await interaction.followup.send(embed=embed, view=view)
+
+            # A chart that missed the budget (or has prices still to come) is attached by the later edit
+            if pending or (chart and png is None):
+                self.schedule_update(interaction, item, records, prices, pending, chart)
 
     @pricecheck.autocomplete(name="item")
     async def pricecheck_autocomplete(self, interaction: discord.Interaction, value: str):
@@ -46,8 +341,9 @@ class CS2SkinPrice(commands.Cog):
             return [app_commands.Choice(name=skin, value=skin) for skin in common_high_tier]
 
         suggestions = [
-            app_commands.Choice(name=skin, value=skin) for skin in self.all_item_names if value.lower() in skin.lower()
-        ][:25]
+            app_commands.Choice(name=skin, value=skin)
+            for skin in self.item_catalog.search_index.search(value, limit=25)
+        ]
 
         return suggestions
 
@@ -0,0 +1,96 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, select
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+Base = declarative_base()
+
+
+class OptionSet(Base):
+    """One dropdown's list of options, stored once and shared by every item that shows the same list"""
+
+    __tablename__ = "option_sets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    button_text = Column(String, nullable=False)
+    content_hash = Column(String(32), nullable=False, unique=True, index=True)
+
+    options = relationship("Option", back_populates="option_set", order_by="Option.option_index")
+
+    def __repr__(self):
+        return f"<OptionSet(id={self.id}, button_text={self.button_text})>"
+
+
+class Option(Base):
+    __tablename__ = "options"
+
+    id = Column(Integer, primary_key=True, index=True)
+    option_set_id = Column(Integer, ForeignKey("option_sets.id", ondelete="CASCADE"), nullable=False)
+    option_index = Column(Integer)
+    option_text = Column(String)
+    option_value = Column(String)
+
+    option_set = relationship("OptionSet", back_populates="options")
+    paint_seeds = relationship("PaintSeed", order_by="PaintSeed.paint_seed")
+
+    __table_args__ = (Index("ix_options_option_set_id_option_index", "option_set_id", "option_index"),)
+
+    def __repr__(self):
+        return f"<Option(id={self.id}, option_text={self.option_text}, option_value={self.option_value})>"
+
+
+class PaintSeed(Base):
+    """Paint seeds belonging to a paint seed tier option, previously a JSON list in additional_options"""
+
+    __tablename__ = "paint_seeds"
+
+    option_id = Column(Integer, ForeignKey("options.id", ondelete="CASCADE"), primary_key=True)
+    paint_seed = Column(Integer, primary_key=True)
+
+    __table_args__ = (Index("ix_paint_seeds_paint_seed", "paint_seed"),)
+
+    def __repr__(self):
+        return f"<PaintSeed(option_id={self.option_id}, paint_seed={self.paint_seed})>"
+
+
+class ItemOptionSet(Base):
+    """Links an item name's dropdown slot to its shared option set"""
+
+    __tablename__ = "item_option_sets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    skin_line = Column(String)
+    drop_down_index = Column(Integer)
+    button_text = Column(String, nullable=False)
+    option_set_id = Column(Integer, ForeignKey("option_sets.id"), nullable=False, index=True)
+
+    option_set = relationship("OptionSet")
+
+    __table_args__ = (Index("ix_item_option_sets_name_button_text", "name", "button_text"),)
+
+    def __repr__(self):
+        return f"<ItemOptionSet(name={self.name}, button_text={self.button_text}, option_set_id={self.option_set_id})>"
+
+
+def select_item_dropdowns(name):
+    """Every dropdown option for an item in one query, ordered by dropdown then option.
+
+    Paint seed tiers are outer joined in, so a tier option comes back once per paint seed and every other
+    option once with a NULL paint_seed.
+    """
+    return (
+        select(
+            ItemOptionSet.drop_down_index,
+            ItemOptionSet.button_text,
+            ItemOptionSet.option_set_id,
+            Option.id.label("option_id"),
+            Option.option_index,
+            Option.option_text,
+            Option.option_value,
+            PaintSeed.paint_seed,
+        )
+        .join(Option, Option.option_set_id == ItemOptionSet.option_set_id)
+        .outerjoin(PaintSeed, PaintSeed.option_id == Option.id)
+        .where(ItemOptionSet.name == name)
+        .order_by(ItemOptionSet.drop_down_index, Option.option_index, PaintSeed.paint_seed)
+    )
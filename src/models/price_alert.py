@@ -0,0 +1,33 @@
+from sqlalchemy import REAL, BigInteger, Column, DateTime, Index, Integer, String, func
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+
+class PriceAlert(Base):
+    """A user's one-shot alert on a goods ID's Buff price, `direction` "below" or "above" `threshold`"""
+
+    __tablename__ = "price_alerts"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, nullable=False)
+    # Where to post the notification, a DM to the user when empty
+    channel_id = Column(BigInteger)
+    buff_id = Column(Integer, nullable=False)
+    direction = Column(String(5), nullable=False)
+    threshold = Column(REAL, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    triggered_at = Column(DateTime(timezone=True))
+    triggered_price = Column(REAL)
+
+    __table_args__ = (
+        # Startup only loads alerts that haven't fired yet
+        Index("ix_price_alerts_active", "buff_id", postgresql_where=triggered_at.is_(None)),
+        Index("ix_price_alerts_user_id", "user_id"),
+    )
+
+    def __repr__(self):
+        return (
+            f"<PriceAlert(id={self.id}, buff_id={self.buff_id}, direction={self.direction}, "
+            f"threshold={self.threshold})>"
+        )
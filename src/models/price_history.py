@@ -0,0 +1,55 @@
+from sqlalchemy import REAL, Column, DateTime, Index, Integer, String, select
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+
+class PricePoint(Base):
+    """One observed Buff price. Range partitioned by day on observed_at so retention is a DROP TABLE"""
+
+    __tablename__ = "price_history"
+
+    buff_id = Column(Integer, primary_key=True)
+    observed_at = Column(DateTime(timezone=True), primary_key=True)
+    buff_price_usd = Column(REAL, nullable=False)
+    steam_price_usd = Column(REAL)
+    listing_count = Column(Integer)
+
+    __table_args__ = {"postgresql_partition_by": "RANGE (observed_at)"}
+
+    def __repr__(self):
+        return (
+            f"<PricePoint(buff_id={self.buff_id}, observed_at={self.observed_at}, "
+            f"buff_price_usd={self.buff_price_usd})>"
+        )
+
+
+class PriceRollup(Base):
+    """Hourly ("1h") and daily ("1d") OHLC-style buckets built from price_history"""
+
+    __tablename__ = "price_rollups"
+
+    buff_id = Column(Integer, primary_key=True)
+    resolution = Column(String(2), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    samples = Column(Integer, nullable=False)
+    buff_price_open = Column(REAL)
+    buff_price_high = Column(REAL)
+    buff_price_low = Column(REAL)
+    buff_price_close = Column(REAL)
+    buff_price_avg = Column(REAL)
+    steam_price_avg = Column(REAL)
+    listing_count_avg = Column(REAL)
+
+    __table_args__ = (Index("ix_price_rollups_resolution_bucket_start", "resolution", "bucket_start"),)
+
+    def __repr__(self):
+        return f"<PriceRollup(buff_id={self.buff_id}, resolution={self.resolution}, bucket_start={self.bucket_start})>"
+
+
+def select_price_rollups(buff_id, resolution, since):
+    return (
+        select(PriceRollup)
+        .where(PriceRollup.buff_id == buff_id, PriceRollup.resolution == resolution, PriceRollup.bucket_start >= since)
+        .order_by(PriceRollup.bucket_start)
+    )
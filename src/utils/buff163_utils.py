@@ -1,16 +1,65 @@
 import asyncio
+import os
+import time
 from urllib.parse import urlencode
 
-from sqlalchemy.orm import Session
-from models.item import Item
+from utils.buff_schema import decode_sell_order
+from utils.deadline import DeadlineExceeded, check_deadline, detached_task, remaining, within_deadline
+from utils.rate_limit import RetryBudget, TokenBucket, backoff_delay
+
+BUFF_API_URL = os.getenv("BUFF_API_URL", "https://buff.163.com/api/market/goods/sell_order")
+BULK_CONCURRENCY = int(os.getenv("BUFF_BULK_CONCURRENCY", 6))
+
+
+class NoListings(LookupError):
+    """Buff answered, but nobody is selling the item (with the given filters)"""
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight request.
+
+    The first caller for a key runs the request, callers arriving while it is still running await the
+    same task and receive the same result (or exception). The request runs outside the callers'
+    deadlines: each caller only stops waiting when its own deadline runs out, the request carries on
+    and fills the cache for whoever asks next.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.requests = 0
+        self.deduplicated = 0
+
+    async def do(self, key, fetch):
+        task = self._in_flight.get(key)
+        if task is None:
+            self.requests += 1
+            task = detached_task(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.deduplicated += 1
+
+        # Shield so one caller timing out or being cancelled doesn't cancel the request for the others
+        return await within_deadline(asyncio.shield(task))
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "deduplicated": self.deduplicated,
+            "in_flight": len(self._in_flight),
+        }
+
+
+# Process-wide, every sell_order fetch goes through this so identical queries share one request
+buff_flight = SingleFlight()
+
+# Process-wide limits shared by every Buff HTTP call
+buff_rate_limiter = TokenBucket(
+    rate=float(os.getenv("BUFF_REQUESTS_PER_SECOND", 4)),
+    burst=int(os.getenv("BUFF_BURST", 8)),
+)
+buff_retry_budget = RetryBudget(ratio=float(os.getenv("BUFF_RETRY_RATIO", 0.2)))
 
-WEAR_ORDER = {
-    "Factory New": 1,
-    "Minimal Wear": 2,
-    "Field-Tested": 3,
-    "Well-Worn": 4,
-    "Battle-Scarred": 5
-    }
 
 async def construct_buff_api_url(
     item_id,
@@ -34,6 +83,9 @@ async def construct_buff_api_url(
     max_fade=None,
     # Applied Patches
     extra_tag_ids=None,
+    # Pagination
+    page_num=None,
+    page_size=None,
 ):
     
     # Create a dictionary with the URL parameters
@@ -52,6 +104,8 @@ async def construct_buff_api_url(
         "min_fade": min_fade,
         "max_fade": max_fade,
         "extra_tag_ids": extra_tag_ids,
+        "page_num": page_num,
+        "page_size": page_size,
     }
 
     # Remove keys with None values
@@ -60,52 +114,62 @@ async def construct_buff_api_url(
     # Convert the dictionary to a URL-encoded query string
     query_string = urlencode(params)
 
-    return f"https://buff.163.com/api/market/goods/sell_order?{query_string}"
+    return f"{BUFF_API_URL}?{query_string}"
 
 
-async def fetch_buff_data(interaction, item_id, url=None):
+async def fetch_buff_data(client, item_id, url=None):
     if url is None:
-        url = f"https://buff.163.com/api/market/goods/sell_order?game=csgo&goods_id={item_id}"
+        url = f"{BUFF_API_URL}?game=csgo&goods_id={item_id}"
 
     max_retries = 5
-    backoff_factor = 2
 
+    buff_retry_budget.record_request()
     for attempt in range(1, max_retries + 1):
+        # Under a deadline (see utils.deadline) every attempt, and the wait for a token, gets what's left of it
+        check_deadline()
         try:
-            async with interaction.client.session.get(url) as response:
-                if response.status == 429:
-                    raise Exception("Rate limited")
-                response.raise_for_status()
-                data = await response.json()
+            async with asyncio.timeout(remaining()):
+                await buff_rate_limiter.acquire()
+                async with client.upstream.get("buff", url) as response:
+                    if response.status == 429:
+                        raise Exception("Rate limited")
+                    response.raise_for_status()
+                    data = decode_sell_order(await response.read())
 
-            if data["code"] == "OK" and data["data"]["total_count"] > 0:
-                return data
+            # Login and throttle codes come back as 200s, they're retried like a 429
+            if data.code != "OK":
+                raise Exception(f"Buff returned {data.code}")
+            # No listings is an answer too, asking again straight away won't change it
+            return data if data.data.total_count > 0 else None
 
         except Exception as e:
-            if attempt == max_retries:
+            if isinstance(e, TimeoutError) and remaining() == 0:
+                raise DeadlineExceeded("Deadline exceeded fetching Buff data") from e
+            if attempt == max_retries or not buff_retry_budget.try_retry():
                 raise e
-            else:
-                wait_time = backoff_factor**attempt
-                await asyncio.sleep(wait_time)
-                continue
+            delay = backoff_delay(attempt)
+            # No point sleeping past the deadline only to give up afterwards
+            if remaining() is not None and delay >= remaining():
+                raise DeadlineExceeded("Deadline exceeded before the next Buff retry") from e
+            await asyncio.sleep(delay)
 
 async def parse_for_relevant_item_data(data, item_id):
-    """Get's price data and images for first item in buff response
+    """Get's price data and images for first item in a decoded SellOrderResponse
     """
-    steam_price_usd = float(data["data"]["goods_infos"][str(item_id)]["steam_price"])
-    steam_price_cny = float(data["data"]["goods_infos"][str(item_id)]["steam_price_cny"])
-    buff_price = float(data["data"]["items"][0]["price"])
+    goods_info = data.data.goods_infos[str(item_id)]
+    steam_price_usd = float(goods_info.steam_price)
+    steam_price_cny = float(goods_info.steam_price_cny)
+    buff_price = float(data.data.items[0].price)
     conversion_rate = steam_price_usd / steam_price_cny
     buff_price_usd = buff_price * conversion_rate
     steam_price_usd = steam_price_usd if steam_price_usd < 2000 else "N/A"
 
-    base_image = data["data"]["goods_infos"][str(item_id)]["original_icon_url"]
-    for item in data["data"]["items"]:
-        if "asset_info" in item and "info" in item["asset_info"] and "inspect_en_url" in item["asset_info"]["info"]:
-            skin_image_url = item["asset_info"]["info"]["inspect_en_url"]
+    base_image = goods_info.original_icon_url
+    skin_image_url = base_image
+    for item in data.data.items:
+        if item.asset_info and item.asset_info.info and item.asset_info.info.inspect_en_url is not None:
+            skin_image_url = item.asset_info.info.inspect_en_url
             break
-        else:
-            skin_image_url = base_image
 
     return {
         "buff_price_usd": f"{buff_price_usd:.2f}",
@@ -115,40 +179,81 @@ async def parse_for_relevant_item_data(data, item_id):
         }
 
 
-async def get_all_relevant_items(session: Session, item: str):
-    regular_items = session.query(Item).filter(
-        Item.name == item,
-        Item.is_stattrak == False,
-        Item.is_souvenir == False
-    ).all()
-    regular_items.sort(key=lambda item: WEAR_ORDER.get(item.wear, 6))
+async def fetch_and_cache_item_data(client, item_id, url):
+    data = await fetch_buff_data(client, item_id, url=url)
+    if data is None:
+        raise NoListings(f"No Buff listings for goods ID {item_id}")
+    item_data = await parse_for_relevant_item_data(data, item_id)
+    item_data["fetched_at"] = time.time()
+    await client.price_cache.set(url, item_data)
+    # Only unfiltered lookups are the item's market price, filtered ones would skew the history
+    if url == await construct_buff_api_url(item_id):
+        client.price_history.record(
+            item_id, item_data["buff_price_usd"], item_data["steam_price_usd"], listing_count=data.data.total_count
+        )
+        client.price_alerts.check(item_id, float(item_data["buff_price_usd"]))
+    return item_data
 
-    stattrak_items = session.query(Item).filter(
-        Item.name == item,
-        Item.is_stattrak == True
-    ).all()
-    stattrak_items.sort(key=lambda item: WEAR_ORDER.get(item.wear, 6))
 
-    souvenir_items = session.query(Item).filter(
-        Item.name == item,
-        Item.is_souvenir == True
-    ).all()
-    souvenir_items.sort(key=lambda item: WEAR_ORDER.get(item.wear, 6))
+async def refresh_item_data(client, item_id, url):
+    """Fetches fresh item data for a url, concurrent callers for the same url share one Buff request"""
+    return await buff_flight.do(url, lambda: fetch_and_cache_item_data(client, item_id, url))
 
-    item_type = regular_items[0].item_type if regular_items else None
 
-    return {
-        "item_type": item_type,
-        "regular_items": regular_items,
-        "stattrak_items": stattrak_items,
-        "souvenir_items": souvenir_items,
-        }
+async def await_fresh_item_data(client, item_id, **filters):
+    """Fresh item data, joining a refresh already in flight (e.g. a stale revalidation) when there is one"""
+    url = await construct_buff_api_url(item_id, **filters)
+    return await refresh_item_data(client, item_id, url)
+
 
-async def fetch_item_id_data(interaction, item_id, *args, **kwargs):
+async def fetch_item_id_data(client, item_id, *args, **kwargs):
     url = await construct_buff_api_url(item_id, *args, **kwargs)
-    data = await fetch_buff_data(interaction, item_id, url=url)
-    item_data = await parse_for_relevant_item_data(data, item_id)
-    return item_data
+
+    cached = await client.price_cache.get(url)
+    if cached is not None:
+        item_data, is_stale = cached
+        if is_stale:
+            # Serve the stale price now and refresh it for the next caller
+            client.price_cache.revalidate(url, lambda: refresh_item_data(client, item_id, url))
+        return item_data
+
+    return await refresh_item_data(client, item_id, url)
+
+
+async def iter_prices_bulk(client, buff_ids, concurrency=BULK_CONCURRENCY, **filters):
+    """Prices many goods IDs concurrently, yielding (buff_id, item_data, error) as each one finishes.
+
+    At most `concurrency` lookups run at once, and each still goes through the cache, single-flight
+    and rate limiter. A failed ID yields its exception instead of stopping the others.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(buff_id):
+        async with semaphore:
+            try:
+                return buff_id, await fetch_item_id_data(client, buff_id, **filters), None
+            except Exception as e:
+                return buff_id, None, e
+
+    tasks = [asyncio.ensure_future(fetch(buff_id)) for buff_id in dict.fromkeys(buff_ids)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def fetch_prices_bulk(client, buff_ids, concurrency=BULK_CONCURRENCY, **filters):
+    """Prices every goods ID, returns ({buff_id: item_data}, {buff_id: error}) with partial results on failure"""
+    results = {}
+    errors = {}
+    async for buff_id, item_data, error in iter_prices_bulk(client, buff_ids, concurrency, **filters):
+        if error is None:
+            results[buff_id] = item_data
+        else:
+            errors[buff_id] = error
+    return results, errors
 
 
 # async def initial_pricecheck(interaction, session: Session, item: str, stattrak=False, souvenir=False, *args, **kwargs):
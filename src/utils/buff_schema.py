@@ -0,0 +1,46 @@
+import msgspec
+
+# Typed view of the sell_order response with only the fields we read. msgspec skips every other key
+# while decoding, so large pages never turn into nested dicts.
+
+
+class AssetDetails(msgspec.Struct):
+    inspect_en_url: str | None = None
+    paintseed: int | None = None
+
+
+class AssetInfo(msgspec.Struct):
+    info: AssetDetails | None = None
+    paintwear: str | None = None
+
+
+class SellOrder(msgspec.Struct):
+    price: str
+    id: str | None = None
+    asset_info: AssetInfo | None = None
+
+
+class GoodsInfo(msgspec.Struct):
+    steam_price: str | None = None
+    steam_price_cny: str | None = None
+    original_icon_url: str | None = None
+
+
+class SellOrderData(msgspec.Struct):
+    total_count: int = 0
+    total_page: int = 0
+    page_num: int = 1
+    items: list[SellOrder] = []
+    goods_infos: dict[str, GoodsInfo] = {}
+
+
+class SellOrderResponse(msgspec.Struct):
+    code: str
+    data: SellOrderData | None = None
+
+
+sell_order_decoder = msgspec.json.Decoder(SellOrderResponse)
+
+
+def decode_sell_order(raw):
+    return sell_order_decoder.decode(raw)
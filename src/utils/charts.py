@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.lru import LRUCache
+
+
+def render_price_chart(title, labels, buff_prices, steam_prices):
+    """Renders a Buff/Steam bar chart to PNG bytes.
+
+    Runs in a worker process, so it only uses the object-oriented Figure API: pyplot keeps global
+    figure state that isn't safe to share between renders.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(6.4, 3.6), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    positions = range(len(labels))
+    width = 0.4
+    ax.bar([x - width / 2 for x in positions], buff_prices, width, label="Buff Price")
+    ax.bar([x + width / 2 for x in positions], steam_prices, width, label="Steam Price")
+    ax.set_xticks(list(positions), labels, rotation=30, ha="right", fontsize=8)
+    ax.set_ylabel("Price (USD)")
+    ax.set_title(title)
+    ax.legend()
+    fig.tight_layout()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def price_rows(records, prices, variant_prefix):
+    """(label, buff price, steam price) per record, missing prices plot as 0"""
+    rows = []
+    for record in records:
+        buff_data = prices.get(record.buff_id)
+        buff_price = float(buff_data["buff_price_usd"]) if buff_data else 0.0
+        steam_price = buff_data["steam_price_usd"] if buff_data else 0.0
+        rows.append(
+            (
+                f"{variant_prefix[record.variant]}{record.wear or 'Price'}",
+                buff_price,
+                steam_price if isinstance(steam_price, float) else 0.0,
+            )
+        )
+    return tuple(rows)
+
+
+def snapshot_hash(rows):
+    return hashlib.blake2b(repr(rows).encode(), digest_size=12).hexdigest()
+
+
+class ChartRenderer:
+    """Renders price charts in a process pool and caches the PNG bytes.
+
+    Charts are keyed by (item, variant set, hash of the plotted prices), so a repeated view of the same
+    prices is a memory (or, with `cache_dir`, disk) hit and never reaches the pool. Concurrent requests
+    for the same chart share one render.
+    """
+
+    def __init__(self, max_workers=2, maxsize=256, cache_dir=None):
+        self.max_workers = max_workers
+        self.cache_dir = cache_dir
+        self._cache = LRUCache(maxsize)
+        self._pending = {}
+        self._executor = None
+
+        self.renders = 0
+        self.disk_hits = 0
+        self.render_time = 0.0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _get_executor(self):
+        if self._executor is None:
+            # forkserver: forking the bot itself would copy its threads and open sockets into every worker
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return self._executor
+
+    def _disk_path(self, key):
+        item, title, variants, digest = key
+        name = hashlib.blake2b(repr((item, title, variants)).encode(), digest_size=8).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}-{digest}.png")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key, png):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+
+    async def _render(self, key, title, rows):
+        loop = asyncio.get_running_loop()
+        if self.cache_dir:
+            png = await loop.run_in_executor(None, self._read_disk, key)
+            if png is not None:
+                self.disk_hits += 1
+                return png
+
+        labels, buff_prices, steam_prices = zip(*rows)
+        started = time.perf_counter()
+        png = await loop.run_in_executor(
+            self._get_executor(), render_price_chart, title, labels, buff_prices, steam_prices
+        )
+        self.renders += 1
+        self.render_time += time.perf_counter() - started
+
+        if self.cache_dir:
+            await loop.run_in_executor(None, self._write_disk, key, png)
+        return png
+
+    async def render(self, item, variants, rows, title=None):
+        """PNG bytes for `rows` of (label, buff price, steam price), `variants` names the shown variant set"""
+        title = title or item
+        # The title is drawn on the chart, so the same prices under another title are another PNG
+        key = (item, title, tuple(variants), snapshot_hash(rows))
+        png = self._cache.get(key)
+        if png is not None:
+            return png
+
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._render(key, title, rows))
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        png = await asyncio.shield(future)
+        self._cache.put(key, png)
+        return png
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            **self._cache.stats(),
+            "renders": self.renders,
+            "disk_hits": self.disk_hits,
+            "in_flight": len(self._pending),
+            "mean_render_ms": self.render_time / self.renders * 1000 if self.renders else 0.0,
+        }
@@ -0,0 +1,76 @@
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    pass
+
+
+class Deadline:
+    """A point in time a command has to answer by.
+
+    Set with `deadline(budget)` around a command, the deadline is carried by the context to every
+    coroutine and task started inside it, so fetches, retries and renders can check what's left
+    without it being passed through every call.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+
+@contextmanager
+def deadline(budget):
+    current = Deadline(budget)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+
+
+def current_deadline():
+    return _current.get()
+
+
+def remaining():
+    """Seconds left on the current deadline, None when there is none"""
+    current = _current.get()
+    return None if current is None else current.remaining()
+
+
+def check_deadline():
+    current = _current.get()
+    if current is not None and current.expired:
+        raise DeadlineExceeded(f"Deadline of {current.budget}s exceeded")
+
+
+async def within_deadline(awaitable):
+    """Awaits `awaitable`, giving up with DeadlineExceeded when the current deadline runs out"""
+    current = _current.get()
+    if current is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, current.remaining())
+    except asyncio.TimeoutError as e:
+        if isinstance(e, DeadlineExceeded):
+            raise
+        raise DeadlineExceeded(f"Deadline of {current.budget}s exceeded") from e
+
+
+def detached_task(coro):
+    """Starts `coro` outside any deadline, for work that should finish even after its caller gave up"""
+    context = contextvars.copy_context()
+    context.run(_current.set, None)
+    return asyncio.get_running_loop().create_task(coro, context=context)
@@ -0,0 +1,132 @@
+import ast
+import json
+from collections import namedtuple
+
+import discord
+from sqlalchemy import select
+
+from models.float_ranges import FloatRange
+from models.option_set import select_item_dropdowns
+from utils.lru import LRUCache
+
+# Discord caps a select menu at 25 options
+MAX_SELECT_OPTIONS = 25
+
+DropdownRow = namedtuple("DropdownRow", "drop_down_index button_text option_text option_value additional_options")
+
+
+def parse_additional_options(additional_options):
+    """Paint seed tiers come as a list or as the dump's list literal, e.g. "['All', '661', '670']" """
+    if not additional_options:
+        return ()
+    if isinstance(additional_options, str):
+        try:
+            additional_options = ast.literal_eval(additional_options)
+        except (ValueError, SyntaxError):
+            additional_options = json.loads(additional_options)
+    return tuple(str(value) for value in additional_options if value != "All")
+
+
+def fold_paint_seeds(rows):
+    """select_item_dropdowns rows, one per paint seed of a tier option, as one DropdownRow per option"""
+    options = {}
+    for row in rows:
+        if row.option_id not in options:
+            options[row.option_id] = (row, [])
+        if row.paint_seed is not None:
+            options[row.option_id][1].append(str(row.paint_seed))
+    return [
+        DropdownRow(row.drop_down_index, row.button_text, row.option_text, row.option_value, tuple(seeds))
+        for row, seeds in options.values()
+    ]
+
+
+class FilterMenu:
+    """A ready-to-render dropdown: SelectOptions plus the Buff values and paint seeds behind each one"""
+
+    __slots__ = ("button_text", "options", "values", "paint_seeds")
+
+    def __init__(self, button_text, rows):
+        rows = rows[:MAX_SELECT_OPTIONS]
+        self.button_text = button_text
+        self.values = tuple(row.option_value for row in rows)
+        self.paint_seeds = tuple(parse_additional_options(row.additional_options) for row in rows)
+
+        # option_value is empty for both "All" and "Customize", so the option's position is the select value
+        self.options = tuple(
+            discord.SelectOption(
+                label=str(row.option_text)[:100],
+                value=str(index),
+                description=f"{len(seeds)} paint seeds" if seeds else None,
+            )
+            for index, (row, seeds) in enumerate(zip(rows, self.paint_seeds))
+        )
+
+    def to_select(self, custom_id, row=None):
+        return discord.ui.Select(
+            custom_id=custom_id, placeholder=self.button_text, options=list(self.options), row=row
+        )
+
+    def resolve(self, selected):
+        """Maps a selected SelectOption value back to the Buff option_value"""
+        return self.values[int(selected)]
+
+
+class FilterMenuCache:
+    """Memoizes built filter menus so rendering a dropdown needs no DB query or JSON parsing.
+
+    Menus are keyed by their option set (button text plus every option), so the many items sharing the
+    same "Paint seed" or "Default" list share one FilterMenu. A second LRU maps (item name, wear) to
+    its menus, only a miss there touches the database.
+    """
+
+    def __init__(self, session_factory, maxsize_items=1024, maxsize_sets=4096):
+        self.session_factory = session_factory
+        self._items = LRUCache(maxsize_items)
+        self._sets = LRUCache(maxsize_sets)
+
+    async def _load_rows(self, name, wear):
+        async with self.session_factory() as session:
+            # The item's dropdowns and tier paint seeds from the normalized option sets, in one query
+            buff_rows = fold_paint_seeds((await session.execute(select_item_dropdowns(name))).all())
+            float_rows = []
+            if wear is not None:
+                float_rows = (
+                    await session.execute(
+                        select(FloatRange).where(FloatRange.wear == wear).order_by(FloatRange.option_index)
+                    )
+                ).scalars().all()
+        return float_rows, buff_rows
+
+    def build_menus(self, *row_groups):
+        menus = []
+        for rows in row_groups:
+            dropdowns = {}
+            for row in rows:
+                dropdowns.setdefault((row.drop_down_index, row.button_text), []).append(row)
+
+            for (_, button_text), dropdown_rows in dropdowns.items():
+                key = (
+                    button_text,
+                    tuple((row.option_text, row.option_value, str(row.additional_options)) for row in dropdown_rows),
+                )
+                menu = self._sets.get(key)
+                if menu is None:
+                    menu = FilterMenu(button_text, dropdown_rows)
+                    self._sets.put(key, menu)
+                menus.append(menu)
+        return tuple(menus)
+
+    async def get_menus(self, name, wear=None):
+        menus = self._items.get((name, wear))
+        if menus is None:
+            menus = self.build_menus(*await self._load_rows(name, wear))
+            self._items.put((name, wear), menus)
+        return menus
+
+    def clear(self):
+        self._items.clear()
+        self._sets.clear()
+
+    def stats(self):
+        return {"items": self._items.stats(), "option_sets": self._sets.stats()}
@@ -0,0 +1,139 @@
+import os
+
+import aiohttp
+
+
+def upstream_settings(name, limit=8, connect=3.0, read=10.0, total=15.0):
+    """Pool settings for an upstream, each overridable with e.g. HTTP_BUFF_LIMIT / HTTP_BUFF_READ_TIMEOUT"""
+    prefix = f"HTTP_{name.upper()}_"
+    return {
+        "limit": int(os.getenv(f"{prefix}LIMIT", limit)),
+        "connect": float(os.getenv(f"{prefix}CONNECT_TIMEOUT", connect)),
+        "read": float(os.getenv(f"{prefix}READ_TIMEOUT", read)),
+        "total": float(os.getenv(f"{prefix}TOTAL_TIMEOUT", total)),
+    }
+
+
+UPSTREAMS = {
+    "buff": upstream_settings("buff", limit=8),
+    # Steam rate limits priceoverview hard, a couple of connections is all it will ever use
+    "steam": upstream_settings("steam", limit=2, read=5.0, total=8.0),
+    "default": upstream_settings("default", limit=4),
+}
+DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", 300))
+KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 30))
+
+
+class UpstreamPool:
+    """One upstream's own ClientSession and connection pool, with reuse counters.
+
+    Connections are kept alive between requests and DNS answers are cached, so a steady stream of
+    requests to one host pays for TCP/TLS setup once per connection rather than once per request.
+    """
+
+    def __init__(self, name, limit=8, connect=3.0, read=10.0, total=15.0):
+        self.name = name
+        self.limit = limit
+
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_request_exception.append(self._on_request_exception)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(self._on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(self._on_dns_cache_miss)
+
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                # The pool only ever talks to one host, so the host limit is the pool size
+                limit=limit,
+                limit_per_host=limit,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                enable_cleanup_closed=True,
+            ),
+            # aiohttp's `connect` timeout also counts the wait for a free pooled connection, so bound the
+            # socket connect itself and let `total` cover queueing
+            timeout=aiohttp.ClientTimeout(total=total, sock_connect=connect, sock_read=read),
+            trace_configs=[trace_config],
+        )
+
+    async def _on_request_start(self, session, context, params):
+        self.requests += 1
+
+    async def _on_request_exception(self, session, context, params):
+        self.errors += 1
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.new_connections += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.reused_connections += 1
+
+    async def _on_dns_cache_hit(self, session, context, params):
+        self.dns_hits += 1
+
+    async def _on_dns_cache_miss(self, session, context, params):
+        self.dns_misses += 1
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    async def close(self):
+        await self.session.close()
+
+    def stats(self):
+        connections = self.new_connections + self.reused_connections
+        return {
+            "limit": self.limit,
+            "requests": self.requests,
+            "errors": self.errors,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_rate": self.reused_connections / connections if connections else 0.0,
+            "dns_hits": self.dns_hits,
+            "dns_misses": self.dns_misses,
+        }
+
+
+class UpstreamClient:
+    """Isolated connection pools per upstream (Buff, Steam, ...), created on first use.
+
+    Every upstream has its own connector, so a slow host holding all of its connections can't starve
+    requests to the others. Use `client.get("buff", url)` like `session.get(url)`.
+    """
+
+    def __init__(self, upstreams=None):
+        self.upstreams = {**UPSTREAMS, **(upstreams or {})}
+        self._pools = {}
+
+    def pool(self, name):
+        pool = self._pools.get(name)
+        if pool is None:
+            pool = UpstreamPool(name, **self.upstreams.get(name, self.upstreams["default"]))
+            self._pools[name] = pool
+        return pool
+
+    def get(self, upstream, url, **kwargs):
+        return self.pool(upstream).get(url, **kwargs)
+
+    async def close(self):
+        for pool in self._pools.values():
+            await pool.close()
+        self._pools.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def stats(self):
+        return {name: pool.stats() for name, pool in self._pools.items()}
@@ -0,0 +1,125 @@
+import asyncio
+from types import MappingProxyType
+
+from sqlalchemy import select
+
+from models.item import Item
+from utils.search_index import ItemSearchIndex
+
+WEAR_ORDER = {
+    "Factory New": 1,
+    "Minimal Wear": 2,
+    "Field-Tested": 3,
+    "Well-Worn": 4,
+    "Battle-Scarred": 5,
+}
+
+CATALOG_COLUMNS = (
+    Item.buff_id,
+    Item.name,
+    Item.raw_name,
+    Item.wear,
+    Item.is_stattrak,
+    Item.is_souvenir,
+    Item.item_type,
+    Item.major_year,
+    Item.major,
+    Item.skin_line,
+    Item.weapon_type,
+)
+
+
+class CatalogItem:
+    __slots__ = tuple(column.key for column in CATALOG_COLUMNS)
+
+    def __init__(self, *values):
+        for attr, value in zip(self.__slots__, values):
+            object.__setattr__(self, attr, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CatalogItem is immutable")
+
+    @property
+    def variant(self):
+        if self.is_stattrak:
+            return "stattrak"
+        if self.is_souvenir:
+            return "souvenir"
+        return "regular"
+
+    def __repr__(self):
+        return f"<CatalogItem(name={self.name}, buff_id={self.buff_id}, wear={self.wear}, variant={self.variant})>"
+
+
+class ItemCatalog:
+    """In-memory, read-only view of the items table.
+
+    Items are grouped by name, then by variant (regular/StatTrak/Souvenir) with each variant already
+    sorted by wear, so a /pricecheck lookup is a dict hit with no database round trip. The items table
+    only changes when the catalogue is rebuilt, after which `reload` swaps in a fresh snapshot.
+    """
+
+    def __init__(self, rows=()):
+        self._build(rows)
+
+    @classmethod
+    async def from_session(cls, session):
+        catalog = cls()
+        await catalog.reload(session)
+        return catalog
+
+    async def reload(self, session):
+        async with session:
+            rows = (await session.execute(select(*CATALOG_COLUMNS))).all()
+
+        # Building ~21k records and the search index is CPU work, keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._build, rows)
+
+    def _build(self, rows):
+        by_buff_id = {}
+        grouped = {}
+        for row in rows:
+            record = CatalogItem(*row)
+            by_buff_id[record.buff_id] = record
+            grouped.setdefault(record.name, {"regular": [], "stattrak": [], "souvenir": []})[record.variant].append(
+                record
+            )
+
+        by_name = {}
+        for name, variants in grouped.items():
+            for records in variants.values():
+                records.sort(key=lambda record: WEAR_ORDER.get(record.wear, 6))
+            regular_items = tuple(variants["regular"])
+
+            by_name[name] = MappingProxyType(
+                {
+                    "item_type": regular_items[0].item_type if regular_items else None,
+                    "regular_items": regular_items,
+                    "stattrak_items": tuple(variants["stattrak"]),
+                    "souvenir_items": tuple(variants["souvenir"]),
+                }
+            )
+
+        # Swap everything in at once so lookups never see a half built catalogue
+        self._by_name, self._by_buff_id, self.search_index = by_name, by_buff_id, ItemSearchIndex(by_name)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def __len__(self):
+        return len(self._by_buff_id)
+
+    @property
+    def names(self):
+        return self.search_index.names
+
+    def get(self, name):
+        """Returns the item's type and its regular, StatTrak and Souvenir rows sorted by wear"""
+        return self._by_name.get(name)
+
+    def get_by_buff_id(self, buff_id):
+        return self._by_buff_id.get(buff_id)
+
+    def records(self):
+        """Every catalogue record, one per goods ID"""
+        return self._by_buff_id.values()
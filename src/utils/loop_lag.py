@@ -0,0 +1,62 @@
+import asyncio
+import statistics
+import time
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up a task that sleeps for `interval` seconds.
+
+    Anything blocking the loop (sync DB calls, CPU-heavy work) shows up directly as lag, which is
+    the delay every interaction and gateway heartbeat sees at that moment.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        return self.stats()
+
+    def stats(self):
+        if not self.samples:
+            return {"samples": 0, "mean_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+        ordered = sorted(self.samples)
+        return {
+            "samples": len(ordered),
+            "mean_ms": statistics.fmean(ordered) * 1000,
+            "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+            "max_ms": ordered[-1] * 1000,
+        }
+
+
+async def measure_lag(coro, interval=0.01):
+    """Runs `coro` while sampling loop lag, returns (result, lag stats, wall time)"""
+    monitor = LoopLagMonitor(interval)
+    monitor.start()
+    start = time.perf_counter()
+    try:
+        result = await coro
+    finally:
+        elapsed = time.perf_counter() - start
+        stats = await monitor.stop()
+    return result, stats, elapsed
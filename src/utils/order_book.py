@@ -0,0 +1,143 @@
+from bisect import bisect_right
+
+import utils.buff163_utils as buff_utils
+
+# Buff's "Float Range" dropdown buckets (data/wears.csv), plus the 0.00-0.02 range it doesn't list
+FLOAT_BUCKET_EDGES = (
+    0.00, 0.02, 0.03, 0.04, 0.05, 0.06, 0.07,
+    0.08, 0.09, 0.10, 0.11, 0.15,
+    0.18, 0.21, 0.24, 0.27, 0.38,
+    0.39, 0.40, 0.41, 0.42, 0.45,
+    0.50, 0.63, 0.76, 0.90, 1.00,
+)  # fmt: skip
+FLOAT_BUCKET_LABELS = tuple(
+    f"{low:.2f}-{high:.2f}" for low, high in zip(FLOAT_BUCKET_EDGES, FLOAT_BUCKET_EDGES[1:])
+)
+
+
+class OrderBookAccumulator:
+    """Running aggregates over sell listings fed in ascending price order, one page at a time.
+
+    Nothing per listing is kept: the floor comes from the first listing, the median position is known
+    as soon as the first page reports total_count, and float buckets are plain counters.
+    """
+
+    def __init__(self, depth=100, floor_band=0.05):
+        self.depth = depth
+        self.floor_band = floor_band
+
+        self.total_listings = None
+        self.scanned = 0
+        self.pages = 0
+        self.floor_price = None
+        self.within_floor_band = 0
+        self.float_buckets = [0] * len(FLOAT_BUCKET_LABELS)
+        self._median_positions = ()
+        self._median_prices = []
+
+    @property
+    def done(self):
+        return self.total_listings is not None and self.scanned >= min(self.depth, self.total_listings)
+
+    def add_page(self, total_count, listings):
+        if self.total_listings is None:
+            self.total_listings = total_count
+            target = min(self.depth, total_count)
+            # Middle listing (or the two middle ones) of the listings we'll scan
+            self._median_positions = tuple({(target - 1) // 2, target // 2})
+        self.pages += 1
+
+        for listing in listings:
+            if self.done:
+                break
+
+            price = float(listing.price)
+            if self.floor_price is None:
+                self.floor_price = price
+            if price <= self.floor_price * (1 + self.floor_band):
+                self.within_floor_band += 1
+            if self.scanned in self._median_positions:
+                self._median_prices.append(price)
+
+            if listing.asset_info is not None and listing.asset_info.paintwear:
+                bucket = bisect_right(FLOAT_BUCKET_EDGES, float(listing.asset_info.paintwear)) - 1
+                self.float_buckets[min(max(bucket, 0), len(self.float_buckets) - 1)] += 1
+
+            self.scanned += 1
+
+    def summary(self, conversion_rate=1.0):
+        median = sum(self._median_prices) / len(self._median_prices) if self._median_prices else None
+        return {
+            "total_listings": self.total_listings or 0,
+            "scanned": self.scanned,
+            "pages": self.pages,
+            "floor_price_usd": round(self.floor_price * conversion_rate, 2) if self.floor_price is not None else None,
+            "median_ask_usd": round(median * conversion_rate, 2) if median is not None else None,
+            "floor_band": self.floor_band,
+            "within_floor_band": self.within_floor_band,
+            "float_buckets": {
+                label: count for label, count in zip(FLOAT_BUCKET_LABELS, self.float_buckets) if count
+            },
+        }
+
+
+async def fetch_order_book(client, item_id, depth=100, page_size=50, floor_band=0.05, **filters):
+    """Walks sell_order pages cheapest first until `depth` listings are seen, returns a compact summary"""
+    filters.setdefault("sort_by", "price.asc")
+    book = OrderBookAccumulator(depth, floor_band)
+    conversion_rate = 1.0
+
+    page_num = 1
+    while not book.done:
+        url = await buff_utils.construct_buff_api_url(item_id, page_num=page_num, page_size=page_size, **filters)
+        data = await buff_utils.fetch_buff_data(client, item_id, url=url)
+        if data is None or not data.data.items:
+            break
+
+        if page_num == 1:
+            goods_info = data.data.goods_infos.get(str(item_id))
+            if goods_info and goods_info.steam_price and float(goods_info.steam_price_cny or 0):
+                conversion_rate = float(goods_info.steam_price) / float(goods_info.steam_price_cny)
+
+        book.add_page(data.data.total_count, data.data.items)
+        if page_num >= data.data.total_page:
+            break
+        page_num += 1
+
+    return book.summary(conversion_rate)
+
+
+async def get_order_book(client, item_id, depth=100, **filters):
+    """Cached, coalesced order book summary, refreshed on the same TTL as prices"""
+    url = await buff_utils.construct_buff_api_url(item_id, **filters)
+    key = f"orderbook:{depth}:{url}"
+
+    async def refresh():
+        summary = await fetch_order_book(client, item_id, depth=depth, **filters)
+        await client.price_cache.set(key, summary)
+        return summary
+
+    cached = await client.price_cache.get(key)
+    if cached is not None:
+        summary, is_stale = cached
+        if is_stale:
+            client.price_cache.revalidate(key, lambda: buff_utils.buff_flight.do(key, refresh))
+        return summary
+
+    return await buff_utils.buff_flight.do(key, refresh)
+
+
+def format_order_book(summary):
+    if not summary["scanned"]:
+        return "No listings"
+
+    # Only the cheapest `scanned` listings were read, the band is a share of those, not of every listing
+    lines = [
+        f"Floor: ${summary['floor_price_usd']:,.2f} | "
+        f"Median of cheapest {summary['scanned']}: ${summary['median_ask_usd']:,.2f}",
+        f"Within {summary['floor_band']:.0%} of floor: {summary['within_floor_band']} of the cheapest "
+        f"{summary['scanned']} ({summary['total_listings']} listed)",
+    ]
+    if summary["float_buckets"]:
+        lines.append(" ".join(f"{label}: {count}" for label, count in summary["float_buckets"].items()))
+    return "\n".join(lines)
@@ -0,0 +1,287 @@
+import bisect
+import logging
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+
+import discord
+from discord.ext import tasks
+from sqlalchemy import delete, select, update
+
+import utils.buff163_utils as buff_utils
+from models.price_alert import Base, PriceAlert
+
+log = logging.getLogger(__name__)
+
+DIRECTIONS = ("below", "above")
+
+
+class ThresholdIndex:
+    """Active alerts by goods ID, in threshold-sorted lists per direction.
+
+    A "below" alert fires once the price is at or under its threshold. With thresholds sorted ascending
+    those are the tail from bisect_left(price). An "above" alert fires at or over its threshold, the head
+    up to bisect_right(price). A price update is O(log n + matches) no matter how many alerts the goods
+    ID has, and alerts that didn't fire are never visited.
+    """
+
+    def __init__(self):
+        self._sorted = {direction: defaultdict(list) for direction in DIRECTIONS}
+        self._alerts = {}
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def __contains__(self, alert_id):
+        return alert_id in self._alerts
+
+    def add(self, alert):
+        bisect.insort(self._sorted[alert.direction][alert.buff_id], (alert.threshold, alert.id))
+        self._alerts[alert.id] = alert
+
+    def remove(self, alert_id):
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return None
+        entries = self._sorted[alert.direction][alert.buff_id]
+        entries.pop(bisect.bisect_left(entries, (alert.threshold, alert.id)))
+        if not entries:
+            del self._sorted[alert.direction][alert.buff_id]
+        return alert
+
+    def pop_triggered(self, buff_id, price):
+        """Removes and returns every alert on `buff_id` that `price` triggers"""
+        triggered = []
+        below = self._sorted["below"].get(buff_id)
+        if below:
+            start = bisect.bisect_left(below, (price,))
+            triggered.extend(below[start:])
+            del below[start:]
+        above = self._sorted["above"].get(buff_id)
+        if above:
+            end = bisect.bisect_right(above, (price, float("inf")))
+            triggered.extend(above[:end])
+            del above[:end]
+
+        for direction in DIRECTIONS:
+            if buff_id in self._sorted[direction] and not self._sorted[direction][buff_id]:
+                del self._sorted[direction][buff_id]
+        return [self._alerts.pop(alert_id) for _, alert_id in triggered]
+
+    def buff_ids(self):
+        return self._sorted["below"].keys() | self._sorted["above"].keys()
+
+    def for_user(self, user_id):
+        return sorted((alert for alert in self._alerts.values() if alert.user_id == user_id), key=lambda a: a.id)
+
+
+class PriceAlertEngine:
+    """Price alerts kept in price_alerts and matched in memory against every price we see.
+
+    Prices fetched for any reason (/pricecheck, the pre-warm refresher, alert polling) are passed to
+    `check`, which only looks at the alerts that price triggers. Goods IDs with alerts that no fetch
+    has covered for `poll_interval` seconds are polled, once per goods ID however many alerts it has
+    and at most `poll_budget` per cycle, through the shared cache and single-flight.
+
+    Triggered alerts are marked in the database, then grouped into one message per channel or DM.
+    At most `messages_per_send` messages go out every `send_interval` seconds, the rest wait in an
+    outbox for the next tick.
+    """
+
+    def __init__(
+        self,
+        bot,
+        poll_interval=120,
+        poll_budget=60,
+        send_interval=2.0,
+        messages_per_send=5,
+        max_per_user=25,
+    ):
+        self.bot = bot
+        self.poll_interval = poll_interval
+        self.poll_budget = poll_budget
+        self.messages_per_send = messages_per_send
+        self.max_per_user = max_per_user
+
+        self.index = ThresholdIndex()
+        self._checked_at = {}
+        self._triggered = []
+        self._outbox = deque()
+        self._poll_loop = tasks.loop(seconds=poll_interval)(self.poll)
+        self._poll_loop.error(self._on_error)
+        self._send_loop = tasks.loop(seconds=send_interval)(self.send_notifications)
+        self._send_loop.error(self._on_error)
+
+        self.checks = 0
+        self.triggered = 0
+        self.polled = 0
+        self.poll_failures = 0
+        self.mark_failures = 0
+        self.sent = 0
+        self.send_failures = 0
+
+    async def ensure_schema(self):
+        async with self.bot.SessionLocal() as session:
+            connection = await session.connection()
+            await connection.run_sync(Base.metadata.create_all)
+            await session.commit()
+
+    async def load(self):
+        async with self.bot.SessionLocal() as session:
+            alerts = (await session.execute(select(PriceAlert).where(PriceAlert.triggered_at.is_(None)))).scalars()
+            for alert in alerts:
+                self.index.add(alert)
+        log.info("Loaded %s active price alerts on %s goods IDs", len(self.index), len(self.index.buff_ids()))
+
+    def start(self):
+        self._poll_loop.start()
+        self._send_loop.start()
+
+    def stop(self):
+        self._poll_loop.cancel()
+        self._send_loop.cancel()
+
+    async def add(self, user_id, channel_id, buff_id, direction, threshold):
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Unknown alert direction {direction!r}")
+        if len(self.index.for_user(user_id)) >= self.max_per_user:
+            raise ValueError(f"You already have {self.max_per_user} active alerts, remove one first")
+
+        alert = PriceAlert(
+            user_id=user_id, channel_id=channel_id, buff_id=buff_id, direction=direction, threshold=float(threshold)
+        )
+        async with self.bot.SessionLocal() as session:
+            session.add(alert)
+            await session.commit()
+        self.index.add(alert)
+        return alert
+
+    async def remove(self, user_id, alert_id):
+        alert = self.index.remove(alert_id)
+        if alert is not None and alert.user_id != user_id:
+            self.index.add(alert)
+            return False
+
+        async with self.bot.SessionLocal() as session:
+            result = await session.execute(
+                delete(PriceAlert).where(PriceAlert.id == alert_id, PriceAlert.user_id == user_id)
+            )
+            await session.commit()
+        return result.rowcount > 0
+
+    def alerts_for(self, user_id):
+        return self.index.for_user(user_id)
+
+    def check(self, buff_id, price_usd):
+        """Matches a freshly fetched price against the alerts it can trigger, never blocks"""
+        self.checks += 1
+        self._checked_at[buff_id] = time.monotonic()
+        for alert in self.index.pop_triggered(buff_id, price_usd):
+            self._triggered.append((alert, price_usd))
+            self.triggered += 1
+
+    def _due_buff_ids(self):
+        now = time.monotonic()
+        watched = self.index.buff_ids()
+        # Forget goods IDs whose alerts are all gone
+        for buff_id in self._checked_at.keys() - watched:
+            del self._checked_at[buff_id]
+
+        due = [buff_id for buff_id in watched if now - self._checked_at.get(buff_id, 0) >= self.poll_interval]
+        due.sort(key=lambda buff_id: self._checked_at.get(buff_id, 0))
+        return due[: self.poll_budget]
+
+    async def poll(self):
+        async for buff_id, item_data, error in buff_utils.iter_prices_bulk(self.bot, self._due_buff_ids()):
+            if error is not None:
+                self.poll_failures += 1
+                log.debug("Alert poll failed for %s", buff_id, exc_info=error)
+                continue
+            # A cache hit never reaches fetch_and_cache_item_data, so check here as well
+            self.polled += 1
+            self.check(buff_id, float(item_data["buff_price_usd"]))
+
+    async def _mark_triggered(self, triggered):
+        now = datetime.now(timezone.utc)
+        try:
+            async with self.bot.SessionLocal() as session:
+                await session.execute(
+                    update(PriceAlert),
+                    [
+                        {"id": alert.id, "triggered_at": now, "triggered_price": price}
+                        for alert, price in triggered
+                    ],
+                )
+                await session.commit()
+        except Exception:
+            self.mark_failures += 1
+            log.exception("Failed to mark %s price alerts as triggered", len(triggered))
+            return False
+        return True
+
+    def _queue_messages(self, triggered):
+        by_destination = defaultdict(list)
+        for alert, price in triggered:
+            record = self.bot.item_catalog.get_by_buff_id(alert.buff_id)
+            name = record.raw_name if record else f"Goods ID {alert.buff_id}"
+            line = f"{name} is ${price:,.2f} on Buff ({alert.direction} your ${alert.threshold:,.2f} alert)"
+            if alert.channel_id is None:
+                by_destination[("user", alert.user_id)].append(line)
+            else:
+                by_destination[("channel", alert.channel_id)].append(f"<@{alert.user_id}> {line}")
+
+        # One message per destination, split to stay under Discord's 2000 character limit
+        for destination, lines in by_destination.items():
+            chunk = []
+            for line in lines:
+                if chunk and sum(len(part) + 1 for part in chunk) + len(line) > 1900:
+                    self._outbox.append((destination, "\n".join(chunk)))
+                    chunk = []
+                chunk.append(line)
+            self._outbox.append((destination, "\n".join(chunk)))
+
+    async def _send(self, destination, content):
+        kind, target_id = destination
+        try:
+            if kind == "channel":
+                target = self.bot.get_channel(target_id) or await self.bot.fetch_channel(target_id)
+            else:
+                target = self.bot.get_user(target_id) or await self.bot.fetch_user(target_id)
+            await target.send(content, allowed_mentions=discord.AllowedMentions(users=True))
+        except Exception:
+            # Anything escaping here would stop the send loop for good, one bad destination mustn't do that
+            self.send_failures += 1
+            log.warning("Couldn't deliver price alerts to %s %s", kind, target_id, exc_info=True)
+        else:
+            self.sent += 1
+
+    async def send_notifications(self):
+        if self._triggered:
+            triggered, self._triggered = self._triggered, []
+            # Marked before sending, so a restart never notifies the same alert twice. When that fails the
+            # alerts go back in the index unsent, the next price that crosses them tries again
+            if await self._mark_triggered(triggered):
+                self._queue_messages(triggered)
+            else:
+                for alert, _ in triggered:
+                    self.index.add(alert)
+
+        for _ in range(min(self.messages_per_send, len(self._outbox))):
+            await self._send(*self._outbox.popleft())
+
+    async def _on_error(self, error):
+        log.exception("Price alert loop failed", exc_info=error)
+
+    def stats(self):
+        return {
+            "active": len(self.index),
+            "watched_goods_ids": len(self.index.buff_ids()),
+            "checks": self.checks,
+            "triggered": self.triggered,
+            "polled": self.polled,
+            "poll_failures": self.poll_failures,
+            "mark_failures": self.mark_failures,
+            "outbox": len(self._outbox),
+            "sent": self.sent,
+            "send_failures": self.send_failures,
+        }
@@ -0,0 +1,208 @@
+import asyncio
+import glob
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from discord.ext import tasks
+from sqlalchemy import text
+
+from utils.item_catalog import CATALOG_COLUMNS, WEAR_ORDER
+from utils.lru import LRUCache
+
+log = logging.getLogger(__name__)
+
+# Latest observation per goods ID, only scanning the partitions inside the lookback window
+LATEST_PRICES_SQL = text(
+    """
+    SELECT DISTINCT ON (buff_id) buff_id, observed_at, buff_price_usd, steam_price_usd, listing_count
+    FROM price_history
+    WHERE observed_at >= :since
+    ORDER BY buff_id, observed_at DESC
+    """
+)
+PRICE_COLUMNS = ["buff_id", "observed_at", "buff_price_usd", "steam_price_usd", "listing_count"]
+CATEGORY_COLUMNS = ["name", "wear", "item_type", "weapon_type", "skin_line"]
+
+
+def catalog_frame(catalog):
+    """The catalogue's records as one row per goods ID, strings as categoricals"""
+    columns = [column.key for column in CATALOG_COLUMNS]
+    frame = pd.DataFrame.from_records(
+        [tuple(getattr(record, column) for column in columns) for record in catalog.records()], columns=columns
+    )
+    for column in CATEGORY_COLUMNS:
+        frame[column] = frame[column].astype("category")
+    # Knives are "★ Karambit" in weapon_type, this is the key /cheapest weapon_type:karambit filters on
+    frame["weapon_key"] = frame["weapon_type"].str.removeprefix("★ ").str.lower().astype("category")
+    frame["is_stattrak"] = frame["is_stattrak"].fillna(False).astype(bool)
+    frame["is_souvenir"] = frame["is_souvenir"].fillna(False).astype(bool)
+    return frame
+
+
+def latest_parquet_prices(snapshot_dir):
+    """Latest successful row per goods ID from a db_utils/crawl_prices.py snapshot directory"""
+    parts = sorted(glob.glob(os.path.join(snapshot_dir, "part-*.parquet")))
+    if not parts:
+        return pd.DataFrame(columns=PRICE_COLUMNS)
+    frame = pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True)
+    frame = frame[frame["error"].isna()]
+    return frame.sort_values("observed_at").drop_duplicates("buff_id", keep="last")[PRICE_COLUMNS]
+
+
+def weapon_key(weapon_type):
+    return weapon_type.strip().removeprefix("★ ").lower()
+
+
+def build_price_frame(catalog, prices):
+    """Joins the latest prices onto the catalogue and adds the derived spread columns"""
+    frame = catalog_frame(catalog).merge(prices, on="buff_id", how="inner")
+    frame["buff_price_usd"] = frame["buff_price_usd"].astype(np.float32)
+    # Steam prices over $2000 are reported as N/A, so they come through as NaN here
+    frame["steam_price_usd"] = frame["steam_price_usd"].astype(np.float32)
+    frame["listing_count"] = frame["listing_count"].fillna(0).astype(np.int32)
+    frame["spread_usd"] = frame["steam_price_usd"] - frame["buff_price_usd"]
+    frame["spread_ratio"] = frame["steam_price_usd"] / frame["buff_price_usd"].where(frame["buff_price_usd"] > 0)
+    return frame.reset_index(drop=True)
+
+
+class PriceAnalytics:
+    """Catalogue-wide price queries over a columnar snapshot of the latest price per goods ID.
+
+    Every `refresh_interval` seconds the latest price of each goods ID is loaded (from price_history,
+    or from a crawler snapshot directory when `snapshot_dir` is set) and joined to the item catalogue
+    in a pandas frame, built off the event loop. Queries are vectorized filters and sorts over that
+    frame, and their results are cached until a newer snapshot is swapped in.
+    """
+
+    def __init__(self, bot, refresh_interval=300, lookback_days=7, snapshot_dir=None, maxsize=128):
+        self.bot = bot
+        self.lookback_days = lookback_days
+        self.snapshot_dir = snapshot_dir
+
+        self.frame = None
+        self.snapshot_at = None
+        self._results = LRUCache(maxsize=maxsize)
+        self._loop = tasks.loop(seconds=refresh_interval)(self.refresh)
+        self._loop.error(self._on_error)
+
+        self.refreshes = 0
+        self.queries = 0
+        self.last_build_duration = 0.0
+        self.last_query_duration = 0.0
+
+    def start(self):
+        self._loop.start()
+
+    def stop(self):
+        self._loop.cancel()
+
+    async def load_prices(self):
+        if self.snapshot_dir is not None:
+            return await asyncio.to_thread(latest_parquet_prices, self.snapshot_dir)
+
+        since = datetime.now(timezone.utc) - timedelta(days=self.lookback_days)
+        async with self.bot.SessionLocal() as session:
+            rows = (await session.execute(LATEST_PRICES_SQL, {"since": since})).all()
+        return pd.DataFrame.from_records(rows, columns=PRICE_COLUMNS)
+
+    async def refresh(self, force=False):
+        """Loads the latest prices, rebuilding the frame only when there is a newer snapshot (or `force`).
+
+        Never raises: a failed load or build keeps serving the previous frame, so neither the refresh
+        loop nor a catalogue reload is stopped by it.
+        """
+        try:
+            prices = await self.load_prices()
+            snapshot_at = pd.Timestamp(prices["observed_at"].max()).to_pydatetime() if len(prices) else None
+            if not force and self.frame is not None and snapshot_at == self.snapshot_at:
+                return
+
+            started = time.monotonic()
+            frame = await asyncio.get_running_loop().run_in_executor(
+                None, build_price_frame, self.bot.item_catalog, prices
+            )
+        except Exception:
+            log.exception("Price analytics refresh failed, keeping the previous snapshot")
+            return
+
+        # Swap the frame and drop the old results together, cached answers always match the frame
+        self.frame, self.snapshot_at = frame, snapshot_at
+        self._results.clear()
+        self.refreshes += 1
+        self.last_build_duration = time.monotonic() - started
+        log.info("Price analytics snapshot: %s goods IDs in %.2fs", len(frame), self.last_build_duration)
+
+    def _query(self, key, compute):
+        if self.frame is None:
+            return None
+        result = self._results.get(key)
+        if result is None:
+            started = time.perf_counter()
+            result = compute(self.frame)
+            self.last_query_duration = time.perf_counter() - started
+            self.queries += 1
+            self._results.put(key, result)
+        return result
+
+    def spreads(self, limit=10, item_type=None, min_price=1.0, min_listings=5):
+        """Items cheapest on Buff relative to Steam, by Steam/Buff price ratio"""
+
+        def compute(frame):
+            mask = (frame["buff_price_usd"] >= min_price) & (frame["listing_count"] >= min_listings)
+            mask &= frame["spread_ratio"].notna()
+            if item_type is not None:
+                mask &= frame["item_type"] == item_type
+            return frame[mask].nlargest(limit, "spread_ratio")
+
+        return self._query(("spreads", limit, item_type, min_price, min_listings), compute)
+
+    def cheapest(self, item_type=None, max_price=None, weapon_type=None, stattrak=None, limit=10):
+        def compute(frame):
+            mask = np.ones(len(frame), dtype=bool)
+            if item_type is not None:
+                mask &= frame["item_type"] == item_type
+            if weapon_type is not None:
+                mask &= frame["weapon_key"] == weapon_key(weapon_type)
+            if stattrak is not None:
+                mask &= frame["is_stattrak"] == stattrak
+            if max_price is not None:
+                mask &= frame["buff_price_usd"] <= max_price
+            return frame[mask].nsmallest(limit, "buff_price_usd")
+
+        return self._query(("cheapest", item_type, max_price, weapon_type, stattrak, limit), compute)
+
+    def stattrak_premium(self, item_type="Skin", weapon_type=None):
+        """StatTrak over regular Buff price for the same skin and wear, summarised per wear"""
+
+        def compute(frame):
+            mask = (frame["item_type"] == item_type) & ~frame["is_souvenir"] & frame["wear"].isin(list(WEAR_ORDER))
+            if weapon_type is not None:
+                mask &= frame["weapon_key"] == weapon_key(weapon_type)
+            subset = frame.loc[mask, ["name", "wear", "is_stattrak", "buff_price_usd"]]
+            pairs = subset[~subset["is_stattrak"]].merge(
+                subset[subset["is_stattrak"]], on=["name", "wear"], suffixes=("_regular", "_stattrak")
+            )
+            pairs["premium"] = pairs["buff_price_usd_stattrak"] / pairs["buff_price_usd_regular"]
+
+            summary = pairs.groupby("wear", observed=True)["premium"].agg(["median", "mean", "count"])
+            return summary.sort_index(key=lambda wears: wears.map(WEAR_ORDER))
+
+        return self._query(("stattrak_premium", item_type, weapon_type), compute)
+
+    async def _on_error(self, error):
+        log.exception("Price analytics refresh failed", exc_info=error)
+
+    def stats(self):
+        return {
+            "items": 0 if self.frame is None else len(self.frame),
+            "snapshot_at": self.snapshot_at,
+            "refreshes": self.refreshes,
+            "queries": self.queries,
+            **{f"results_{key}": value for key, value in self._results.stats().items()},
+            "last_build_duration": self.last_build_duration,
+            "last_query_duration": self.last_query_duration,
+        }
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import logging
+import time
+
+from utils.deadline import detached_task, within_deadline
+
+log = logging.getLogger(__name__)
+
+
+class PriceCache:
+    """Redis-backed cache for parsed Buff price data keyed by the full sell_order query URL.
+
+    Entries are fresh for `ttl` seconds. For a further `stale_ttl` seconds they are still served, but
+    the caller is expected to refresh them in the background through `revalidate`. After that Redis
+    expires the key and the next lookup is a miss.
+    """
+
+    def __init__(self, redis_conn, ttl=60, stale_ttl=300, prefix="buff:price:"):
+        self.redis_conn = redis_conn
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.prefix = prefix
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+        self._refreshing = {}
+
+    def _key(self, url):
+        return f"{self.prefix}{url}"
+
+    async def get(self, url):
+        """Returns (item_data, is_stale) for a cached url, or None on a miss"""
+        try:
+            # A hung Redis mustn't hold a command past its deadline, running out of it is just a miss
+            raw = await within_deadline(asyncio.to_thread(self.redis_conn.get, self._key(url)))
+        except Exception:
+            log.exception("Price cache read failed for %s", url)
+            self.errors += 1
+            raw = None
+
+        if raw is None:
+            self.misses += 1
+            return None
+
+        entry = json.loads(raw)
+        age = time.time() - entry["fetched_at"]
+        if age > self.ttl + self.stale_ttl:
+            self.misses += 1
+            return None
+
+        is_stale = age > self.ttl
+        if is_stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+
+        return entry["data"], is_stale
+
+    async def set(self, url, item_data):
+        entry = json.dumps({"fetched_at": time.time(), "data": item_data})
+        try:
+            await asyncio.to_thread(self.redis_conn.set, self._key(url), entry, ex=self.ttl + self.stale_ttl)
+        except Exception:
+            log.exception("Price cache write failed for %s", url)
+            self.errors += 1
+
+    def revalidate(self, url, refresh_entry):
+        """Refreshes a stale entry in the background, at most one refresh per url at a time.
+
+        `refresh_entry` is a zero-argument callable returning an awaitable that fetches the new item data
+        and stores it with `set`.
+        """
+        if url in self._refreshing:
+            return self._refreshing[url]
+
+        async def refresh():
+            try:
+                await refresh_entry()
+            except Exception:
+                log.exception("Background price refresh failed for %s", url)
+            finally:
+                self._refreshing.pop(url, None)
+
+        # Detached so the refresh isn't cut short by the deadline of the command that noticed the stale entry
+        task = detached_task(refresh())
+        self._refreshing[url] = task
+        return task
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "refreshing": len(self._refreshing),
+        }
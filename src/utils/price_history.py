@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from discord.ext import tasks
+from sqlalchemy import insert, select, text
+
+from models.price_history import Base, PricePoint, select_price_rollups
+
+log = logging.getLogger(__name__)
+
+# Re-aggregating a small trailing window every cycle keeps rollups idempotent and picks up late rows
+ROLLUP_HOURLY_SQL = text(
+    """
+    INSERT INTO price_rollups (buff_id, resolution, bucket_start, samples, buff_price_open, buff_price_high,
+                               buff_price_low, buff_price_close, buff_price_avg, steam_price_avg, listing_count_avg)
+    SELECT buff_id, '1h', date_trunc('hour', observed_at), count(*),
+           (array_agg(buff_price_usd ORDER BY observed_at))[1], max(buff_price_usd), min(buff_price_usd),
+           (array_agg(buff_price_usd ORDER BY observed_at DESC))[1], avg(buff_price_usd), avg(steam_price_usd),
+           avg(listing_count)
+    FROM price_history
+    WHERE observed_at >= :since
+    GROUP BY buff_id, date_trunc('hour', observed_at)
+    ON CONFLICT (buff_id, resolution, bucket_start) DO UPDATE SET
+        samples = EXCLUDED.samples, buff_price_open = EXCLUDED.buff_price_open,
+        buff_price_high = EXCLUDED.buff_price_high, buff_price_low = EXCLUDED.buff_price_low,
+        buff_price_close = EXCLUDED.buff_price_close, buff_price_avg = EXCLUDED.buff_price_avg,
+        steam_price_avg = EXCLUDED.steam_price_avg, listing_count_avg = EXCLUDED.listing_count_avg
+    """
+)
+ROLLUP_DAILY_SQL = text(
+    """
+    INSERT INTO price_rollups (buff_id, resolution, bucket_start, samples, buff_price_open, buff_price_high,
+                               buff_price_low, buff_price_close, buff_price_avg, steam_price_avg, listing_count_avg)
+    SELECT buff_id, '1d', date_trunc('day', bucket_start), sum(samples),
+           (array_agg(buff_price_open ORDER BY bucket_start))[1], max(buff_price_high), min(buff_price_low),
+           (array_agg(buff_price_close ORDER BY bucket_start DESC))[1],
+           sum(buff_price_avg * samples) / sum(samples), avg(steam_price_avg), avg(listing_count_avg)
+    FROM price_rollups
+    WHERE resolution = '1h' AND bucket_start >= :since
+    GROUP BY buff_id, date_trunc('day', bucket_start)
+    ON CONFLICT (buff_id, resolution, bucket_start) DO UPDATE SET
+        samples = EXCLUDED.samples, buff_price_open = EXCLUDED.buff_price_open,
+        buff_price_high = EXCLUDED.buff_price_high, buff_price_low = EXCLUDED.buff_price_low,
+        buff_price_close = EXCLUDED.buff_price_close, buff_price_avg = EXCLUDED.buff_price_avg,
+        steam_price_avg = EXCLUDED.steam_price_avg, listing_count_avg = EXCLUDED.listing_count_avg
+    """
+)
+LIST_PARTITIONS_SQL = text(
+    "SELECT child.relname FROM pg_inherits "
+    "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+    "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+    "WHERE parent.relname = 'price_history'"
+)
+
+
+def partition_name(day):
+    return f"price_history_{day:%Y%m%d}"
+
+
+def choose_resolution(span):
+    """Raw rows for the last day, hourly buckets up to a week, daily buckets beyond that"""
+    if span <= timedelta(days=1):
+        return None
+    if span <= timedelta(days=7):
+        return "1h"
+    return "1d"
+
+
+class PriceHistoryWriter:
+    """Buffers observed prices in memory and appends them to price_history in batches.
+
+    record() never touches the database, so the /pricecheck path is not blocked. A flush loop writes
+    the buffer every `flush_interval` seconds (or sooner once `batch_size` rows are waiting), and a
+    maintenance loop keeps day partitions ahead of time, refreshes the 1h/1d rollups and applies
+    retention: raw partitions are dropped after `raw_retention_days`, hourly buckets deleted after
+    `hourly_retention_days`, daily buckets are kept.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        flush_interval=5,
+        batch_size=500,
+        max_buffer=20_000,
+        rollup_interval=300,
+        raw_retention_days=14,
+        hourly_retention_days=90,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.raw_retention_days = raw_retention_days
+        self.hourly_retention_days = hourly_retention_days
+
+        self._buffer = []
+        self._flush_task = None
+        self._flush_loop = tasks.loop(seconds=flush_interval)(self.flush)
+        self._flush_loop.error(self._on_error)
+        self._maintenance_loop = tasks.loop(seconds=rollup_interval)(self.maintain)
+        self._maintenance_loop.error(self._on_error)
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_flush_duration = 0.0
+        self.last_rollup_duration = 0.0
+
+    def start(self):
+        self._flush_loop.start()
+        self._maintenance_loop.start()
+
+    async def stop(self):
+        self._flush_loop.cancel()
+        self._maintenance_loop.cancel()
+        # Don't lose what's still buffered on shutdown
+        await self.flush()
+
+    def record(self, buff_id, buff_price_usd, steam_price_usd=None, listing_count=None, observed_at=None):
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+
+        self._buffer.append(
+            {
+                "buff_id": buff_id,
+                "observed_at": observed_at or datetime.now(timezone.utc),
+                "buff_price_usd": float(buff_price_usd),
+                "steam_price_usd": steam_price_usd if isinstance(steam_price_usd, float) else None,
+                "listing_count": listing_count,
+            }
+        )
+        self.recorded += 1
+        # A full batch is written right away instead of waiting for the next tick
+        if len(self._buffer) >= self.batch_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        if not self._buffer:
+            return
+
+        rows, self._buffer = self._buffer, []
+        started = time.monotonic()
+        try:
+            async with self.session_factory() as session:
+                await session.execute(insert(PricePoint), rows)
+                await session.commit()
+        except Exception:
+            self.dropped += len(rows)
+            log.exception("Failed to write %s price points", len(rows))
+            return
+
+        self.written += len(rows)
+        self.flushes += 1
+        self.last_flush_duration = time.monotonic() - started
+
+    async def ensure_schema(self):
+        async with self.session_factory() as session:
+            connection = await session.connection()
+            await connection.run_sync(Base.metadata.create_all)
+            await session.commit()
+        await self.ensure_partitions()
+
+    async def ensure_partitions(self, days_ahead=2):
+        today = datetime.now(timezone.utc).date()
+        async with self.session_factory() as session:
+            for offset in range(-1, days_ahead + 1):
+                day = today + timedelta(days=offset)
+                await session.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF price_history "
+                        f"FOR VALUES FROM ('{day.isoformat()} 00:00+00') TO ('{day + timedelta(days=1)} 00:00+00')"
+                    )
+                )
+            await session.commit()
+
+    async def rollup(self):
+        now = datetime.now(timezone.utc)
+        hour = now.replace(minute=0, second=0, microsecond=0)
+        day = hour.replace(hour=0)
+        async with self.session_factory() as session:
+            await session.execute(ROLLUP_HOURLY_SQL, {"since": hour - timedelta(hours=1)})
+            await session.execute(ROLLUP_DAILY_SQL, {"since": day - timedelta(days=1)})
+            await session.commit()
+
+    async def apply_retention(self):
+        today = datetime.now(timezone.utc).date()
+        oldest_kept = partition_name(today - timedelta(days=self.raw_retention_days))
+        async with self.session_factory() as session:
+            partitions = (await session.execute(LIST_PARTITIONS_SQL)).scalars().all()
+            # Partition names sort by date, so anything below the cut-off is past retention
+            for partition in sorted(partitions):
+                if partition < oldest_kept:
+                    await session.execute(text(f"DROP TABLE IF EXISTS {partition}"))
+            await session.execute(
+                text("DELETE FROM price_rollups WHERE resolution = '1h' AND bucket_start < :cutoff"),
+                {"cutoff": datetime.now(timezone.utc) - timedelta(days=self.hourly_retention_days)},
+            )
+            await session.commit()
+
+    async def maintain(self):
+        started = time.monotonic()
+        try:
+            await self.ensure_partitions()
+            await self.flush()
+            await self.rollup()
+            await self.apply_retention()
+        except Exception:
+            # An exception escaping a tasks.loop stops it for good, so just try again next tick
+            log.exception("Price history maintenance failed")
+            return
+
+        self.last_rollup_duration = time.monotonic() - started
+
+    async def _on_error(self, error):
+        log.exception("Price history loop failed", exc_info=error)
+
+    def stats(self):
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "last_flush_duration": self.last_flush_duration,
+            "last_rollup_duration": self.last_rollup_duration,
+        }
+
+
+async def get_price_history(session, buff_id, days=30):
+    """Price history for a goods ID over the last `days`, read from the coarsest fitting rollup.
+
+    Returns (resolution, rows) where resolution is "raw", "1h" or "1d". Rows from rollups are
+    PriceRollup objects, raw rows are PricePoint objects.
+    """
+    span = timedelta(days=days)
+    since = datetime.now(timezone.utc) - span
+    resolution = choose_resolution(span)
+
+    if resolution is None:
+        query = (
+            select(PricePoint)
+            .where(PricePoint.buff_id == buff_id, PricePoint.observed_at >= since)
+            .order_by(PricePoint.observed_at)
+        )
+        return "raw", (await session.execute(query)).scalars().all()
+
+    return resolution, (await session.execute(select_price_rollups(buff_id, resolution, since))).scalars().all()
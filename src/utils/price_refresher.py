@@ -0,0 +1,143 @@
+import asyncio
+import heapq
+import logging
+import time
+from collections import defaultdict
+
+from discord.ext import tasks
+
+import utils.buff163_utils as buff_utils
+
+log = logging.getLogger(__name__)
+
+
+class PriceRefresher:
+    """Keeps the prices of frequently requested items warm in the price cache.
+
+    Every /pricecheck bumps the item's score, scores decay each cycle so the hot set follows what
+    people are looking at right now. Every `interval` seconds the top `hot_set_size` items have their
+    goods IDs refreshed, at most `budget` Buff requests per cycle, least recently refreshed first (most
+    popular first among equals) so a hot set bigger than the budget is covered in turn. An entry is due
+    once it is within one interval of the cache TTL, so it's renewed before any lookup can find it stale.
+    """
+
+    def __init__(self, bot, interval=45, hot_set_size=50, budget=30, concurrency=4, decay=0.8):
+        self.bot = bot
+        self.interval = interval
+        self.hot_set_size = hot_set_size
+        self.budget = budget
+        self.concurrency = concurrency
+        self.decay = decay
+
+        self._scores = defaultdict(float)
+        self._refreshed_at = {}
+        self._loop = tasks.loop(seconds=interval)(self._refresh_cycle)
+        self._loop.error(self._on_error)
+
+        self.cycles = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.last_cycle_started = None
+        self.last_cycle_duration = 0.0
+        self.last_cycle_lag = 0.0
+
+    def start(self):
+        if self.interval >= self.bot.price_cache.ttl:
+            log.warning(
+                "Price refresh interval %ss is not under the cache TTL %ss, hot entries will go stale between cycles",
+                self.interval,
+                self.bot.price_cache.ttl,
+            )
+        self._loop.start()
+
+    def stop(self):
+        self._loop.cancel()
+
+    def record_request(self, name):
+        self._scores[name] += 1
+
+    def hot_set(self):
+        return heapq.nlargest(self.hot_set_size, self._scores, key=self._scores.get)
+
+    def max_age(self):
+        """Age at which a hot entry is refreshed, so the last cycle before the cache TTL runs out still catches it"""
+        return max(0.0, self.bot.price_cache.ttl - self.interval - self.last_cycle_duration)
+
+    def _due_buff_ids(self):
+        catalog = self.bot.item_catalog
+        now = time.time()
+        max_age = self.max_age()
+
+        hot_ids = {}
+        for name in self.hot_set():
+            item_data = catalog.get(name)
+            if item_data is None:
+                continue
+            for record in (*item_data["regular_items"], *item_data["stattrak_items"], *item_data["souvenir_items"]):
+                hot_ids[record.buff_id] = None
+
+        # Forget goods IDs that dropped out of the hot set
+        for buff_id in self._refreshed_at.keys() - hot_ids.keys():
+            del self._refreshed_at[buff_id]
+
+        due = [buff_id for buff_id in hot_ids if now - self._refreshed_at.get(buff_id, 0) >= max_age]
+        # Stable, so goods IDs refreshed at the same time (or never) stay in hot set order
+        due.sort(key=lambda buff_id: self._refreshed_at.get(buff_id, 0))
+        return due[: self.budget]
+
+    async def _refresh(self, semaphore, buff_id):
+        async with semaphore:
+            url = await buff_utils.construct_buff_api_url(buff_id)
+            try:
+                await buff_utils.refresh_item_data(self.bot, buff_id, url)
+            except Exception:
+                self.failed += 1
+                log.debug("Pre-warm refresh failed for %s", buff_id, exc_info=True)
+            else:
+                self.refreshed += 1
+                self._refreshed_at[buff_id] = time.time()
+
+    async def _refresh_cycle(self):
+        started = time.monotonic()
+        if self.last_cycle_started is not None:
+            self.last_cycle_lag = max(0.0, started - self.last_cycle_started - self.interval)
+        self.last_cycle_started = started
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*[self._refresh(semaphore, buff_id) for buff_id in self._due_buff_ids()])
+
+        # Decay scores and forget items nobody asked for in a while
+        for name in list(self._scores):
+            self._scores[name] *= self.decay
+            if self._scores[name] < 0.05:
+                del self._scores[name]
+
+        self.cycles += 1
+        self.last_cycle_duration = time.monotonic() - started
+
+    async def _on_error(self, error):
+        log.exception("Price refresh cycle failed", exc_info=error)
+
+    def stats(self):
+        now = time.time()
+        hot_ages = []
+        catalog = self.bot.item_catalog
+        for name in self.hot_set():
+            item_data = catalog.get(name)
+            if item_data is None:
+                continue
+            for record in item_data["regular_items"]:
+                if record.buff_id in self._refreshed_at:
+                    hot_ages.append(now - self._refreshed_at[record.buff_id])
+
+        return {
+            "hot_items": min(len(self._scores), self.hot_set_size),
+            "tracked_items": len(self._scores),
+            "cycles": self.cycles,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "mean_staleness": sum(hot_ages) / len(hot_ages) if hot_ages else 0.0,
+            "max_staleness": max(hot_ages, default=0.0),
+            "last_cycle_duration": self.last_cycle_duration,
+            "last_cycle_lag": self.last_cycle_lag,
+        }
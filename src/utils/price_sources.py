@@ -0,0 +1,168 @@
+import abc
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import urlencode
+
+import utils.buff163_utils as buff_utils
+from utils.deadline import remaining
+from utils.rate_limit import TokenBucket
+
+log = logging.getLogger(__name__)
+
+STEAM_MARKET_URL = os.getenv("STEAM_MARKET_URL", "https://steamcommunity.com/market/priceoverview/")
+
+
+def parse_money(value):
+    """Parses Steam's "$1,234.56" strings, None for anything that isn't a price"""
+    if not value:
+        return None
+    try:
+        return float(value.replace("$", "").replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+class PriceSource(abc.ABC):
+    """A market we can quote a catalogue record on.
+
+    Subclasses set `name` and implement `fetch(client, record)`, returning a dict with at least
+    "price_usd" (float or None). `timeout` bounds how long a quote waits for this source, and never
+    more than what's left of the caller's deadline.
+    """
+
+    name = None
+
+    def __init__(self, timeout=5.0):
+        self.timeout = timeout
+
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self._latencies = []
+
+    @abc.abstractmethod
+    async def fetch(self, client, record):
+        """The record's price on this market, a dict with at least "price_usd" """
+
+    async def quote(self, client, record):
+        """fetch() under this source's timeout, returns (result, error, latency) and never raises"""
+        self.requests += 1
+        started = time.perf_counter()
+        timeout = self.timeout if remaining() is None else min(self.timeout, remaining())
+        try:
+            result = await asyncio.wait_for(self.fetch(client, record), timeout)
+        except asyncio.TimeoutError as e:
+            self.timeouts += 1
+            return None, e, time.perf_counter() - started
+        except Exception as e:
+            self.errors += 1
+            log.debug("%s quote failed for %s", self.name, record.buff_id, exc_info=True)
+            return None, e, time.perf_counter() - started
+
+        latency = time.perf_counter() - started
+        self._latencies.append(latency)
+        # Keep a rolling window, enough for stable percentiles
+        if len(self._latencies) > 1000:
+            del self._latencies[:500]
+        return result, None, latency
+
+    def stats(self):
+        ordered = sorted(self._latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "p50_ms": ordered[len(ordered) // 2] * 1000 if ordered else 0.0,
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000 if ordered else 0.0,
+        }
+
+
+class BuffPriceSource(PriceSource):
+    """Lowest Buff sell order, through the shared cache, single-flight and rate limiter"""
+
+    name = "buff"
+
+    async def fetch(self, client, record):
+        item_data = await buff_utils.fetch_item_id_data(client, record.buff_id)
+        return {"price_usd": float(item_data["buff_price_usd"]), "image_url": item_data["skin_image_url"]}
+
+
+class SteamMarketPriceSource(PriceSource):
+    """Steam Community Market priceoverview, keyed by the market hash name (our raw_name).
+
+    Steam rate limits this endpoint hard, so it gets its own token bucket; a quote that would wait
+    longer than the timeout just reports a timeout instead of delaying the other sources.
+    """
+
+    name = "steam"
+
+    def __init__(self, timeout=5.0, url=STEAM_MARKET_URL, rate=0.3, burst=5):
+        super().__init__(timeout)
+        self.url = url
+        self.rate_limiter = TokenBucket(rate=rate, burst=burst)
+
+    async def fetch(self, client, record):
+        await self.rate_limiter.acquire()
+        params = {"appid": 730, "currency": 1, "market_hash_name": record.raw_name}
+        async with client.upstream.get("steam", f"{self.url}?{urlencode(params)}") as response:
+            if response.status == 429:
+                raise Exception("Rate limited")
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+
+        if not data.get("success"):
+            return {"price_usd": None}
+        return {
+            "price_usd": parse_money(data.get("lowest_price")),
+            "median_price_usd": parse_money(data.get("median_price")),
+            "volume": int(data["volume"].replace(",", "")) if data.get("volume") else None,
+        }
+
+
+PRICE_SOURCES = {source.name: source for source in (BuffPriceSource, SteamMarketPriceSource)}
+
+
+class PriceAggregator:
+    """Quotes a record on every configured source at once and merges the answers.
+
+    Each source runs as its own task under its own timeout, so a slow or failing market only drops
+    its own entry. The merged quote is {"sources": {name: {..., "latency_ms"}}, "errors": {name: str},
+    "best": (name, price)} where best is the cheapest source that answered.
+    """
+
+    def __init__(self, sources):
+        self.sources = list(sources)
+
+    @classmethod
+    def from_names(cls, names, timeout=5.0):
+        return cls(PRICE_SOURCES[name.strip()](timeout=timeout) for name in names if name.strip())
+
+    async def quote(self, client, record):
+        results = await asyncio.gather(*[source.quote(client, record) for source in self.sources])
+
+        quote = {"sources": {}, "errors": {}, "best": None}
+        for source, (result, error, latency) in zip(self.sources, results):
+            if error is not None:
+                quote["errors"][source.name] = "timed out" if isinstance(error, asyncio.TimeoutError) else str(error)
+                continue
+            quote["sources"][source.name] = {**result, "latency_ms": latency * 1000}
+            price = result.get("price_usd")
+            if price is not None and (quote["best"] is None or price < quote["best"][1]):
+                quote["best"] = (source.name, price)
+        return quote
+
+    def stats(self):
+        return {source.name: source.stats() for source in self.sources}
+
+
+def format_quote(quote):
+    lines = []
+    for name, result in quote["sources"].items():
+        price = f"${result['price_usd']:,.2f}" if result.get("price_usd") is not None else "N/A"
+        marker = " (lowest)" if quote["best"] and quote["best"][0] == name and len(quote["sources"]) > 1 else ""
+        lines.append(f"{name.title()}: {price}{marker} · {result['latency_ms']:.0f}ms")
+    for name, error in quote["errors"].items():
+        lines.append(f"{name.title()}: unavailable ({error})")
+    return "\n".join(lines) or "No markets answered"
@@ -0,0 +1,382 @@
+import time
+from bisect import bisect_left, bisect_right
+
+import utils.buff163_utils as buff_utils
+from utils.lru import LRUCache
+
+WEAR_FLOAT_RANGES = {
+    "Factory New": (0.00, 0.07),
+    "Minimal Wear": (0.07, 0.15),
+    "Field-Tested": (0.15, 0.38),
+    "Well-Worn": (0.38, 0.45),
+    "Battle-Scarred": (0.45, 1.00),
+}
+
+
+def parse_float_option(option_value):
+    """A "Float Range" option_value such as "0.45-0.50" as (0.45, 0.5), None for "All" and "Customize" """
+    if not option_value:
+        return None
+    low, high = option_value.split("-", 1)
+    return float(low), float(high)
+
+
+def merge_ranges(ranges):
+    """Sorts (low, high) ranges and merges the ones that overlap or touch"""
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def float_edges(wear_range, menus):
+    """Bucket edges of the item's "Float Range" dropdown inside the wear, plus the wear's own bounds"""
+    edges = set(wear_range)
+    for menu in menus:
+        if menu.button_text == "Float Range":
+            for option_value in menu.values:
+                bounds = parse_float_option(option_value)
+                if bounds is not None:
+                    edges.update(edge for edge in bounds if wear_range[0] <= edge <= wear_range[1])
+    return sorted(edges)
+
+
+def snap_range(low, high, edges):
+    """Widens a range out to the nearest bucket edges, so it's asked for with a shared, canonical query"""
+    return edges[max(bisect_right(edges, low) - 1, 0)], edges[min(bisect_left(edges, high), len(edges) - 1)]
+
+
+def seed_tiers(menus):
+    """{"Tier1": frozenset(paint seeds)} from the item's "Paint seed" dropdowns ("tier-Tier1" option values).
+
+    An item can have more than one "Paint seed" dropdown, a tier's seeds are the union over all of them.
+    """
+    tiers = {}
+    for menu in menus:
+        if menu.button_text == "Paint seed":
+            for option_value, seeds in zip(menu.values, menu.paint_seeds):
+                if option_value and option_value.startswith("tier-"):
+                    tier = option_value.removeprefix("tier-")
+                    tiers[tier] = tiers.get(tier, frozenset()) | frozenset(int(seed) for seed in seeds)
+    return tiers
+
+
+def listing_float(listing):
+    if listing.asset_info is None or not listing.asset_info.paintwear:
+        return None
+    return float(listing.asset_info.paintwear)
+
+
+def listing_seed(listing):
+    if listing.asset_info is None or listing.asset_info.info is None:
+        return None
+    return listing.asset_info.info.paintseed
+
+
+class ListingSpec:
+    """What a user is looking for on one goods ID: float ranges, and a paint seed tier or paint seeds.
+
+    `float_ranges` are [low, high) pairs, clipped to the wear. `tier` is a "Paint seed" option such as
+    "Tier1", `paint_seeds` explicit seeds; a listing has to match all of the given filters.
+    """
+
+    __slots__ = ("buff_id", "wear", "wear_range", "requested_ranges", "float_ranges", "tier", "paint_seeds")
+
+    def __init__(self, buff_id, wear=None, float_ranges=(), tier=None, paint_seeds=()):
+        self.buff_id = buff_id
+        self.wear = wear
+        self.wear_range = WEAR_FLOAT_RANGES.get(wear, (0.00, 1.00))
+        self.requested_ranges = len(float_ranges)
+        low_bound, high_bound = self.wear_range
+        clipped = [(max(low, low_bound), min(high, high_bound)) for low, high in float_ranges]
+        self.float_ranges = merge_ranges([(low, high) for low, high in clipped if low < high])
+        # Asked for float ranges that don't exist in this wear: nothing can match
+        if float_ranges and not self.float_ranges:
+            self.float_ranges = None
+        self.tier = tier
+        self.paint_seeds = frozenset(paint_seeds)
+
+    def matches(self, listing, tier_seeds=None):
+        if self.float_ranges:
+            paintwear = listing_float(listing)
+            if paintwear is None or not any(low <= paintwear < high for low, high in self.float_ranges):
+                return False
+        if self.paint_seeds and listing_seed(listing) not in self.paint_seeds:
+            return False
+        if tier_seeds and listing_seed(listing) not in tier_seeds:
+            return False
+        return True
+
+
+class ListingQuery:
+    """One sell_order query: a float window and at most one paint seed parameter.
+
+    `seeds` are the paint seeds `seed_param` limits it to: None without a seed filter, empty for a
+    tier whose seeds the catalogue doesn't list. They decide whether an already fetched query is
+    broad enough to answer another one locally.
+    """
+
+    __slots__ = ("buff_id", "wear_range", "min_float", "max_float", "seed_param", "seeds")
+
+    def __init__(self, buff_id, wear_range, min_float, max_float, seed_param=None, seeds=None):
+        self.buff_id = buff_id
+        self.wear_range = wear_range
+        self.min_float = min_float
+        self.max_float = max_float
+        self.seed_param = seed_param
+        self.seeds = seeds
+
+    @property
+    def key(self):
+        return self.buff_id, round(self.min_float, 4), round(self.max_float, 4), self.seed_param
+
+    @property
+    def width(self):
+        return self.max_float - self.min_float
+
+    def filters(self):
+        """Keyword arguments for construct_buff_api_url"""
+        filters = {"sort_by": "price.asc"}
+        # The whole wear needs no float filter, which keeps it the same query as a plain listing
+        if (self.min_float, self.max_float) != self.wear_range:
+            filters["min_paintwear"] = f"{self.min_float:g}"
+            filters["max_paintwear"] = f"{self.max_float:g}"
+        if self.seed_param is not None:
+            name, value = self.seed_param
+            filters[name] = value
+        return filters
+
+    def covers(self, other):
+        if self.buff_id != other.buff_id:
+            return False
+        if not (self.min_float <= other.min_float and other.max_float <= self.max_float):
+            return False
+        if self.seed_param == other.seed_param:
+            return True
+        # Another query's seed filter can only be applied locally when we know its seeds
+        if other.seed_param is None or not other.seeds:
+            return False
+        return self.seed_param is None or other.seeds <= self.seeds
+
+    def contains(self, listing):
+        paintwear = listing_float(listing)
+        if paintwear is not None and not self.min_float <= paintwear <= self.max_float:
+            return False
+        return not self.seeds or listing_seed(listing) in self.seeds
+
+    def __repr__(self):
+        return f"<ListingQuery(buff_id={self.buff_id}, filters={self.filters()})>"
+
+
+class QueryPlan:
+    __slots__ = ("spec", "queries", "naive_queries", "tier_seeds")
+
+    def __init__(self, spec, queries, naive_queries, tier_seeds=None):
+        self.spec = spec
+        self.queries = queries
+        self.naive_queries = naive_queries
+        self.tier_seeds = tier_seeds
+
+
+class ListingEntry:
+    __slots__ = ("query", "listings", "pages", "complete", "conversion_rate", "fetched_at")
+
+    def __init__(self, query, listings, pages, complete, conversion_rate, fetched_at=None):
+        self.query = query
+        self.listings = listings
+        self.pages = pages
+        self.complete = complete
+        self.conversion_rate = conversion_rate
+        self.fetched_at = time.monotonic() if fetched_at is None else fetched_at
+
+
+class QueryPlanner:
+    """Turns a float / paint seed filter into as few sell_order queries as possible.
+
+    Float ranges are merged, then widened to the edges of the item's own "Float Range" buckets so
+    different users share the same queries. Paint seeds use the item's narrowest "Paint seed" tier
+    containing them, a `paintseed` per seed for a few seeds, or no seed filter at all. Every query
+    sorts by price, so even a partly fetched result is the cheapest prefix of that query. Fetched
+    listings are kept for `ttl` seconds; a later query that an entry covers (complete, or with at
+    least `limit` matches for the later spec) is answered from it locally without going upstream. An
+    entry of the same query that stopped short of that is continued from its next page instead.
+    """
+
+    def __init__(self, maxsize=512, ttl=120, page_size=50, max_pages=3, max_seed_queries=4, entries_per_item=8):
+        self.ttl = ttl
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.max_seed_queries = max_seed_queries
+        self.entries_per_item = entries_per_item
+        self._entries = LRUCache(maxsize)
+
+        self.plans = 0
+        self.naive_queries = 0
+        self.upstream_queries = 0
+        self.upstream_pages = 0
+        self.reused = 0
+
+    def _seed_options(self, spec, tiers):
+        """[(seed_param, seeds)] covering the spec's paint seeds, plus the tier's seeds to filter on"""
+        if spec.tier is not None:
+            if spec.tier not in tiers:
+                raise ValueError(f"{spec.tier} isn't a paint seed tier for this item")
+            return [(("tier", spec.tier), tiers[spec.tier])], tiers[spec.tier]
+        if not spec.paint_seeds:
+            return [(None, None)], None
+        if len(spec.paint_seeds) == 1:
+            (seed,) = spec.paint_seeds
+            return [(("paintseed", seed), spec.paint_seeds)], None
+
+        containing = [(len(seeds), tier) for tier, seeds in tiers.items() if seeds and spec.paint_seeds <= seeds]
+        if containing:
+            tier = min(containing)[1]
+            return [(("tier", tier), tiers[tier])], None
+        if len(spec.paint_seeds) <= self.max_seed_queries:
+            return [(("paintseed", seed), frozenset((seed,))) for seed in sorted(spec.paint_seeds)], None
+        return [(None, None)], None
+
+    def plan(self, spec, menus=()):
+        """The queries to answer `spec`, with `menus` the item's FilterMenus (see FilterMenuCache)"""
+        self.plans += 1
+        # What asking Buff for the filter as given would take: a query per float range and per seed
+        naive = max(spec.requested_ranges, 1) * max(len(spec.paint_seeds), 1)
+        self.naive_queries += naive
+        if spec.float_ranges is None:
+            return QueryPlan(spec, [], naive)
+
+        ranges = spec.float_ranges or [spec.wear_range]
+        edges = float_edges(spec.wear_range, menus)
+        # Without known buckets, widening would mean asking for the whole wear, so ask for the exact ranges
+        if len(edges) > 2:
+            ranges = merge_ranges(snap_range(low, high, edges) for low, high in ranges)
+
+        seed_options, tier_seeds = self._seed_options(spec, seed_tiers(menus))
+        queries = [
+            ListingQuery(spec.buff_id, spec.wear_range, low, high, seed_param, seeds)
+            for low, high in ranges
+            for seed_param, seeds in seed_options
+        ]
+        return QueryPlan(spec, queries, naive, tier_seeds)
+
+    def _matching(self, plan, query, listings):
+        return [
+            listing
+            for listing in listings
+            if query.contains(listing) and plan.spec.matches(listing, plan.tier_seeds)
+        ]
+
+    def _answers(self, plan, query, entry, limit):
+        """The entry's listings matching the plan, or None when it stopped too early to answer `query`"""
+        matching = self._matching(plan, query, entry.listings)
+        # A partial fetch is still the cheapest prefix, good enough once it has `limit` matches for this spec.
+        # The same query read to max_pages is all a fetch would return
+        if entry.complete or len(matching) >= limit or (entry.query.key == query.key and entry.pages >= self.max_pages):
+            return matching
+        return None
+
+    def _fresh(self, buff_id):
+        return [
+            entry for entry in self._entries.get(buff_id) or () if time.monotonic() - entry.fetched_at <= self.ttl
+        ]
+
+    def _cached(self, plan, query, limit):
+        """A fresh cached entry that can answer `query`, and its matching listings"""
+        for entry in self._fresh(query.buff_id):
+            if entry.query.covers(query):
+                matching = self._answers(plan, query, entry, limit)
+                if matching is not None:
+                    return entry, matching
+        return None, None
+
+    def _partial(self, query):
+        """A fresh entry of this exact query that stopped before enough pages, to carry on from"""
+        return next((entry for entry in self._fresh(query.buff_id) if entry.query.key == query.key), None)
+
+    def _store(self, entry):
+        entries = [
+            cached
+            for cached in self._entries.get(entry.query.buff_id) or ()
+            if cached.query.key != entry.query.key and time.monotonic() - cached.fetched_at <= self.ttl
+        ]
+        self._entries.put(entry.query.buff_id, [entry, *entries][: self.entries_per_item])
+
+    async def _fetch(self, client, plan, query, limit, partial=None):
+        """Reads the query's pages until `limit` listings match the plan, picking up after `partial`'s pages"""
+        listings = list(partial.listings) if partial else []
+        conversion_rate = partial.conversion_rate if partial else None
+        pages = partial.pages if partial else 0
+        complete = False
+        for page_num in range(pages + 1, self.max_pages + 1):
+            url = await buff_utils.construct_buff_api_url(
+                query.buff_id, page_num=page_num, page_size=self.page_size, **query.filters()
+            )
+            data = await buff_utils.fetch_buff_data(client, query.buff_id, url=url)
+            self.upstream_pages += 1
+            pages = page_num
+            if data is None or not data.data.items:
+                complete = True
+                break
+
+            if conversion_rate is None:
+                goods_info = data.data.goods_infos.get(str(query.buff_id))
+                if goods_info and goods_info.steam_price and float(goods_info.steam_price_cny or 0):
+                    conversion_rate = float(goods_info.steam_price) / float(goods_info.steam_price_cny)
+            listings.extend(data.data.items)
+
+            if page_num >= data.data.total_page:
+                complete = True
+                break
+            if len(self._matching(plan, query, listings)) >= limit:
+                break
+
+        # A continued entry keeps its age, its first pages are no fresher than before
+        fetched_at = partial.fetched_at if partial else None
+        entry = ListingEntry(query, listings, pages, complete, conversion_rate or 1.0, fetched_at)
+        self._store(entry)
+        return entry
+
+    async def execute(self, client, plan, limit=10):
+        """The `limit` cheapest listings matching the plan's spec, as (price_usd, float, seed, listing)"""
+        results = {}
+        # Broadest first, so narrower queries in the same plan can be answered from it
+        for query in sorted(plan.queries, key=lambda query: query.width, reverse=True):
+            entry, matching = self._cached(plan, query, limit)
+            if entry is not None:
+                self.reused += 1
+            else:
+                partial = self._partial(query)
+                self.upstream_queries += 1
+                while matching is None:
+                    # Identical queries from concurrent plans share one fetch, which stops once it's enough for
+                    # the plan that started it; when that's too early for this one carry on from its last page
+                    entry = await buff_utils.buff_flight.do(
+                        f"listings:{query.key}",
+                        lambda query=query, partial=partial: self._fetch(client, plan, query, limit, partial),
+                    )
+                    matching = self._answers(plan, query, entry, limit)
+                    partial = entry
+
+            for listing in matching:
+                results[listing.id or id(listing)] = (
+                    round(float(listing.price) * entry.conversion_rate, 2),
+                    listing_float(listing),
+                    listing_seed(listing),
+                    listing,
+                )
+
+        return sorted(results.values(), key=lambda result: result[0])[:limit]
+
+    def stats(self):
+        return {
+            "plans": self.plans,
+            "naive_queries": self.naive_queries,
+            "upstream_queries": self.upstream_queries,
+            "upstream_pages": self.upstream_pages,
+            "reused": self.reused,
+            "saved": self.naive_queries - self.upstream_queries,
+            **{f"entries_{key}": value for key, value in self._entries.stats().items()},
+        }
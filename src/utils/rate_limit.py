@@ -0,0 +1,99 @@
+import asyncio
+import random
+import time
+
+
+class TokenBucket:
+    """Async token bucket, `rate` requests per second with bursts of up to `burst` requests.
+
+    Waiters are served in arrival order, so a burst of callers is spread out instead of all waking
+    up at the same instant.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+        self.acquired = 0
+        self.waited = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        start = time.monotonic()
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+        self.acquired += 1
+        self.waited += time.monotonic() - start
+
+    def stats(self):
+        return {
+            "acquired": self.acquired,
+            "average_wait": self.waited / self.acquired if self.acquired else 0.0,
+            "tokens": self.tokens,
+        }
+
+
+class RetryBudget:
+    """Shared allowance of retries for every caller of one upstream.
+
+    Each first attempt deposits `ratio` of a retry and the budget also refills slowly at
+    `min_per_second`, capped at `max_balance`. A retry spends one whole token, so once the upstream
+    starts failing most requests the budget runs dry and callers fail fast instead of piling more
+    retries onto a saturated host.
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=0.5, max_balance=10):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self.balance = max_balance
+        self._updated = time.monotonic()
+
+        self.requests = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def _trickle(self):
+        now = time.monotonic()
+        self.balance = min(self.max_balance, self.balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def record_request(self):
+        self._trickle()
+        self.requests += 1
+        self.balance = min(self.max_balance, self.balance + self.ratio)
+
+    def try_retry(self):
+        self._trickle()
+        if self.balance >= 1:
+            self.balance -= 1
+            self.retries += 1
+            return True
+
+        self.rejected += 1
+        return False
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "balance": self.balance,
+        }
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Full-jitter exponential backoff so retries from concurrent callers don't line up"""
+    return random.uniform(0, min(cap, base * 2**attempt))
@@ -0,0 +1,75 @@
+import heapq
+import re
+
+NGRAM_SIZE = 3
+
+# Characters that start a new "word" inside an item name, e.g. "AK-47 | Redline" or "★ M9 Bayonet"
+WORD_BOUNDARY = re.compile(r"(?:^|(?<=[\s|(\-★™]))\S")
+
+
+class ItemSearchIndex:
+    """Precomputed n-gram index over item names for autocomplete lookups.
+
+    Every name is lowercased once at build time and every 1, 2 and 3 character substring is mapped to
+    the names containing it. A lookup intersects the posting lists of the query's trigrams, so the cost
+    follows the number of candidate names instead of the size of the catalogue.
+    """
+
+    def __init__(self, names):
+        self.names = sorted(set(names))
+        self._lowered = [name.lower() for name in self.names]
+        self._name_set = frozenset(self.names)
+        self._word_starts = [frozenset(m.start() for m in WORD_BOUNDARY.finditer(name)) for name in self._lowered]
+
+        postings = {}
+        for idx, name in enumerate(self._lowered):
+            grams = set()
+            for size in range(1, NGRAM_SIZE + 1):
+                grams.update(name[i : i + size] for i in range(len(name) - size + 1))
+            for gram in grams:
+                postings.setdefault(gram, []).append(idx)
+
+        self._postings = {gram: frozenset(ids) for gram, ids in postings.items()}
+
+    def __contains__(self, name):
+        return name in self._name_set
+
+    def __len__(self):
+        return len(self.names)
+
+    def _candidates(self, query):
+        if len(query) <= NGRAM_SIZE:
+            return self._postings.get(query, frozenset())
+
+        grams = {query[i : i + NGRAM_SIZE] for i in range(len(query) - NGRAM_SIZE + 1)}
+        lists = sorted((self._postings.get(gram, frozenset()) for gram in grams), key=len)
+        smallest, rest = lists[0], lists[1:]
+
+        # Trigram hits can come from different positions in the name, so confirm the real substring
+        return [idx for idx in smallest if all(idx in other for other in rest) and query in self._lowered[idx]]
+
+    def _rank(self, idx, query):
+        name = self._lowered[idx]
+        if name.startswith(query):
+            tier = 0
+        else:
+            tier = 2
+            word_starts = self._word_starts[idx]
+            pos = name.find(query)
+            while pos != -1:
+                if pos in word_starts:
+                    tier = 1
+                    break
+                pos = name.find(query, pos + 1)
+
+        return tier, len(name), name
+
+    def search(self, value, limit=25):
+        """Returns up to `limit` names containing `value`, prefix and whole-word matches first"""
+        query = value.lower()
+        if not query:
+            return []
+
+        candidates = self._candidates(query)
+        best = heapq.nsmallest(limit, candidates, key=lambda idx: self._rank(idx, query))
+        return [self.names[idx] for idx in best]
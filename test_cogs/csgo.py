@@ -4,11 +4,13 @@ import os
 import sqlite3
 
 import discord
-import matplotlib.pyplot as plt
 from discord import ButtonStyle, app_commands
 from discord.ext import commands
 from fuzzywuzzy import process
 
+import utils.buff163_utils as buff_utils
+from utils.rate_limit import backoff_delay
+
 
 class CSGO(commands.Cog):
     def __init__(self, bot):
@@ -29,11 +31,12 @@ class CSGO(commands.Cog):
         url = f"https://buff.163.com/api/market/goods/sell_order?game=csgo&goods_id={item_id}&page_num=1&sort_by=default&mode=&allow_tradable_cooldown=1"
 
         max_retries = 5
-        backoff_factor = 2
 
+        buff_utils.buff_retry_budget.record_request()
         for attempt in range(1, max_retries + 1):
+            await buff_utils.buff_rate_limiter.acquire()
             try:
-                async with interaction.client.session.get(url) as response:
+                async with interaction.client.upstream.get("buff", url) as response:
                     if response.status == 429:
                         raise Exception("Rate limited")
                     response.raise_for_status()
@@ -70,11 +73,10 @@ class CSGO(commands.Cog):
                     return "N/A", "N/A", None
 
             except Exception as e:
-                if attempt == max_retries:
+                if attempt == max_retries or not buff_utils.buff_retry_budget.try_retry():
                     raise e
                 else:
-                    wait_time = backoff_factor**attempt
-                    await asyncio.sleep(wait_time)
+                    await asyncio.sleep(backoff_delay(attempt))
                     continue
 
     async def fetch_skin_data_for_item_record(self, interaction, item_record):
@@ -96,30 +98,26 @@ class CSGO(commands.Cog):
         }
 
     async def create_price_table_image(self, wear_prices):
-        wears, buff_prices, steam_prices = zip(
-            *[
-                (
-                    wp["wear_label"],
-                    float(wp["buff_price"].replace("$", "")) if wp["buff_price"] != "N/A" else 0,
-                    float(wp["steam_price"].replace("$", "")) if wp["steam_price"] != "N/A" else 0,
-                )
-                for wp in wear_prices
-            ]
+        rows = tuple(
+            (
+                wp["wear_label"],
+                float(wp["buff_price"].replace("$", "")) if wp["buff_price"] != "N/A" else 0,
+                float(wp["steam_price"].replace("$", "")) if wp["steam_price"] != "N/A" else 0,
+            )
+            for wp in wear_prices
+        )
+        variants = tuple(
+            sorted(
+                {
+                    "stattrak" if wp["is_stattrak"] else "souvenir" if wp["is_souvenir"] else "regular"
+                    for wp in wear_prices
+                }
+            )
         )
 
-        fig, ax = plt.subplots()
-        ax.bar(wears, buff_prices, label="Buff Price", alpha=0.6)
-        ax.bar(wears, steam_prices, label="Steam Price", alpha=0.6)
-        ax.set_ylabel("Price (USD)")
-        ax.set_title("Skin Prices")
-        ax.legend()
-
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png")
-        buf.seek(0)
-        plt.close(fig)
-
-        return buf
+        name = wear_prices[0]["raw_name"].strip()
+        png = await self.bot.chart_renderer.render(name, variants, rows, title="Skin Prices")
+        return io.BytesIO(png)
 
     @app_commands.command(name="skinp", description="Get skin prices for CSGO 2")
     async def skinp(self, interaction: discord.Interaction, item: str):
@@ -215,7 +213,7 @@ class SkinButtons(discord.ui.View):
             ]
 
         skin_image_url = filtered_wear_prices[0]["skin_image_url"]
-        table_image = self.create_price_table_image(filtered_wear_prices)
+        table_image = await self.cog.create_price_table_image(filtered_wear_prices)
         table_image_url = await self.cog.upload_image(interaction, table_image)
 
         await interaction.response.edit_message(content=f"{self.skin_name}\n{skin_image_url}\n{table_image_url}")
@@ -7,6 +7,9 @@ import discord
 from discord import ButtonStyle, app_commands
 from discord.ext import commands
 
+import utils.buff163_utils as buff_utils
+from utils.rate_limit import backoff_delay
+
 
 class CSGO(commands.Cog):
     def __init__(self, bot):
@@ -26,11 +29,12 @@ class CSGO(commands.Cog):
         url = f"https://buff.163.com/api/market/goods/sell_order?game=csgo&goods_id={item_id}"
 
         max_retries = 5
-        backoff_factor = 2
 
+        buff_utils.buff_retry_budget.record_request()
         for attempt in range(1, max_retries + 1):
+            await buff_utils.buff_rate_limiter.acquire()
             try:
-                async with interaction.client.session.get(url) as response:
+                async with interaction.client.upstream.get("buff", url) as response:
                     if response.status == 429:
                         raise Exception("Rate limited")
                     response.raise_for_status()
@@ -67,11 +71,10 @@ class CSGO(commands.Cog):
                     return "N/A", "N/A", None
 
             except Exception as e:
-                if attempt == max_retries:
+                if attempt == max_retries or not buff_utils.buff_retry_budget.try_retry():
                     raise e
                 else:
-                    wait_time = backoff_factor**attempt
-                    await asyncio.sleep(wait_time)
+                    await asyncio.sleep(backoff_delay(attempt))
                     continue
 
     async def fetch_skin_data_for_item_record(self, interaction, item_record):
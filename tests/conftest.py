@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+from redis import Redis
+
+import utils.buff163_utils as buff_utils
+import utils.price_cache as price_cache
+from fake_redis import FakeRedisServer
+from utils.price_cache import PriceCache
+
+
+class FakeClock:
+    """time.time() stand-in that only moves when a test advances it"""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def redis_server(clock):
+    server = FakeRedisServer(clock).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def cache(redis_server, clock, monkeypatch):
+    # Entry ages are measured with the same clock the fake Redis expires keys by
+    monkeypatch.setattr(price_cache, "time", SimpleNamespace(time=clock))
+    return PriceCache(Redis(host="127.0.0.1", port=redis_server.port, socket_timeout=1), ttl=60, stale_ttl=300)
+
+
+@pytest.fixture(autouse=True)
+def fresh_buff_state(monkeypatch):
+    """Process-wide Buff limits and single-flight, reset per test so one test's requests don't throttle the next"""
+    monkeypatch.setattr(buff_utils, "buff_flight", buff_utils.SingleFlight())
+    monkeypatch.setattr(buff_utils, "buff_rate_limiter", buff_utils.TokenBucket(rate=1000, burst=1000))
+    monkeypatch.setattr(buff_utils, "buff_retry_budget", buff_utils.RetryBudget(ratio=1.0))
+    # Retries back off for real, keep them short
+    monkeypatch.setattr(buff_utils, "backoff_delay", lambda attempt: 0.01)
@@ -0,0 +1,108 @@
+import socket
+import socketserver
+import threading
+import time
+
+
+class FakeRedisServer:
+    """A minimal Redis on a local port, speaking enough RESP for the redis client: GET, SET (EX/PX), DEL, TTL,
+    PING and FLUSHDB.
+
+    Keys expire against `clock`, so tests move time forward instead of sleeping. `stop` closes the listening
+    socket and every open connection, which is what the bot sees when Redis goes down.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.data = {}
+        self.commands = []
+        self._connections = set()
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server._connections.add(self.connection)
+                try:
+                    while True:
+                        command = self.read_command()
+                        if command is None:
+                            return
+                        self.wfile.write(server.execute(command))
+                except (ConnectionError, OSError):
+                    pass
+                finally:
+                    server._connections.discard(self.connection)
+
+            def read_command(self):
+                header = self.rfile.readline()
+                if not header:
+                    return None
+                args = []
+                for _ in range(int(header[1:])):
+                    length = int(self.rfile.readline()[1:])
+                    args.append(self.rfile.read(length + 2)[:-2])
+                return args
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        for connection in list(self._connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= self.clock():
+            del self.data[key]
+            return None
+        return entry
+
+    def execute(self, args):
+        name = args[0].decode().upper()
+        with self._lock:
+            self.commands.append(name)
+            if name == "PING":
+                return b"+PONG\r\n"
+            if name == "GET":
+                entry = self._live(args[1])
+                return b"$-1\r\n" if entry is None else b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+            if name == "SET":
+                expires_at = None
+                options = [arg.decode().upper() for arg in args[3::2]]
+                for option, value in zip(options, args[4::2]):
+                    if option == "EX":
+                        expires_at = self.clock() + int(value)
+                    elif option == "PX":
+                        expires_at = self.clock() + int(value) / 1000
+                self.data[args[1]] = (args[2], expires_at)
+                return b"+OK\r\n"
+            if name == "DEL":
+                deleted = sum(self.data.pop(key, None) is not None for key in args[1:])
+                return b":%d\r\n" % deleted
+            if name == "TTL":
+                entry = self._live(args[1])
+                if entry is None:
+                    return b":-2\r\n"
+                return b":-1\r\n" if entry[1] is None else b":%d\r\n" % round(entry[1] - self.clock())
+            if name == "FLUSHDB":
+                self.data.clear()
+                return b"+OK\r\n"
+            return b"-ERR unknown command '%s'\r\n" % name.encode()
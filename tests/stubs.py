@@ -0,0 +1,83 @@
+import ast
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+from aiohttp import web
+
+EXAMPLE_BUFF_RESP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "example_buff_resp")
+
+
+async def serve(app):
+    """Runs an aiohttp app on a free local port, returns (runner, base_url)"""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+def load_example_buff_resp():
+    with open(EXAMPLE_BUFF_RESP) as file:
+        return ast.literal_eval(file.read())
+
+
+def make_client(cache):
+    """The parts of the bot the Buff helpers use, with history and alerts as no-ops. Set `upstream` before use."""
+    return SimpleNamespace(
+        price_cache=cache,
+        price_history=SimpleNamespace(record=lambda *args, **kwargs: None),
+        price_alerts=SimpleNamespace(check=lambda *args: None),
+    )
+
+
+def buff_stub_app(requests, example=None, status=None, delay=0.0, code=None):
+    """A stand-in for Buff's sell_order endpoint answering every goods_id with the example response.
+
+    Every request's query is appended to `requests`. `status`, when set, is a callable taking the query
+    and returning an HTTP status to fail that request with, or None to answer it. `code` works the same
+    for Buff's own error codes, sent with a 200 like Buff does. Each answer waits `delay` seconds first.
+    """
+    example = example or load_example_buff_resp()
+    goods_info = next(iter(example["data"]["goods_infos"].values()))
+
+    async def handle(request):
+        query = dict(request.query)
+        requests.append(query)
+        await asyncio.sleep(delay)
+        if status is not None and status(query) is not None:
+            return web.Response(status=status(query))
+        if code is not None and code(query) is not None:
+            return web.Response(text=json.dumps({"code": code(query), "msg": None}), content_type="application/json")
+        body = {**example, "data": {**example["data"], "goods_infos": {query["goods_id"]: goods_info}}}
+        return web.Response(text=json.dumps(body), content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get("/api/market/goods/sell_order", handle)
+    return app
+
+
+def steam_stub_app(requests, prices, status=None, delay=0.0):
+    """A stand-in for Steam's priceoverview endpoint.
+
+    `prices` maps market hash names to their "$1,234.56" lowest price, any other name answers with
+    success false like Steam does. `requests`, `status` and `delay` work like in buff_stub_app.
+    """
+
+    async def handle(request):
+        query = dict(request.query)
+        requests.append(query)
+        await asyncio.sleep(delay)
+        if status is not None and status(query) is not None:
+            return web.Response(status=status(query))
+        price = prices.get(query["market_hash_name"])
+        if price is None:
+            body = {"success": False}
+        else:
+            body = {"success": True, "lowest_price": price, "median_price": price, "volume": "1,024"}
+        return web.Response(text=json.dumps(body), content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get("/market/priceoverview/", handle)
+    return app
@@ -0,0 +1,117 @@
+import asyncio
+
+import pyarrow.parquet as pq
+import pytest
+
+import utils.buff163_utils as buff_utils
+from crawl_prices import SNAPSHOT_SCHEMA, SnapshotWriter, crawl
+from stubs import buff_stub_app, serve
+
+GOODS_IDS = list(range(40001, 40013))
+
+
+@pytest.fixture
+def ids_file(tmp_path):
+    path = tmp_path / "buffids.txt"
+    path.write_text("".join(f"{buff_id};Item {buff_id}\n" for buff_id in GOODS_IDS))
+    return str(path)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """run(coro_fn, status=None, delay=0.0) awaits coro_fn() against a stub Buff, goods IDs it was asked for
+    collect in run.requested"""
+    requested = []
+
+    def run(coro_fn, status=None, delay=0.0):
+        async def main():
+            requests = []
+            runner, base_url = await serve(buff_stub_app(requests, status=status, delay=delay))
+            monkeypatch.setattr(buff_utils, "BUFF_API_URL", f"{base_url}/api/market/goods/sell_order")
+            try:
+                return await coro_fn()
+            finally:
+                await runner.cleanup()
+                requested.extend(int(query["goods_id"]) for query in requests)
+
+        return asyncio.run(main())
+
+    run.requested = requested
+    return run
+
+
+def read_snapshot(out_dir):
+    """Every row across the part files, then the latest row per buff_id like a reader of the snapshot would"""
+    rows = [row for part in SnapshotWriter(out_dir).parts() for row in pq.read_table(part).to_pylist()]
+    return rows, {row["buff_id"]: row for row in rows}
+
+
+def test_crawl_writes_a_row_per_goods_id(ids_file, tmp_path, stub):
+    out_dir = str(tmp_path / "snapshot")
+    stub(lambda: crawl(ids_file, out_dir, concurrency=4, batch_size=5))
+
+    parts = SnapshotWriter(out_dir).parts()
+    # 12 rows in batches of 5, the remainder flushed at the end
+    assert len(parts) == 3
+    # Parquet has no second resolution timestamps, observed_at comes back in ms and casts back losslessly
+    assert all(pq.read_table(part).cast(SNAPSHOT_SCHEMA).schema.equals(SNAPSHOT_SCHEMA) for part in parts)
+
+    rows, _ = read_snapshot(out_dir)
+    assert sorted(row["buff_id"] for row in rows) == GOODS_IDS
+    assert all(row["error"] is None for row in rows)
+    assert all(row["buff_price_usd"] > 0 and row["listing_count"] > 0 for row in rows)
+    assert sorted(stub.requested) == GOODS_IDS
+
+
+def test_interrupted_crawl_resumes_where_it_stopped(ids_file, tmp_path, stub):
+    out_dir = str(tmp_path / "snapshot")
+
+    async def interrupted():
+        # Slow answers so the crawl is cancelled part way, like a Ctrl-C
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(crawl(ids_file, out_dir, concurrency=2, batch_size=100), 0.25)
+
+    stub(interrupted, delay=0.1)
+    first_run, _ = read_snapshot(out_dir)
+    assert 0 < len(first_run) < len(GOODS_IDS)
+
+    stub.requested.clear()
+    stub(lambda: crawl(ids_file, out_dir, concurrency=2, batch_size=100))
+
+    # Only the goods IDs missing from the first run's part file were requested again
+    assert sorted(stub.requested) == sorted(set(GOODS_IDS) - {row["buff_id"] for row in first_run})
+    rows, _ = read_snapshot(out_dir)
+    assert sorted(row["buff_id"] for row in rows) == GOODS_IDS
+
+    # A finished crawl has nothing left to do
+    stub.requested.clear()
+    stub(lambda: crawl(ids_file, out_dir, concurrency=2, batch_size=100))
+    assert stub.requested == []
+
+
+def test_failed_ids_are_recorded_and_retried(ids_file, tmp_path, stub):
+    out_dir = str(tmp_path / "snapshot")
+    failing = {str(buff_id) for buff_id in GOODS_IDS[:3]}
+
+    stub(
+        lambda: crawl(ids_file, out_dir, concurrency=4, batch_size=5),
+        status=lambda query: 500 if query["goods_id"] in failing else None,
+    )
+
+    _, latest = read_snapshot(out_dir)
+    errors = {buff_id for buff_id, row in latest.items() if row["error"] is not None}
+    assert errors == set(GOODS_IDS[:3])
+    assert all("500" in latest[buff_id]["error"] for buff_id in errors)
+    # Each failing ID was retried before its error row was written
+    assert stub.requested.count(GOODS_IDS[0]) == 5
+
+    # Without --retry-failed the error rows count as done
+    stub.requested.clear()
+    stub(lambda: crawl(ids_file, out_dir, concurrency=4, batch_size=5))
+    assert stub.requested == []
+
+    stub(lambda: crawl(ids_file, out_dir, concurrency=4, batch_size=5, retry_failed=True))
+    assert sorted(stub.requested) == GOODS_IDS[:3]
+    _, latest = read_snapshot(out_dir)
+    assert sorted(latest) == GOODS_IDS
+    assert all(row["error"] is None for row in latest.values())
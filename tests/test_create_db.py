@@ -0,0 +1,39 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from create_db import CSItemsParser
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+BUFFIDS = os.path.join(DATA_DIR, "buffids.txt")
+# Every row the original line-by-line parser produced for data/buffids.txt, one JSON list per line
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "buffids_parsed.jsonl.gz")
+
+
+@pytest.fixture(scope="module")
+def golden():
+    with gzip.open(GOLDEN, "rt", encoding="utf-8") as file:
+        return [tuple(json.loads(line)) for line in file]
+
+
+def assert_matches_golden(rows, golden):
+    assert len(rows) == len(golden)
+    mismatches = [(expected, row) for expected, row in zip(golden, rows) if row != expected]
+    assert not mismatches, f"{len(mismatches)} rows differ, first: {mismatches[0]}"
+    # Same values could still come back as other types, e.g. 2019.0 for 2019 or numpy bools
+    assert [tuple(map(type, row)) for row in rows] == [tuple(map(type, row)) for row in golden]
+
+
+def test_streaming_parser_matches_golden(golden):
+    assert_matches_golden(CSItemsParser.parse_txt_file(BUFFIDS), golden)
+
+
+def test_vectorized_parser_matches_golden(golden):
+    assert_matches_golden(CSItemsParser.parse_txt_file_vectorized(BUFFIDS), golden)
+
+
+def test_iter_txt_file_streams():
+    rows = CSItemsParser.iter_txt_file(BUFFIDS)
+    assert next(rows)[0] == 33685
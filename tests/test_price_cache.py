@@ -0,0 +1,199 @@
+import asyncio
+import socket
+import time
+
+import pytest
+from redis import Redis
+
+import utils.buff163_utils as buff_utils
+from stubs import buff_stub_app, load_example_buff_resp, make_client, serve
+from utils.deadline import deadline
+from utils.http_client import UpstreamClient
+from utils.price_cache import PriceCache
+
+URL = "https://buff.163.com/api/market/goods/sell_order?game=csgo&goods_id=33883"
+
+
+def test_hit_after_set(cache):
+    async def run():
+        await cache.set(URL, {"buff_price_usd": "1.00"})
+        return await cache.get(URL)
+
+    assert asyncio.run(run()) == ({"buff_price_usd": "1.00"}, False)
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 0
+
+
+def test_miss(cache):
+    assert asyncio.run(cache.get(URL)) is None
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hit_rate"] == 0.0
+
+
+def test_keys_are_the_full_query_url(cache, redis_server):
+    filtered = f"{URL}&min_paintwear=0.0&max_paintwear=0.07"
+
+    async def run():
+        await cache.set(URL, {"buff_price_usd": "1.00"})
+        return await cache.get(filtered)
+
+    assert asyncio.run(run()) is None
+    assert list(redis_server.data) == [f"buff:price:{URL}".encode()]
+
+
+def test_stale_within_the_revalidate_window(cache, clock):
+    asyncio.run(cache.set(URL, {"buff_price_usd": "1.00"}))
+    clock.advance(61)
+
+    assert asyncio.run(cache.get(URL)) == ({"buff_price_usd": "1.00"}, True)
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_ttl_expiry(cache, clock, redis_server):
+    asyncio.run(cache.set(URL, {"buff_price_usd": "1.00"}))
+    clock.advance(60 + 300 + 1)
+
+    assert asyncio.run(cache.get(URL)) is None
+    assert cache.stats()["misses"] == 1
+    # Gone from Redis itself, not only treated as too old
+    assert redis_server.data == {}
+
+
+def test_revalidate_runs_one_refresh_per_url(cache):
+    calls = []
+
+    async def refresh():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        await cache.set(URL, {"buff_price_usd": "2.00"})
+
+    async def run():
+        first = cache.revalidate(URL, refresh)
+        second = cache.revalidate(URL, refresh)
+        assert first is second
+        await first
+        return await cache.get(URL)
+
+    assert asyncio.run(run()) == ({"buff_price_usd": "2.00"}, False)
+    assert calls == [1]
+    assert cache.stats()["refreshing"] == 0
+
+
+def test_redis_down_is_a_miss_not_an_error(cache, redis_server):
+    redis_server.stop()
+
+    async def run():
+        await cache.set(URL, {"buff_price_usd": "1.00"})
+        return await cache.get(URL)
+
+    assert asyncio.run(run()) is None
+    assert cache.stats()["errors"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_lookups_are_served_from_the_cache(cache, monkeypatch):
+    requests = []
+
+    async def run():
+        runner, base_url = await serve(buff_stub_app(requests))
+        monkeypatch.setattr(buff_utils, "BUFF_API_URL", f"{base_url}/api/market/goods/sell_order")
+        client = make_client(cache)
+        try:
+            async with UpstreamClient() as client.upstream:
+                return [await buff_utils.fetch_item_id_data(client, 33883) for _ in range(3)]
+        finally:
+            await runner.cleanup()
+
+    first, *rest = asyncio.run(run())
+    assert len(requests) == 1
+    assert all(item_data == first for item_data in rest)
+    assert cache.stats()["hits"] == 2
+
+
+def test_stale_price_is_served_then_refreshed(cache, clock, monkeypatch):
+    requests = []
+
+    async def run():
+        runner, base_url = await serve(buff_stub_app(requests))
+        monkeypatch.setattr(buff_utils, "BUFF_API_URL", f"{base_url}/api/market/goods/sell_order")
+        client = make_client(cache)
+        try:
+            async with UpstreamClient() as client.upstream:
+                fresh = await buff_utils.fetch_item_id_data(client, 33883)
+                clock.advance(61)
+                stale = await buff_utils.fetch_item_id_data(client, 33883)
+                # The stale answer came back without waiting on Buff, the refresh runs behind it
+                assert len(requests) == 1
+                await asyncio.gather(*cache._refreshing.values())
+                refreshed = await cache.get(await buff_utils.construct_buff_api_url(33883))
+                return fresh, stale, refreshed
+        finally:
+            await runner.cleanup()
+
+    fresh, stale, (refreshed, is_stale) = asyncio.run(run())
+    assert stale == fresh
+    assert len(requests) == 2
+    assert not is_stale
+    assert refreshed["fetched_at"] > fresh["fetched_at"]
+
+
+def test_falls_back_to_buff_when_redis_is_down(cache, redis_server, monkeypatch):
+    requests = []
+    redis_server.stop()
+
+    async def run():
+        runner, base_url = await serve(buff_stub_app(requests))
+        monkeypatch.setattr(buff_utils, "BUFF_API_URL", f"{base_url}/api/market/goods/sell_order")
+        client = make_client(cache)
+        try:
+            async with UpstreamClient() as client.upstream:
+                return [await buff_utils.fetch_item_id_data(client, 33883) for _ in range(2)]
+        finally:
+            await runner.cleanup()
+
+    first, second = asyncio.run(run())
+    assert first["buff_price_usd"] == second["buff_price_usd"]
+    # Every lookup went to Buff, none of them failed
+    assert len(requests) == 2
+    assert cache.stats()["misses"] == 2
+
+
+def test_hung_redis_read_is_a_miss_within_the_deadline():
+    # Accepts connections and never answers, like a Redis that hangs
+    listener = socket.create_server(("127.0.0.1", 0))
+    cache = PriceCache(Redis(host="127.0.0.1", port=listener.getsockname()[1], socket_timeout=1), ttl=60)
+
+    async def run():
+        started = time.perf_counter()
+        with deadline(0.2):
+            result = await cache.get(URL)
+        return result, time.perf_counter() - started
+
+    try:
+        result, elapsed = asyncio.run(run())
+    finally:
+        listener.close()
+    assert result is None
+    assert elapsed < 1.0
+    assert cache.stats()["errors"] == 1
+
+
+def test_item_without_listings_is_a_clear_error(cache, monkeypatch):
+    example = load_example_buff_resp()
+    example = {**example, "data": {**example["data"], "items": [], "total_count": 0, "total_page": 0}}
+    requests = []
+
+    async def run():
+        runner, base_url = await serve(buff_stub_app(requests, example=example))
+        monkeypatch.setattr(buff_utils, "BUFF_API_URL", f"{base_url}/api/market/goods/sell_order")
+        client = make_client(cache)
+        try:
+            async with UpstreamClient() as client.upstream:
+                return await buff_utils.fetch_item_id_data(client, 33883)
+        finally:
+            await runner.cleanup()
+
+    with pytest.raises(buff_utils.NoListings, match="33883"):
+        asyncio.run(run())
+    # An empty market is an answer, not retried
+    assert len(requests) == 1
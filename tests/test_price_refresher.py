@@ -0,0 +1,52 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import utils.buff163_utils as buff_utils
+import utils.price_refresher as price_refresher
+from utils.item_catalog import ItemCatalog
+from utils.price_refresher import PriceRefresher
+
+WEARS = ("Factory New", "Minimal Wear", "Field-Tested", "Well-Worn", "Battle-Scarred")
+
+
+def make_catalog(items):
+    rows = []
+    for item in range(items):
+        name = f"AK-47 | Skin {item}"
+        for index, wear in enumerate(WEARS):
+            buff_id = 50000 + item * 10 + index
+            rows.append((buff_id, name, f"{name} ({wear})", wear, False, False, "Rifle", None, None, None, "AK-47"))
+    return ItemCatalog(rows)
+
+
+def test_hot_set_larger_than_the_budget_is_covered_in_turn(clock, monkeypatch):
+    # Goods IDs are refreshed against the fake clock, moved on by one interval per cycle
+    monkeypatch.setattr(price_refresher, "time", SimpleNamespace(time=clock, monotonic=time.monotonic))
+    refreshed = []
+
+    async def refresh_item_data(client, buff_id, url):
+        refreshed.append(buff_id)
+
+    monkeypatch.setattr(buff_utils, "refresh_item_data", refresh_item_data)
+
+    catalog = make_catalog(20)
+    bot = SimpleNamespace(item_catalog=catalog, price_cache=SimpleNamespace(ttl=60))
+    refresher = PriceRefresher(bot, interval=45, hot_set_size=50, budget=30)
+    for name in catalog.names:
+        refresher.record_request(name)
+
+    async def run(cycles):
+        for _ in range(cycles):
+            await refresher._refresh_cycle()
+            clock.advance(refresher.interval)
+
+    asyncio.run(run(4))
+
+    # 100 goods IDs at 30 a cycle: every one within four cycles, none twice before all had a turn
+    assert len(refreshed) == 120
+    hot_ids = {record.buff_id for name in catalog.names for record in catalog.get(name)["regular_items"]}
+    assert set(refreshed[:100]) == hot_ids
+    assert len(set(refreshed[:100])) == 100
+    # Then the oldest come round again first
+    assert refreshed[100:] == refreshed[:20]
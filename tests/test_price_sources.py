@@ -0,0 +1,177 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import utils.buff163_utils as buff_utils
+from stubs import buff_stub_app, make_client, serve, steam_stub_app
+from utils.deadline import deadline
+from utils.http_client import UpstreamClient
+from utils.price_sources import BuffPriceSource, PriceAggregator, PriceSource, SteamMarketPriceSource, format_quote
+
+RECORD = SimpleNamespace(buff_id=33883, raw_name="AK-47 | Redline (Field-Tested)")
+
+
+@pytest.fixture
+def markets(cache, monkeypatch):
+    """run(quote, **stub options) starts stub Buff and Steam servers and returns quote(client, steam_url)"""
+    buff_requests, steam_requests = [], []
+
+    def run(quote, steam_prices=None, buff_status=None, buff_delay=0.0, steam_status=None, steam_delay=0.0):
+        async def main():
+            buff_runner, buff_url = await serve(buff_stub_app(buff_requests, status=buff_status, delay=buff_delay))
+            steam_runner, steam_url = await serve(
+                steam_stub_app(steam_requests, steam_prices or {}, status=steam_status, delay=steam_delay)
+            )
+            monkeypatch.setattr(buff_utils, "BUFF_API_URL", f"{buff_url}/api/market/goods/sell_order")
+            client = make_client(cache)
+            try:
+                async with UpstreamClient() as client.upstream:
+                    return await quote(client, f"{steam_url}/market/priceoverview/")
+            finally:
+                await buff_runner.cleanup()
+                await steam_runner.cleanup()
+
+        return asyncio.run(main())
+
+    run.buff_requests, run.steam_requests = buff_requests, steam_requests
+    return run
+
+
+def aggregator(steam_url, timeout=1.0):
+    steam = SteamMarketPriceSource(timeout=timeout, url=steam_url, rate=1000, burst=1000)
+    return PriceAggregator([BuffPriceSource(timeout=timeout), steam])
+
+
+def test_buff_source_quotes_the_lowest_sell_order(markets):
+    async def quote(client, steam_url):
+        return await BuffPriceSource().quote(client, RECORD)
+
+    result, error, latency = markets(quote)
+    assert error is None
+    assert result["price_usd"] > 0
+    assert latency > 0
+    assert markets.buff_requests[0]["goods_id"] == "33883"
+
+
+def test_steam_source_parses_priceoverview(markets):
+    async def quote(client, steam_url):
+        return await SteamMarketPriceSource(url=steam_url, rate=1000, burst=1000).quote(client, RECORD)
+
+    result, error, _ = markets(quote, steam_prices={RECORD.raw_name: "$1,234.56"})
+    assert error is None
+    assert result == {"price_usd": 1234.56, "median_price_usd": 1234.56, "volume": 1024}
+    assert markets.steam_requests == [{"appid": "730", "currency": "1", "market_hash_name": RECORD.raw_name}]
+
+
+def test_aggregate_picks_the_cheapest_source(markets):
+    sources = {}
+
+    async def quote(client, steam_url):
+        sources["aggregator"] = aggregator(steam_url)
+        return await sources["aggregator"].quote(client, RECORD)
+
+    quote = markets(quote, steam_prices={RECORD.raw_name: "$0.01"})
+    assert quote["errors"] == {}
+    assert set(quote["sources"]) == {"buff", "steam"}
+    assert all(result["latency_ms"] >= 0 for result in quote["sources"].values())
+    assert quote["best"] == ("steam", 0.01)
+    assert "Steam: $0.01 (lowest)" in format_quote(quote)
+
+    stats = sources["aggregator"].stats()
+    assert stats["buff"]["requests"] == stats["steam"]["requests"] == 1
+    assert stats["buff"]["errors"] == stats["steam"]["errors"] == 0
+
+
+def test_unlisted_on_steam_has_no_price(markets):
+    async def quote(client, steam_url):
+        return await aggregator(steam_url).quote(client, RECORD)
+
+    quote = markets(quote)
+    assert quote["sources"]["steam"]["price_usd"] is None
+    assert quote["best"][0] == "buff"
+
+
+def test_slow_source_times_out_without_delaying_the_others(markets):
+    sources = {}
+
+    async def quote(client, steam_url):
+        sources["aggregator"] = aggregator(steam_url, timeout=0.2)
+        started = time.perf_counter()
+        result = await sources["aggregator"].quote(client, RECORD)
+        return result, time.perf_counter() - started
+
+    quote, elapsed = markets(quote, steam_prices={RECORD.raw_name: "$0.01"}, steam_delay=2.0)
+    assert quote["errors"] == {"steam": "timed out"}
+    assert quote["best"][0] == "buff"
+    assert elapsed < 1.0
+    assert sources["aggregator"].stats()["steam"]["timeouts"] == 1
+
+
+def test_slow_buff_times_out_and_steam_still_answers(markets):
+    async def quote(client, steam_url):
+        return await aggregator(steam_url, timeout=0.2).quote(client, RECORD)
+
+    quote = markets(quote, steam_prices={RECORD.raw_name: "$2.50"}, buff_delay=2.0)
+    assert quote["errors"] == {"buff": "timed out"}
+    assert quote["best"] == ("steam", 2.5)
+
+
+def test_failing_source_is_reported_and_the_rest_still_answer(markets):
+    sources = {}
+
+    async def quote(client, steam_url):
+        sources["aggregator"] = aggregator(steam_url)
+        return await sources["aggregator"].quote(client, RECORD)
+
+    quote = markets(quote, steam_prices={RECORD.raw_name: "$0.01"}, buff_status=lambda query: 500)
+    assert set(quote["errors"]) == {"buff"}
+    assert "500" in quote["errors"]["buff"]
+    assert quote["best"] == ("steam", 0.01)
+    assert "Buff: unavailable" in format_quote(quote)
+    # Buff retried before giving up, Steam was asked once
+    assert len(markets.buff_requests) == 5
+    assert len(markets.steam_requests) == 1
+    assert sources["aggregator"].stats()["buff"]["errors"] == 1
+
+
+def test_steam_rate_limit_is_an_error(markets):
+    async def quote(client, steam_url):
+        return await aggregator(steam_url).quote(client, RECORD)
+
+    quote = markets(quote, steam_status=lambda query: 429)
+    assert quote["errors"] == {"steam": "Rate limited"}
+    assert "buff" in quote["sources"]
+
+
+def test_every_source_failing_leaves_no_best(markets):
+    async def quote(client, steam_url):
+        return await aggregator(steam_url, timeout=0.2).quote(client, RECORD)
+
+    quote = markets(quote, buff_status=lambda query: 500, steam_delay=2.0)
+    assert quote["sources"] == {}
+    assert quote["best"] is None
+    assert set(quote["errors"]) == {"buff", "steam"}
+    assert format_quote(quote).count("unavailable") == 2
+
+
+def test_source_timeouts_are_capped_at_the_callers_deadline(markets):
+    async def quote(client, steam_url):
+        started = time.perf_counter()
+        with deadline(0.2):
+            result = await aggregator(steam_url, timeout=5.0).quote(client, RECORD)
+        return result, time.perf_counter() - started
+
+    quote, elapsed = markets(quote, steam_delay=2.0)
+    assert quote["errors"] == {"steam": "timed out"}
+    assert "buff" in quote["sources"]
+    assert elapsed < 1.0
+
+
+def test_source_without_fetch_fails_on_construction():
+    class Incomplete(PriceSource):
+        name = "incomplete"
+
+    with pytest.raises(TypeError, match="fetch"):
+        Incomplete()
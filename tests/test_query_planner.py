@@ -0,0 +1,167 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import utils.buff163_utils as buff_utils
+from bench_query_planner import load_menus, make_listings, naive_search, start_stub
+from utils.filter_menus import FilterMenu
+from utils.http_client import UpstreamClient
+from utils.query_planner import ListingSpec, QueryPlanner, seed_tiers
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+GOODS_ID = 33880
+WEAR = "Factory New"
+
+
+def paint_seed_menu(tiers):
+    rows = [
+        SimpleNamespace(option_text=tier, option_value=f"tier-{tier}", additional_options=[str(seed) for seed in seeds])
+        for tier, seeds in tiers.items()
+    ]
+    return FilterMenu("Paint seed", rows)
+
+
+@pytest.fixture
+def market(monkeypatch):
+    """run(listings, tiers, coro_fn) awaits coro_fn(client, requests) against the benchmark's stub sell_order"""
+
+    def run(listings, tiers, coro_fn):
+        async def main():
+            runner, requests = await start_stub(0, listings, tiers)
+            host, port = runner.addresses[0][:2]
+            monkeypatch.setattr(buff_utils, "BUFF_API_URL", f"http://{host}:{port}/api/market/goods/sell_order")
+            try:
+                async with UpstreamClient() as upstream:
+                    return await coro_fn(SimpleNamespace(upstream=upstream), requests)
+            finally:
+                await runner.cleanup()
+
+        return asyncio.run(main())
+
+    return run
+
+
+def prices(results):
+    return [price for price, *_ in results]
+
+
+def test_seed_tiers_merge_every_paint_seed_dropdown():
+    menus = [paint_seed_menu({"Tier1": [1, 2], "Tier2": [3]}), paint_seed_menu({"Tier1": []})]
+    assert seed_tiers(menus) == {"Tier1": frozenset({1, 2}), "Tier2": frozenset({3})}
+
+
+def test_planned_results_match_the_naive_search(market):
+    menus = load_menus(os.path.join(DATA_DIR, "wears.csv"), os.path.join(DATA_DIR, "buff163_sample.csv"), WEAR)
+    tiers = seed_tiers(menus)
+    tier1 = sorted(tiers["Tier1"])
+    scenarios = [
+        ([(0.0, 0.03)], {"tier": "Tier1"}),
+        ([(0.0, 0.03)], {"tier": "Tier1"}),
+        ([(0.021, 0.025)], {"tier": "Tier1"}),
+        ([(0.02, 0.035), (0.03, 0.05), (0.045, 0.052)], {"paint_seeds": tier1[:2]}),
+        ([(0.0, 0.07)], {"paint_seeds": tier1[4:8]}),
+        ([], {"paint_seeds": [1, 2, 3]}),
+    ]
+    planner = QueryPlanner(page_size=50, max_pages=3)
+
+    async def run(client, requests):
+        outcomes = []
+        for float_ranges, filters in scenarios:
+            spec = ListingSpec(GOODS_ID, WEAR, float_ranges, **filters)
+            naive = (await naive_search(client, spec, float_ranges, 50))[:10]
+            before = len(requests)
+            planned = await planner.execute(client, planner.plan(spec, menus), 10)
+            outcomes.append((naive, prices(planned), len(requests) - before))
+        return outcomes
+
+    outcomes = market(make_listings(2000, tiers), tiers, run)
+    for naive, planned, _ in outcomes:
+        assert planned == naive
+    # The same filter from another user, and the narrower range after it, never went upstream
+    assert outcomes[1][2] == 0
+    assert outcomes[2][2] == 0
+
+    stats = planner.stats()
+    assert stats["plans"] == len(scenarios)
+    assert stats["reused"] >= 2
+    assert stats["upstream_queries"] == stats["naive_queries"] - stats["saved"]
+    assert stats["upstream_queries"] < stats["naive_queries"]
+
+
+# Five pages of Tier1 listings: the cheapest four pages are seed 1, seeds 2 and 3 only show up on the last one
+PARTIAL_TIERS = {"Tier1": frozenset({1, 2, 3})}
+PARTIAL_LISTINGS = [
+    {
+        "id": f"listing-{i}",
+        "price": f"{100 + i:.2f}",
+        "asset_info": {"paintwear": "0.010000", "info": {"paintseed": 1 if i < 40 else 2 + i % 2}},
+    }
+    for i in range(50)
+]
+
+
+def test_partial_entry_is_continued_for_a_narrower_spec(market):
+    menus = [paint_seed_menu(PARTIAL_TIERS)]
+    planner = QueryPlanner(page_size=10, max_pages=5)
+    tier1 = ListingSpec(GOODS_ID, WEAR, tier="Tier1")
+    seeds = ListingSpec(GOODS_ID, WEAR, paint_seeds=[2, 3])
+
+    async def run(client, requests):
+        first = await planner.execute(client, planner.plan(tier1, menus), 10)
+        first_pages = [query["page_num"] for query in requests]
+        # Both specs plan the same Tier1 query, the first fetch stopped after one page
+        second = await planner.execute(client, planner.plan(seeds, menus), 10)
+        second_pages = [query["page_num"] for query in requests[len(first_pages):]]
+        naive = await naive_search(client, seeds, [], 10)
+        return first, first_pages, second, second_pages, naive
+
+    first, first_pages, second, second_pages, naive = market(PARTIAL_LISTINGS, PARTIAL_TIERS, run)
+    assert len(first) == 10
+    assert first_pages == ["1"]
+    # Carried on from page 2 rather than starting over or answering from the single page
+    assert second_pages == ["2", "3", "4", "5"]
+    assert prices(second) == naive[:10]
+    assert {seed for _, _, seed, _ in second} == {2, 3}
+    assert planner.stats()["upstream_queries"] == 2
+    assert planner.stats()["reused"] == 0
+
+
+def test_concurrent_plans_continue_a_shared_fetch(market):
+    menus = [paint_seed_menu(PARTIAL_TIERS)]
+    planner = QueryPlanner(page_size=10, max_pages=5)
+    tier1 = ListingSpec(GOODS_ID, WEAR, tier="Tier1")
+    seeds = ListingSpec(GOODS_ID, WEAR, paint_seeds=[2, 3])
+
+    async def run(client, requests):
+        first, second = await asyncio.gather(
+            planner.execute(client, planner.plan(tier1, menus), 10),
+            planner.execute(client, planner.plan(seeds, menus), 10),
+        )
+        return first, second, [query["page_num"] for query in requests], await naive_search(client, seeds, [], 10)
+
+    first, second, pages, naive = market(PARTIAL_LISTINGS, PARTIAL_TIERS, run)
+    assert len(first) == 10
+    assert prices(second) == naive[:10]
+    # The seeds plan joined the Tier1 fetch, then read the rest itself: every page once
+    assert sorted(pages) == ["1", "2", "3", "4", "5"]
+
+
+def test_query_read_to_max_pages_is_reused(market):
+    menus = [paint_seed_menu(PARTIAL_TIERS)]
+    planner = QueryPlanner(page_size=10, max_pages=2)
+    seeds = ListingSpec(GOODS_ID, WEAR, paint_seeds=[2, 3])
+
+    async def run(client, requests):
+        first = await planner.execute(client, planner.plan(seeds, menus), 10)
+        before = len(requests)
+        second = await planner.execute(client, planner.plan(seeds, menus), 10)
+        return first, second, len(requests) - before
+
+    first, second, repeat_requests = market(PARTIAL_LISTINGS, PARTIAL_TIERS, run)
+    # Seeds 2 and 3 are past the page cap, asking again can't find more
+    assert first == second == []
+    assert repeat_requests == 0
+    assert planner.stats()["upstream_pages"] == 2
+    assert planner.stats()["reused"] == 1
@@ -0,0 +1,120 @@
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import utils.buff163_utils as buff_utils
+from stubs import buff_stub_app, serve
+from utils.http_client import UpstreamClient
+from utils.rate_limit import RetryBudget, TokenBucket, backoff_delay
+
+
+@pytest.fixture
+def buff(monkeypatch):
+    """run(coro_fn, **stub options) awaits coro_fn(client) against a stub Buff, its requests are in .requests"""
+    requests = []
+
+    def run(coro_fn, **options):
+        async def main():
+            runner, base_url = await serve(buff_stub_app(requests, **options))
+            monkeypatch.setattr(buff_utils, "BUFF_API_URL", f"{base_url}/api/market/goods/sell_order")
+            try:
+                async with UpstreamClient() as upstream:
+                    return await coro_fn(SimpleNamespace(upstream=upstream))
+            finally:
+                await runner.cleanup()
+
+        return asyncio.run(main())
+
+    run.requests = requests
+    return run
+
+
+def test_retries_stop_when_the_budget_runs_out(buff, monkeypatch):
+    # Two retries in the budget and nothing earned back, every request gets a 429
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0, max_balance=2)
+    monkeypatch.setattr(buff_utils, "buff_retry_budget", budget)
+
+    with pytest.raises(Exception, match="Rate limited"):
+        buff(lambda client: buff_utils.fetch_buff_data(client, 33883), status=lambda query: 429)
+
+    assert budget.retries == 2
+    assert budget.rejected > 0
+    # Gave up before using all 5 attempts
+    assert len(buff.requests) == 3
+
+
+def test_failing_callers_share_one_budget(buff, monkeypatch):
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0, max_balance=3)
+    monkeypatch.setattr(buff_utils, "buff_retry_budget", budget)
+
+    async def run(client):
+        return await asyncio.gather(
+            *[buff_utils.fetch_buff_data(client, 33883) for _ in range(4)], return_exceptions=True
+        )
+
+    results = buff(run, status=lambda query: 429)
+    assert all(isinstance(result, Exception) for result in results)
+    # 4 first attempts plus the 3 retries the budget had, not 4 * 5 requests
+    assert len(buff.requests) == 7
+    assert budget.rejected == 4
+
+
+def test_error_codes_go_through_the_budget_and_backoff(buff, monkeypatch):
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0, max_balance=10)
+    monkeypatch.setattr(buff_utils, "buff_retry_budget", budget)
+    delays = []
+    monkeypatch.setattr(buff_utils, "backoff_delay", lambda attempt: delays.append(attempt) or 0.01)
+
+    with pytest.raises(Exception, match="Login Required"):
+        buff(lambda client: buff_utils.fetch_buff_data(client, 33883), code=lambda query: "Login Required")
+
+    assert len(buff.requests) == 5
+    assert budget.retries == 4
+    assert delays == [1, 2, 3, 4]
+
+
+def test_concurrent_fetches_are_spaced_at_the_rate(buff, monkeypatch):
+    rate = 20
+    monkeypatch.setattr(buff_utils, "buff_rate_limiter", TokenBucket(rate=rate, burst=1))
+    arrivals = []
+
+    def record_arrival(query):
+        arrivals.append(time.monotonic())
+        return None
+
+    async def run(client):
+        return await asyncio.gather(*[buff_utils.fetch_buff_data(client, 33883) for _ in range(6)])
+
+    results = buff(run, status=record_arrival)
+    assert all(result is not None for result in results)
+
+    gaps = [later - earlier for earlier, later in zip(arrivals, arrivals[1:])]
+    assert len(gaps) == 5
+    # Token waits are exact, the only slack is scheduling and the local round trip
+    assert min(gaps) >= 0.8 / rate
+    assert arrivals[-1] - arrivals[0] >= 5 * 0.9 / rate
+
+
+def test_token_bucket_allows_a_burst_then_waits():
+    bucket = TokenBucket(rate=10, burst=3)
+
+    async def run():
+        started = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    assert 0.08 <= elapsed < 0.5
+    assert bucket.stats()["acquired"] == 4
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    random.seed(0)
+    delays = [backoff_delay(attempt, base=1.0, cap=30.0) for attempt in range(1, 10) for _ in range(50)]
+    assert all(0 <= delay <= 30.0 for delay in delays)
+    assert len(set(delays)) == len(delays)
+    assert all(backoff_delay(1, base=1.0) <= 2.0 for _ in range(100))